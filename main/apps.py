@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MainConfig(AppConfig):
     name = 'main'
+
+    # start the reaper sweeping the games of the process (see reaper.py) once the app is ready, unless
+    #   PLAYCARDS_REAPER_AUTOSTART is off (ie. a management command or a test sweeping on its own)
+    def ready(self):
+        if getattr(settings, 'PLAYCARDS_REAPER_AUTOSTART', True):
+            from . import views
+            views.game_reaper.start()
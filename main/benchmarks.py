@@ -0,0 +1,762 @@
+"""
+NAME
+    benchmarks.py
+
+DESCRIPTION
+    Contains benchmarks of the game play hot paths.  Each benchmark is run with the benchmark
+    management command and reports the latency of each operation:
+        python manage.py benchmark [name ...] [--iterations N] [--decks N] [--jokers N] [--players N]
+    The concurrency stress test (stress_turns) is also run by the tests (main/tests.py).
+
+    The micro-benchmarks of the model and serialization hot paths (add_game, deal, shuffle, snapshot,
+    turn_parse) also report the memory allocated by each operation (traced with tracemalloc on a
+    separate run, so tracing does not slow the timed run):
+        alloc_bytes_per_op         -- the peak memory allocated during an operation
+        retained_bytes_per_op      -- the memory still held after an operation (leaks show up here)
+
+FUNCTIONS
+    time_calls                     -- time each call of a function and return the latency statistics
+    trace_allocations              -- trace the memory allocated by each call of a function
+    time_and_trace                 -- the latency statistics and the memory allocated by each call
+    create_game                    -- create a game with the selected decks, jokers and players
+    bench_add_game                 -- game creation latency (Games.add_game - deck construction) for 1 and
+                                      2 decks with 0, 2 and 6 jokers
+    bench_deal                     -- deal latency of a Blitz round (Games.deal, as dealt by views.deal)
+    bench_shuffle                  -- shuffle latency of the deck (Games.shuffle)
+    bench_snapshot                 -- latency of publishing a turn (the game's snapshot is built once) and
+                                      creating a player's update from it (updates.pending_updates, as sent
+                                      on the player's stream) - a full update and a delta update
+    bench_turn_parse               -- latency of parsing the turn posted to turncompletepost (views.parse_turn)
+    bus_worker                     -- (worker process) holds subscribers of a game on a UnixSocketBus and
+                                      reports when each subscriber's stream is woken
+    bench_bus                      -- turn to client latency of the notification bus with 4 worker
+                                      processes (each player's stream woken in every worker)
+    play_turn                      -- the active player draws a card and discards a card (one turn)
+    stress_turns                   -- plays turns in many games from many threads while other threads
+                                      read the players' updates, counting inconsistent updates
+    bench_turns                    -- turn throughput as the number of threads scales (stress_turns)
+    bench_melds                    -- validation latency of a full game board (melds.check_board)
+    bench_scoring                  -- scoring latency of a whole table (scoring.score_table) and the
+                                      player hands scored per minute
+    bench_hints                    -- latency of finding the plays of a worst-case hand (two decks, six
+                                      jokers), without and with the memoized plays (hints.find_plays)
+    bench_restore                  -- restore time of RESTORE_GAMES games kept in memory with a journal
+                                      (journal.py) - from the journal alone, and from a snapshot and the
+                                      journal's tail - and the group commit throughput of saving games
+    bench_replay                   -- size of the game records (gamerecord.py) of simulated hands against
+                                      the turns posted as JSON, and the replay throughput (replay.py) -
+                                      checking each replayed game against the game played
+    bench_wire                     -- size, encode and decode time of a full update, a delta update and a
+                                      turn posted in each wire format (wire.py) - run on a two deck, 8
+                                      player game with --players 8
+    bench_compression              -- bytes saved and cost of each event of a compressed stream (see
+                                      compression.py) over a long game, for each wire format and window size
+    bench_moves                    -- bytes posted and server time of a turn posted as its moves (moves.py)
+                                      against the turn posted as the whole hand, discard pile and game board
+
+DATA
+    BENCHMARKS                     -- the benchmark functions accessed by name
+"""
+
+import asyncio
+import contextlib
+import json
+import types
+import urllib.parse
+import zlib
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from . import (compression, gamerecord, hints, journal, melds, models, moves, notifier, replay, scoring, simulation,
+               stores, updates, wire)
+
+BUS_WORKERS = 4     # the number of worker processes holding the players' streams (bench_bus)
+STRESS_THREADS = [1, 2, 4, 8]   # the numbers of threads playing turns (bench_turns)
+STRESS_GAMES = 32   # the number of games played at the same time (bench_turns)
+TRACE_CALLS = 200   # the calls traced for the memory allocated by each call (trace_allocations)
+RESTORE_GAMES = 10000   # the games journaled and restored (bench_restore)
+COMMIT_THREADS = 8  # the threads saving games at the same time (bench_restore)
+REPLAY_HANDS = 1000     # the simulated hands recorded and replayed (bench_replay)
+COMPRESSION_HANDS = 10  # the simulated hands of the game streamed (bench_compression)
+COMPRESSION_WINDOW_BITS = [9, 12, 15]   # the compression windows compared (bench_compression)
+
+
+# time each call of the function and return the latency statistics (in microseconds)
+def time_calls(func, iterations):
+    times = []
+    for ndx in range(iterations):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    total = sum(times)
+    return {
+        'iterations': iterations,
+        'mean_us': total / iterations * 1e6,
+        'p50_us': times[iterations // 2] * 1e6,
+        'p99_us': times[min(iterations - 1, iterations * 99 // 100)] * 1e6,
+        'ops_per_sec': iterations / total if total else 0.0,
+    }
+
+
+# trace the memory allocated by each call of the function (with tracemalloc) - the mean peak allocated
+#   during a call and the mean memory still held after a call (in bytes)
+def trace_allocations(func, calls=TRACE_CALLS):
+    func()  # the first call fills the caches
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    peak = 0
+    start_memory = tracemalloc.get_traced_memory()[0]
+    try:
+        for ndx in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            peak += tracemalloc.get_traced_memory()[1] - before
+        retained = tracemalloc.get_traced_memory()[0] - start_memory
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return {'alloc_bytes_per_op': peak // calls, 'retained_bytes_per_op': retained // calls}
+
+
+# the latency statistics of the function's calls and the memory allocated by each call
+def time_and_trace(func, iterations):
+    result = time_calls(func, iterations)
+    result.update(trace_allocations(func, min(iterations, TRACE_CALLS)))
+    return result
+
+
+# create a game with the selected number of decks, jokers and players
+def create_game(options, game_id='bench'):
+    games = models.Games()
+    games.add_game(game_id, options['jokers'], options['decks'])
+    for pndx in range(options['players']):
+        games.add_player(game_id, 'player' + str(pndx))
+    return games
+
+
+# game creation latency - the deck is constructed for each number of decks and jokers (the game is removed
+#   after each call so the games do not pile up)
+def bench_add_game(options):
+    games = models.Games()
+
+    def add_game(number_of_decks, number_of_jokers):
+        games.add_game('bench', number_of_jokers, number_of_decks)
+        games.remove_game('bench')
+
+    result = {}
+    for number_of_decks in (1, 2):
+        for number_of_jokers in (0, 2, 6):
+            stats = time_and_trace(lambda: add_game(number_of_decks, number_of_jokers), options['iterations'])
+            name = str(number_of_decks) + 'd' + str(number_of_jokers) + 'j_'
+            for key in ('ops_per_sec', 'alloc_bytes_per_op', 'retained_bytes_per_op'):
+                result[name + key] = stats[key]
+    return result
+
+
+# deal latency of a Blitz round - all cards are returned to the deck, shuffled and dealt (the dealing logic
+#   of views.deal)
+def bench_deal(options):
+    games = create_game(options)
+    return time_and_trace(lambda: games.deal('bench', 'player0'), options['iterations'])
+
+
+# shuffle latency of the deck - the players' hands are cleared and the deck is shuffled
+def bench_shuffle(options):
+    games = create_game(options)
+    return time_and_trace(lambda: games.shuffle('bench'), options['iterations'])
+
+
+# latency of publishing a turn (the game's snapshot is built once for all the players) and creating a
+#   player's update as sent on the player's stream (event_stream) - a full update (the player's version is
+#   unknown) or a delta update (the player has the previous version).  Every player at the table has a meld
+#   on the game board
+def bench_snapshot(options):
+    games = create_game(options)
+    games.deal('bench', 'player0', random.Random(0))
+    game = games.get_game('bench')
+    for player in game.players:
+        hand = game.player_cards[player]
+        game.game_board_items.append({"type": "Book", "meld_cards": [
+            {"player": player, "suit": card.suit, "faceval": card.faceval} for card in hand[:3]]})
+        game.player_cards[player] = hand[3:]
+    updates.publish_update(games, 'bench')
+    rng = random.Random(0)
+
+    def full():
+        play_turn(games, 'bench', rng)
+        return updates.pending_updates(games, 'bench', 'player1')
+
+    def delta():
+        version = games.get_version('bench')
+        play_turn(games, 'bench', rng)
+        return updates.pending_updates(games, 'bench', 'player1', version)
+
+    result = {}
+    for name, func in (('full', full), ('delta', delta)):
+        stats = time_and_trace(func, options['iterations'])
+        for key in ('ops_per_sec', 'mean_us', 'p99_us', 'alloc_bytes_per_op', 'retained_bytes_per_op'):
+            result[name + '_' + key] = stats[key]
+    updates.discard_game('bench')
+    return result
+
+
+# latency of parsing the turn posted to turncompletepost - the player's hand, the discard pile and a game
+#   board with a meld of each player (the parsing prints each meld card, sent to os.devnull)
+def bench_turn_parse(options):
+    from . import views
+
+    games = create_game(options)
+    games.deal('bench', 'player0', random.Random(0))
+    game = games.get_game('bench')
+    game_board = []
+    for player in game.players:
+        game_board.append({"type": "Book", "meld_cards": [
+            {"player": player, "suit": card.suit, "faceval": card.faceval} for card in game.player_cards[player][:3]]})
+    post = {
+        'updated_players_hand': json.dumps(updates.card_list(game.player_cards['player1'])),
+        'discards': json.dumps(updates.card_list(game.discards + game.deck[:20])),
+        'game_board': json.dumps(game_board),
+    }
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = time_and_trace(lambda: views.parse_turn(post), options['iterations'])
+    result['post_bytes'] = sum([len(value) for value in post.values()])
+    return result
+
+
+# (worker process) holds subscribers of the game on a UnixSocketBus - the time each subscriber's stream
+#   is woken is compared with the start of the turn (time.monotonic is shared by the processes), the
+#   worker acknowledges each turn once all its subscribers were woken and returns the latencies in results
+def bus_worker(socket_dir, subscribers, turns, ready, acks, results, started):
+    bus = notifier.UnixSocketBus(socket_dir)
+
+    async def subscriber(stream, latencies):
+        for turn in range(turns):
+            await stream.wait()
+            stream.clear()
+            latencies.append(time.monotonic() - started.value)
+            if len(latencies) % subscribers == 0:
+                acks.put(len(latencies) // subscribers)
+
+    async def run():
+        latencies = []
+        streams = [bus.subscribe('bench', 'player' + str(ndx)) for ndx in range(subscribers)]
+        tasks = [asyncio.ensure_future(subscriber(stream, latencies)) for stream in streams]
+        ready.put(None)
+        await asyncio.gather(*tasks)
+        return latencies
+
+    results.put(asyncio.run(run()))
+
+
+# turn to client latency of the notification bus - the players' streams are held by 4 worker processes
+#   and each turn (publish_update and bus.publish in the turn's process) wakes every stream of the game
+def bench_bus(options):
+    turns = min(options['iterations'], 1000)
+    subscribers = options['players']
+    games = create_game(options)
+    context = multiprocessing.get_context('fork')
+    ready = context.Queue()
+    acks = context.Queue()
+    results = context.Queue()
+    started = context.Value('d', 0.0, lock=False)
+    with tempfile.TemporaryDirectory() as socket_dir:
+        workers = [context.Process(target=bus_worker, args=(socket_dir, subscribers, turns, ready, acks, results, started))
+                   for ndx in range(BUS_WORKERS)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            ready.get()
+        time.sleep(0.1)     # the subscribers are waiting once their worker's event loop is idle
+        bus = notifier.UnixSocketBus(socket_dir)
+        for turn in range(turns):
+            started.value = time.monotonic()
+            updates.publish_update(games, 'bench')
+            bus.publish('bench')
+            for worker in workers:
+                acks.get()
+        latencies = []
+        for worker in workers:
+            latencies.extend(results.get())
+        for worker in workers:
+            worker.join()
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'workers': BUS_WORKERS,
+        'turns': turns,
+        'streams': count // turns,
+        'mean_us': sum(latencies) / count * 1e6,
+        'p50_us': latencies[count // 2] * 1e6,
+        'p95_us': latencies[count * 95 // 100] * 1e6,
+        'p99_us': latencies[count * 99 // 100] * 1e6,
+    }
+
+
+# the active player of the game draws the top card and discards a random card from their hand - the turn
+#   is applied and published while holding the game's lock (as turncompletepost does)
+def play_turn(games, game_id, rng):
+    with games.game_lock(game_id):
+        player = games.get_active_player(game_id)
+        deck = games.get_deck(game_id)
+        discards = list(games.get_discards(game_id))
+        if not deck:
+            # the draw pile is empty - deal a new round
+            games.deal(game_id, player, rng)
+        else:
+            hand = list(games.get_player_cards(game_id, player))
+            hand.append(games.pop_top_card(game_id))
+            discards.append(hand.pop(rng.randrange(len(hand))))
+            games.apply_turn(game_id, player, hand, discards, games.get_game_board_items(game_id))
+        updates.publish_update(games, game_id)
+
+
+# play turns in many games from many threads while as many reader threads create the players' updates
+#   (full updates, as sent to a reconnecting player).  An update is inconsistent when the player's cards
+#   do not match the card counts, or the cards in the update do not add up to the cards in the game.
+#   Returns the turns played per second and the number of inconsistent updates
+def stress_turns(threads, number_of_games, turns, options):
+    games = models.Games()
+    game_ids = ['stress' + str(ndx) for ndx in range(number_of_games)]
+    for game_id in game_ids:
+        games.add_game(game_id, options['jokers'], options['decks'])
+        for pndx in range(options['players']):
+            games.add_player(game_id, 'player' + str(pndx))
+        games.deal(game_id, 'player0')
+        updates.publish_update(games, game_id)
+    total_cards = len(games.get_deck(game_ids[0])) + sum(
+        [len(games.get_player_cards(game_ids[0], player)) for player in games.get_players(game_ids[0])]) + \
+        len(games.get_discards(game_ids[0]))
+    playing = [True]
+    inconsistent = [0]
+
+    def player_thread(seed):
+        rng = random.Random(seed)
+        for turn in range(turns):
+            play_turn(games, rng.choice(game_ids), rng)
+
+    def reader_thread(seed):
+        rng = random.Random(seed)
+        while playing[0]:
+            game_id = rng.choice(game_ids)
+            player = 'player' + str(rng.randrange(options['players']))
+            version, pending = updates.pending_updates(games, game_id, player)
+            update = json.loads(pending[-1][1])
+            cards = update['deck_size'] + sum(update['card_counts']) + len(update['discards'])
+            if cards != total_cards or \
+                    len(update['player_cards']) != update['card_counts'][update['players'].index(player)]:
+                inconsistent[0] += 1
+
+    readers = [threading.Thread(target=reader_thread, args=(ndx,)) for ndx in range(threads)]
+    players = [threading.Thread(target=player_thread, args=(1000 + ndx,)) for ndx in range(threads)]
+    for thread in readers:
+        thread.start()
+    start = time.perf_counter()
+    for thread in players:
+        thread.start()
+    for thread in players:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    playing[0] = False
+    for thread in readers:
+        thread.join()
+    for game_id in game_ids:
+        updates.discard_game(game_id)
+    return {
+        'turns': threads * turns,
+        'turns_per_sec': threads * turns / elapsed,
+        'versions': sum([games.get_version(game_id) for game_id in game_ids]) - number_of_games,
+        'inconsistent': inconsistent[0],
+    }
+
+
+# turn throughput as the number of threads playing turns (and reading updates) scales
+def bench_turns(options):
+    result = {}
+    for threads in STRESS_THREADS:
+        stress = stress_turns(threads, STRESS_GAMES, max(1, options['iterations'] // threads), options)
+        result['turns_per_sec_' + str(threads)] = stress['turns_per_sec']
+        result['inconsistent_' + str(threads)] = stress['inconsistent']
+    return result
+
+
+# validation latency of a full game board - a run and a book of each face value (with wild cards), each
+#   extended by the turn, as checked by turncompletepost
+def bench_melds(options):
+    def meld_cards(cards):
+        return [{"player": "player0", "suit": card.suit, "faceval": card.faceval} for card in cards]
+
+    old_board = []
+    new_board = []
+    for fndx in range(len(models.all_facevals) - 3):
+        run = [models.get_card('hearts', faceval) for faceval in models.all_facevals[fndx:fndx + 4]]
+        book = [models.get_card(suit, models.all_facevals[fndx]) for suit in models.all_suits[:3]]
+        old_board.append({"type": "Run", "meld_cards": meld_cards(run[:3])})
+        old_board.append({"type": "Book", "meld_cards": meld_cards(book)})
+        new_board.append({"type": "Run", "meld_cards": meld_cards(run)})
+        new_board.append({"type": "Book", "meld_cards": meld_cards(book + [models.CARDS[models.JOKER_ID]])})
+    result = time_calls(lambda: melds.check_board(old_board, new_board, '7'), options['iterations'])
+    result['melds'] = len(new_board)
+    return result
+
+
+# scoring latency of a whole table - each player played a meld and holds the rest of their dealt hand
+def bench_scoring(options):
+    games = create_game(options)
+    games.deal('bench', 'player0', random.Random(0))
+    game = games.get_game('bench')
+    for player in game.players:
+        hand = game.player_cards[player]
+        game.game_board_items.append({"type": "Book", "meld_cards": [
+            {"player": player, "suit": card.suit, "faceval": card.faceval} for card in hand[:3]]})
+        game.player_cards[player] = hand[3:]
+    result = time_calls(lambda: scoring.score_table(game), options['iterations'])
+    result['hands_per_minute'] = result['ops_per_sec'] * len(game.players) * 60
+    return result
+
+
+# latency of finding the plays of a worst-case hand of a two deck, six joker game - four jokers and two wild
+#   cards with naturals able to form books and runs, and a game board with runs and books of each suit to
+#   add to.  The cold latency clears the memoized plays before each call
+def bench_hints(options):
+    def meld_cards(cards):
+        return [{"player": "player1", "suit": card.suit, "faceval": card.faceval} for card in cards]
+
+    joker = models.CARDS[models.JOKER_ID]
+    hand = [joker, joker, joker, joker, models.get_card('hearts', '7'), models.get_card('diamonds', '7'),
+            models.get_card('spades', '9'), models.get_card('clubs', '9'), models.get_card('hearts', '9'),
+            models.get_card('spades', '10'), models.get_card('spades', 'J')]
+    game_board_items = []
+    for suit in models.all_suits:
+        game_board_items.append({"type": "Run", "meld_cards": meld_cards(
+            [models.get_card(suit, faceval) for faceval in ('4', '5', '6')])})
+        game_board_items.append({"type": "Book", "meld_cards": meld_cards(
+            [models.get_card(book_suit, 'K') for book_suit in models.all_suits[:3]])})
+
+    def cold():
+        hints.new_melds.cache_clear()
+        hints.meld_additions.cache_clear()
+        hints.board_plays.cache_clear()
+        return hints.find_plays(hand, '7', game_board_items)
+
+    result = {'plays': len(cold())}
+    for name, stats in (('cold', time_calls(cold, max(1, options['iterations'] // 10))),
+                        ('warm', time_calls(lambda: hints.find_plays(hand, '7', game_board_items),
+                                            options['iterations']))):
+        result[name + '_mean_us'] = stats['mean_us']
+        result[name + '_p99_us'] = stats['p99_us']
+    return result
+
+
+# the size of the journal's files in a directory
+def directory_bytes(directory):
+    return sum([os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)])
+
+
+# restore the games journaled in the directory, returns the seconds taken and the number of games restored
+def time_restore(directory):
+    start = time.perf_counter()
+    store = stores.JournaledStore(journal.Journal(directory, sync=False))
+    seconds = time.perf_counter() - start
+    store.journal.close()
+    return seconds, len(store)
+
+
+# restore time of RESTORE_GAMES games kept in memory with a journal - each game is created, dealt and played
+#   a turn (every change saved to the journal), then the games are restored from the journal alone.  A
+#   snapshot is written, every game plays another turn (the journal's tail) and the games are restored from
+#   the snapshot and the tail.  The group commit throughput is measured with COMMIT_THREADS threads saving
+#   games and waiting for each record to be durable
+def bench_restore(options):
+    rng = random.Random(0)
+    result = {'games': RESTORE_GAMES}
+    with tempfile.TemporaryDirectory() as directory:
+        game_journal = journal.Journal(directory, sync=False)
+        games = models.Games(stores.JournaledStore(game_journal))
+        for ndx in range(RESTORE_GAMES):
+            game_id = 'bench' + str(ndx)
+            games.add_game(game_id, options['jokers'], options['decks'])
+            for pndx in range(options['players']):
+                games.add_player(game_id, 'player' + str(pndx))
+            games.save_game(game_id)
+            games.deal(game_id, 'player0', rng)
+            games.save_game(game_id)
+            play_turn(games, game_id, rng)
+            games.save_game(game_id)
+            updates.discard_game(game_id)
+        game_journal.flush()
+        result['journal_bytes'] = directory_bytes(directory)
+        result['journal_restore_sec'], restored = time_restore(directory)
+
+        game_journal.rotate(background=False)
+        for ndx in range(RESTORE_GAMES):
+            play_turn(games, 'bench' + str(ndx), rng)
+            games.save_game('bench' + str(ndx))
+            updates.discard_game('bench' + str(ndx))
+        game_journal.close()
+        result['snapshot_and_tail_bytes'] = directory_bytes(directory)
+        result['snapshot_restore_sec'], restored = time_restore(directory)
+        result['restored_games'] = restored
+
+    with tempfile.TemporaryDirectory() as directory:
+        game_journal = journal.Journal(directory, sync=True)
+        games = models.Games(stores.JournaledStore(game_journal))
+        for ndx in range(COMMIT_THREADS):
+            games.add_game('bench' + str(ndx), options['jokers'], options['decks'])
+        saves = max(1, options['iterations'] // COMMIT_THREADS)
+
+        def save_games(game_id):
+            for ndx in range(saves):
+                games.save_game(game_id)
+
+        threads = [threading.Thread(target=save_games, args=('bench' + str(ndx),)) for ndx in range(COMMIT_THREADS)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        game_journal.close()
+        result['sync_saves_per_sec'] = saves * COMMIT_THREADS / seconds
+        result['records_per_fsync'] = saves * COMMIT_THREADS / game_journal.commits
+    return result
+
+
+# the size of the game records of REPLAY_HANDS hands played by the greedy policy, against the JSON of the
+#   turns posted to turncompletepost (the hand, discard pile and game board of each turn), and the replay
+#   throughput of the records - each replayed game is compared with the game played (mismatches)
+def bench_replay(options):
+    rng = random.Random(0)
+    simulator = simulation.HandSimulator([simulation.GreedyPolicy()] * options['players'], options['decks'],
+                                         options['jokers'], rng)
+    game = simulator.game
+    players = game.get_players()
+    records = []
+    mismatches = 0
+    for ndx in range(REPLAY_HANDS):
+        simulator.games.deal(simulation.GAME_ID, players[ndx % len(players)], rng)
+        simulator.play_out()
+        records.append(bytes(game.history))
+        mismatches += 1 if replay.compare(replay.replay(records[-1]), game) else 0
+        if game.winner:
+            game.winner = ""
+            game.scores = {player: 0 for player in players}
+
+    json_bytes = 0
+    for record in records:
+        for (name, args), (op, replayed) in zip(replay.decode(record), replay.states(record)):
+            if op == gamerecord.OP_PASS:
+                hand = replayed.player_cards.get(replay.player_name(replayed, args[0]), [])
+                json_bytes += len(json.dumps({
+                    'updated_players_hand': [{'suit': card.suit, 'faceval': card.faceval} for card in hand],
+                    'discards': [{'suit': card.suit, 'faceval': card.faceval} for card in replayed.discards],
+                    'game_board': replayed.game_board_items}))
+
+    ops = sum([len(replay.decode(record)) for record in records])
+    start = time.perf_counter()
+    for record in records:
+        replay.replay(record)
+    seconds = time.perf_counter() - start
+    record_bytes = sum([len(record) for record in records])
+    return {'hands': REPLAY_HANDS, 'bytes_per_hand': record_bytes / REPLAY_HANDS,
+            'json_bytes_per_hand': json_bytes / REPLAY_HANDS, 'ops_per_hand': ops / REPLAY_HANDS,
+            'replay_hands_per_sec': REPLAY_HANDS / seconds, 'replay_ops_per_sec': ops / seconds,
+            'mismatches': mismatches}
+
+
+# the size (bytes), encode and decode time of the updates and the turn posted in each wire format available -
+#   a full update and a delta update (one turn) sent to a player, and the turn posted to turncompletepost
+#   (form encoded, a binary body for msgpack).  The encode time is the shared data encoded once for all the
+#   players (shared_us) and the player's event from it (event_us).  Every player has a meld on the game board
+def bench_wire(options):
+    from . import views
+
+    games = create_game(options)
+    games.deal('bench', 'player0', random.Random(0))
+    game = games.get_game('bench')
+    for player in game.players:
+        hand = game.player_cards[player]
+        game.game_board_items.append({"type": "Book", "meld_cards": [
+            {"player": player, "suit": card.suit, "faceval": card.faceval} for card in hand[:3]]})
+        game.player_cards[player] = hand[3:]
+    rng = random.Random(0)
+    play_turn(games, 'bench', rng)
+    updates.publish_update(games, 'bench')
+    version = games.get_version('bench')
+    play_turn(games, 'bench', rng)
+    snapshot = updates.publish_update(games, 'bench')
+    iterations = max(1, options['iterations'] // 10)
+
+    result = {'players': options['players']}
+    for wire_format in wire.available():
+        full = updates.pending_updates(games, 'bench', 'player1', None, wire_format)[1][0][1]
+        delta = updates.pending_updates(games, 'bench', 'player1', version, wire_format)[1][0][1]
+        if wire_format == 'json':
+            shared = time_calls(lambda: json.dumps(snapshot.shared), iterations)
+        else:
+            shared = time_calls(lambda: wire.encode_shared(snapshot.shared, wire_format), iterations)
+        event = time_calls(lambda: updates.pending_updates(games, 'bench', 'player1', None, wire_format), iterations)
+        decode = time_calls(lambda: wire.decode_event(full), iterations)
+
+        turn = wire.encode_turn(game.player_cards['player1'], game.discards, game.game_board_items, wire_format)
+        if wire_format == 'msgpack':
+            request = types.SimpleNamespace(body=turn)
+            turn_bytes = len(turn)
+        else:
+            request = types.SimpleNamespace(POST=turn)
+            turn_bytes = len(urllib.parse.urlencode(turn))
+        if wire_format == 'json':
+            parse = time_calls(lambda: views.parse_turn(turn), iterations)
+        else:
+            parse = time_calls(lambda: wire.decode_turn(request, wire_format), iterations)
+
+        result[wire_format + '_full_bytes'] = len(full)
+        result[wire_format + '_delta_bytes'] = len(delta)
+        result[wire_format + '_shared_us'] = shared['mean_us']
+        result[wire_format + '_event_us'] = event['mean_us']
+        result[wire_format + '_decode_us'] = decode['mean_us']
+        result[wire_format + '_turn_bytes'] = turn_bytes
+        result[wire_format + '_turn_parse_us'] = parse['mean_us']
+    updates.discard_game('bench')
+    return result
+
+
+# the bytes saved and the cost of compressing the stream of a player over a long game (COMPRESSION_HANDS hands
+#   played by the greedy policy, an update published after each deal and turn) - for each wire format and
+#   compression window, the compressed bytes against the events' bytes (ratio), the time to compress and
+#   flush each event and the bytes saved per millisecond of compression, and the ratio when each event is
+#   compressed on its own (without the window of the events already sent)
+def bench_compression(options):
+    rng = random.Random(0)
+    simulator = simulation.HandSimulator([simulation.GreedyPolicy()] * options['players'], options['decks'],
+                                         options['jokers'], rng)
+    games = simulator.games
+    game_id = simulation.GAME_ID
+    players = games.get_players(game_id)
+    listener = players[-1]
+    streams = {wire_format: [] for wire_format in wire.available()}
+    versions = {wire_format: None for wire_format in streams}
+
+    def send():
+        updates.publish_update(games, game_id)
+        for wire_format, events in streams.items():
+            versions[wire_format], pending = updates.pending_updates(games, game_id, listener,
+                                                                     versions[wire_format], wire_format)
+            events.extend(['id: ' + str(version) + '\ndata: ' + data + '\n\n' for version, data in pending])
+
+    for hand in range(COMPRESSION_HANDS):
+        games.deal(game_id, players[hand % len(players)], rng)
+        send()
+        for turn in range(simulation.MAX_TURNS):
+            ending = simulator.play_turn(games.get_active_player(game_id))
+            send()
+            if ending is not None:
+                break
+    updates.discard_game(game_id)
+
+    result = {'events': len(streams['json'])}
+    for wire_format, events in streams.items():
+        raw = sum([len(event.encode()) for event in events])
+        result[wire_format + '_bytes_per_event'] = raw / len(events)
+        for bits in COMPRESSION_WINDOW_BITS:
+            compressor = compression.StreamCompressor('gzip', 6, bits)
+            start = time.perf_counter()
+            for event in events:
+                compressor.compress(event)
+            seconds = time.perf_counter() - start
+            name = wire_format + '_w' + str(bits)
+            result[name + '_ratio'] = compressor.compressed_bytes / raw
+            result[name + '_us_per_event'] = seconds / len(events) * 1e6
+            result[name + '_saved_bytes_per_ms'] = (raw - compressor.compressed_bytes) / (seconds * 1000)
+        result[wire_format + '_independent_ratio'] = sum([len(zlib.compress(event.encode(), 6))
+                                                          for event in events]) / raw
+    return result
+
+
+# the bytes posted and the server time of the turns of a game posted as their moves (moves.parse_moves and
+#   moves.apply_moves, as turnmovespost applies them) against the same turns posted as the whole hand, discard
+#   pile and game board (views.parse_turn, melds.check_board and Games.apply_turn, as turncompletepost applies
+#   them) - each turn the active player draws the top card and discards a random card, every player has a meld
+#   on the game board
+def bench_moves(options):
+    from . import views
+
+    games = {}
+    for name in ('state', 'moves'):
+        games[name] = create_game(options)
+        games[name].deal('bench', 'player0', random.Random(0))
+        game = games[name].get_game('bench')
+        for player in game.players:
+            hand = game.player_cards[player]
+            game.game_board_items.append({"type": "Book", "meld_cards": [
+                {"player": player, "suit": card.suit, "faceval": card.faceval} for card in hand[:3]]})
+            game.player_cards[player] = hand[3:]
+    state_game = games['state'].get_game('bench')
+    moves_game = games['moves'].get_game('bench')
+    rng = random.Random(0)
+    seconds = {'state': 0.0, 'moves': 0.0}
+    posted = {'state': 0, 'moves': 0}
+    turns = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        while turns < options['iterations']:
+            if not state_game.deck:
+                # the draw pile is empty - deal a new round (in both games)
+                games['state'].deal('bench', state_game.active_player, random.Random(turns))
+                games['moves'].deal('bench', moves_game.active_player, random.Random(turns))
+                continue
+            player = state_game.active_player
+            hand = state_game.player_cards[player] + [state_game.deck[-1]]
+            discard = hand[rng.randrange(len(hand))]
+            hand.remove(discard)
+
+            # the turn posted as the whole state
+            post = wire.encode_turn(hand, state_game.discards + [discard], state_game.game_board_items, 'json')
+            start = time.perf_counter()
+            updated_players_hand, discards, game_board_items = views.parse_turn(post)
+            melds.check_board(state_game.game_board_items, game_board_items, state_game.wild_card)
+            state_game.deck.pop()
+            games['state'].apply_turn('bench', player, updated_players_hand, discards, game_board_items)
+            seconds['state'] += time.perf_counter() - start
+            posted['state'] += len(urllib.parse.urlencode(post))
+
+            # the turn posted as its moves
+            text = json.dumps([['draw'], ['discard', discard.card_id]])
+            start = time.perf_counter()
+            moves.apply_moves(moves_game, player, moves.parse_moves(text))
+            seconds['moves'] += time.perf_counter() - start
+            posted['moves'] += len(urllib.parse.urlencode({'moves': text}))
+            turns += 1
+    updates.discard_game('bench')
+
+    result = {'turns': turns}
+    for name in ('state', 'moves'):
+        result[name + '_turn_us'] = seconds[name] / turns * 1e6
+        result[name + '_turn_bytes'] = posted[name] / turns
+    result['same_game'] = not replay.compare(state_game, moves_game)
+    return result
+
+
+BENCHMARKS = {
+    'add_game': bench_add_game,
+    'deal': bench_deal,
+    'shuffle': bench_shuffle,
+    'snapshot': bench_snapshot,
+    'turn_parse': bench_turn_parse,
+    'bus': bench_bus,
+    'turns': bench_turns,
+    'melds': bench_melds,
+    'scoring': bench_scoring,
+    'hints': bench_hints,
+    'restore': bench_restore,
+    'replay': bench_replay,
+    'wire': bench_wire,
+    'compression': bench_compression,
+    'moves': bench_moves,
+}
@@ -0,0 +1,372 @@
+"""
+NAME
+    bots.py
+
+DESCRIPTION
+    Plays the turns of the bot players (computer opponents) seated in a game with Games.add_bot.  When
+    the active player of a game is a bot, the bot's turn is played by the server in two decisions:
+        draw                       -- the draw pile or 1 to MAX_BOT_TAKE cards from the discard pile
+                                      (the last card picked up must be played this turn)
+        plays and discard          -- after the draw the bot plays the plays worth the most points (see
+                                      simulation.GreedyPolicy) and chooses the card to discard
+    Each decision is made by Monte Carlo lookahead.  The cards the bot can not see (the draw pile and the
+    other players' hands) are sampled by shuffling the cards not in the bot's hand, the discard pile or
+    on the game board and dealing them back to the other players (the number of cards each holds) and
+    the draw pile.  The rest of the hand is then played out with every player greedy (see simulation.py)
+    and each choice is scored by the bot's hand score less the mean hand score of the other players.
+    The choices are sampled in turn until the move's time budget is spent, and the choice with the best
+    mean score is taken.
+
+    The bots never hold a request thread or the game's lock while deciding.  The turns are played by a
+    thread of the BotRunner (one thread per game at a time), the game is read and changed under the
+    game's lock, and the decisions are made in a bounded process pool so the simulations do not compete
+    with the request threads (and the players' update streams) for the interpreter.  Set in settings.py:
+        PLAYCARDS_BOT_WORKERS      -- the processes of the pool (0 to decide in the bot's thread)
+        PLAYCARDS_BOT_MOVE_SECONDS -- the time budget of each decision
+
+CLASS
+    PlannedPolicy                  -- a greedy policy taking a planned draw and discard (the choice sampled)
+    BotRunner                      -- plays the turns of the bots in each game off the request threads
+
+METHODS
+                        BotRunner Class
+    __init__                       -- create the runner of the bots of the games (threads and the process
+                                      pool are started when first used)
+    schedule                       -- play the bots' turns of a game when the active player is a bot
+    run                            -- (thread) play the bots' turns of a game until a human player is active
+    decide                         -- make a decision in the process pool (or in this thread)
+    play_turn                      -- play the turn of the active bot of a game (draw, plays and discard)
+
+FUNCTIONS
+    bot_name                       -- get the name of the next bot seated in a game
+    bot_to_play                    -- returns True when the active player of a game is a bot with a turn to play
+    bot_state                      -- get what a bot can see of a game (card ids, sent to the process pool)
+    sample_game                    -- create a game (GameSettings) from a bot's state with the unseen cards
+                                      dealt at random
+    rollout                        -- play out the rest of a hand from a sampled game with a bot's choice
+    monte_carlo                    -- sample the choices in turn until the time budget is spent
+    choose_draw                    -- (worker process) choose the number of cards to pick up from the discard
+                                      pile (0 for the draw pile)
+    choose_turn                    -- (worker process) play the bot's cards and choose the discard, returns
+                                      the bot's hand, the discard pile and the game board after the turn
+
+DATA
+    BOT_NAME                       -- the name of the bots (followed by a number)
+    MAX_BOT_TAKE                   -- the most cards a bot picks up from the discard pile
+    ROLLOUT_TURNS                  -- the turns played out by a rollout before the hand is scored as it stands
+"""
+
+import concurrent.futures
+import logging
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from . import metrics, models, scoring, simulation, stores, updates
+
+logger = logging.getLogger(__name__)
+
+BOT_NAME = 'Bot '
+MAX_BOT_TAKE = 3        # the most cards a bot picks up from the discard pile
+ROLLOUT_TURNS = 60      # the turns played out by a rollout before the hand is scored as it stands
+BOT_WORKERS = 2         # the default number of processes making the bots' decisions
+BOT_MOVE_SECONDS = 0.5  # the default time budget of each decision
+POOL_TIMEOUT = 30       # the seconds past the time budget before a decision is made in the bot's thread instead
+
+
+# a greedy policy taking the planned draw (the number of cards picked up from the discard pile) and discard
+#   (the card id, the greedy discard when the card is not in the hand)
+class PlannedPolicy(simulation.GreedyPolicy):
+    def __init__(self, count=0, discard_id=None):
+        self.count = count
+        self.discard_id = discard_id
+
+    def draw(self, game, player, can_take, rng):
+        return self.count
+
+    def discard(self, game, player, hand, rng):
+        for ndx, card in enumerate(hand):
+            if card.card_id == self.discard_id:
+                return ndx
+        return super().discard(game, player, hand, rng)
+
+
+# get the name of the next bot seated in a game (ie. Bot 1, Bot 2, ...)
+def bot_name(game):
+    number = 1
+    while BOT_NAME + str(number) in game.get_players():
+        number += 1
+    return BOT_NAME + str(number)
+
+
+# returns True when the active player of the game is a bot with a turn to play (the cards are dealt and the
+#   hand is not over)
+def bot_to_play(game):
+    return (game is not None and game.active_player in game.bots and bool(game.dealer)
+            and not game.hand_scores and not game.winner)
+
+
+# get what the bot can see of the game - its hand, the discard pile and the game board (card ids and game
+#   board items), the number of cards each player holds, and the cards it can not see (the cards of the
+#   game not in its hand, the discard pile or on the game board)
+def bot_state(game, player):
+    hand = [card.card_id for card in game.player_cards[player]]
+    discards = [card.card_id for card in game.discards]
+    unseen = Counter([card.card_id for card in game.deck])
+    for cards in game.player_cards.values():
+        unseen.update([card.card_id for card in cards])
+    unseen.subtract(hand)
+    return {
+        'player': player,
+        'players': list(game.players),
+        'hand': hand,
+        'discards': discards,
+        'game_board_items': [{"type": item['type'], "meld_cards": [dict(meld_card) for meld_card in item['meld_cards']]}
+                             for item in game.game_board_items],
+        'wild_card': game.wild_card,
+        'dealer': game.dealer,
+        'out_player': game.out_player,
+        'hand_sizes': {other: len(cards) for other, cards in game.player_cards.items()},
+        'unseen': sorted(unseen.elements()),
+    }
+
+
+# create a game (GameSettings) from the bot's state - the unseen cards are shuffled and dealt to the other
+#   players (the number of cards each holds) and the rest are the draw pile.  The game can not be won (the
+#   rollouts only score the hand)
+def sample_game(state, rng):
+    unseen = [models.CARDS[card_id] for card_id in state['unseen']]
+    rng.shuffle(unseen)
+    game = models.GameSettings()
+    game.players = list(state['players'])
+    game.wild_card = state['wild_card']
+    game.dealer = state['dealer']
+    game.out_player = state['out_player']
+    game.active_player = state['player']
+    game.target_score = sys.maxsize
+    game.scores = {player: 0 for player in game.players}
+    for player in game.players:
+        if player == state['player']:
+            game.player_cards[player] = [models.CARDS[card_id] for card_id in state['hand']]
+        else:
+            count = state['hand_sizes'].get(player, 0)
+            game.player_cards[player] = unseen[len(unseen) - count:]
+            del unseen[len(unseen) - count:]
+    game.deck = unseen
+    game.discards = [models.CARDS[card_id] for card_id in state['discards']]
+    game.game_board_items = [{"type": item['type'], "meld_cards": list(item['meld_cards'])}
+                             for item in state['game_board_items']]
+    return game
+
+
+# play out the rest of the hand from a sampled game with the bot's choice (the policy of its turn) and every
+#   other turn greedy - returns the bot's hand score less the mean hand score of the other players
+def rollout(simulator, state, policy, rng, drawn=False, required_id=None):
+    game = sample_game(state, rng)
+    greedy = simulation.GreedyPolicy()
+    simulator.seat(game, {player: greedy for player in game.players})
+    simulator.rng = rng
+    player = state['player']
+    required = models.CARDS[required_id] if required_id is not None else None
+    if simulator.play_turn(player, policy, drawn, required) is None:
+        simulator.play_out(ROLLOUT_TURNS)
+    others = [score for other, score in game.hand_scores.items() if other != player]
+    return game.hand_scores.get(player, 0) - (sum(others) / len(others) if others else 0)
+
+
+# sample the choices (policies) in turn until the time budget is spent (each choice is sampled at least once)
+#   - returns the index of the choice with the best mean score and the number of rollouts played
+def monte_carlo(state, policies, seconds, rng, drawn=False, required_id=None):
+    simulator = simulation.HandSimulator([], rng=rng)
+    totals = [0.0] * len(policies)
+    counts = [0] * len(policies)
+    deadline = time.perf_counter() + seconds
+    ndx = 0
+    while not all(counts) or time.perf_counter() < deadline:
+        totals[ndx] += rollout(simulator, state, policies[ndx], rng, drawn, required_id)
+        counts[ndx] += 1
+        ndx = (ndx + 1) % len(policies)
+    means = [totals[ndx] / counts[ndx] for ndx in range(len(policies))]
+    return means.index(max(means)), sum(counts)
+
+
+# (worker process) choose the number of cards the bot picks up from the discard pile (0 for the draw pile) -
+#   the counts whose last card can be played are sampled against drawing from the draw pile
+def choose_draw(state, seconds, seed):
+    rng = random.Random(seed)
+    hand = [models.CARDS[card_id] for card_id in state['hand']]
+    discards = [models.CARDS[card_id] for card_id in state['discards']]
+    counts = [0] + [count for count in range(1, min(MAX_BOT_TAKE, len(discards)) + 1)
+                    if simulation.can_take(hand, discards, count, state['wild_card'], state['game_board_items'])]
+    if len(counts) == 1:
+        return 0
+    best = monte_carlo(state, [PlannedPolicy(count) for count in counts], seconds, rng)[0]
+    return counts[best]
+
+
+# (worker process) play the bot's cards (the plays worth the most points, the required card - the last card
+#   picked up from the discard pile - is played first) and choose the card to discard by sampling each card
+#   left in the hand.  Returns the bot's hand, the discard pile (card ids) and the game board after the turn,
+#   and whether the bot discarded
+def choose_turn(state, required_id, seconds, seed):
+    rng = random.Random(seed)
+    player = state['player']
+    simulator = simulation.HandSimulator([], rng=rng)
+    greedy = simulation.GreedyPolicy()
+
+    # the cards left in the hand after the plays (the greedy discard is returned to the hand)
+    game = sample_game(state, rng)
+    simulator.seat(game, {other: greedy for other in game.players})
+    simulator.play_turn(player, greedy, True, models.CARDS[required_id] if required_id is not None else None)
+    left = sorted(set([card.card_id for card in game.player_cards[player]] +
+                      ([game.discards[-1].card_id] if len(game.discards) > len(state['discards']) else [])))
+
+    discard_id = left[0] if left else None
+    if len(left) > 1:
+        best = monte_carlo(state, [PlannedPolicy(0, card_id) for card_id in left], seconds, rng,
+                           True, required_id)[0]
+        discard_id = left[best]
+
+    # the bot's turn with the chosen discard
+    game = sample_game(state, rng)
+    simulator.seat(game, {other: greedy for other in game.players})
+    simulator.play_turn(player, PlannedPolicy(0, discard_id), True,
+                        models.CARDS[required_id] if required_id is not None else None)
+    return {
+        'hand': [card.card_id for card in game.player_cards[player]],
+        'discards': [card.card_id for card in game.discards],
+        'game_board_items': game.game_board_items,
+        'discarded': len(game.discards) > len(state['discards']),
+    }
+
+
+# plays the turns of the bots in each game - a game's bot turns are played by one thread at a time (a
+#   bounded thread pool), and the decisions are made in a bounded process pool
+class BotRunner:
+    # create the runner of the bots of the games - the threads and processes are started when first used
+    def __init__(self, games, bus, workers=None, move_seconds=None):
+        self.games = games
+        self.bus = bus
+        self.workers = workers if workers is not None else getattr(settings, 'PLAYCARDS_BOT_WORKERS', BOT_WORKERS)
+        self.move_seconds = move_seconds if move_seconds is not None else \
+            getattr(settings, 'PLAYCARDS_BOT_MOVE_SECONDS', BOT_MOVE_SECONDS)
+        self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.workers),
+                                                              thread_name_prefix='bots')
+        self._pool = None
+        self._running = {}  # the games with bot turns being played (True when scheduled again meanwhile)
+        self._required = {}  # the bot and the card it picked up (to be played) of each game, until the turn is applied
+        self._lock = threading.Lock()
+
+    # play the bots' turns of the game when the active player is a bot - called after each change to a game
+    #   (the turns are played by a thread of the runner, the caller never waits)
+    def schedule(self, game_id):
+        with self._lock:
+            if game_id in self._running:
+                self._running[game_id] = True
+                return
+            self._running[game_id] = False
+        self._threads.submit(self.run, game_id)
+
+    # (thread) play the bots' turns of the game until a human player is active (or the hand is over)
+    def run(self, game_id):
+        while True:
+            try:
+                played = self.play_turn(game_id)
+            except stores.StaleGame:
+                # another process changed the game - the turn is played again from the game saved
+                updates.discard_game(game_id)
+                played = True
+            except Exception:
+                logger.exception("bot turn failed in %s", game_id)
+                played = False
+            if not played:
+                with self._lock:
+                    if not self._running[game_id]:
+                        del self._running[game_id]
+                        return
+                    self._running[game_id] = False
+
+    # make a decision (call the function) in the process pool, or in this thread when there is no pool (or the
+    #   pool failed)
+    def decide(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            pool = self._pool
+        try:
+            return pool.submit(func, *args).result(timeout=self.move_seconds + POOL_TIMEOUT)
+        except (concurrent.futures.process.BrokenProcessPool, concurrent.futures.TimeoutError):
+            # the pool failed (or is stuck) - start a new pool for the next decision and decide in this thread
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            return func(*args)
+
+    # play the turn of the game's active bot - the draw is decided, taken under the game's lock, then the plays
+    #   and discard are decided and the turn is applied (and published) under the game's lock.  A bot that drew
+    #   before its turn was abandoned (the game changed while the plays were decided) does not draw again.
+    #   Returns True when the game changed (another bot may have a turn to play)
+    def play_turn(self, game_id):
+        games = self.games
+        with games.game_lock(game_id):
+            game = games.get_game(game_id)
+            if not bot_to_play(game):
+                self._required.pop(game_id, None)
+                return False
+            player = game.active_player
+            version = game.version
+            drawn = game.drawn
+            state = bot_state(game, player)
+        count = 0 if drawn else self.decide(choose_draw, state, self.move_seconds, random.randrange(1 << 32))
+
+        # draw - the game is unchanged unless a player left (or the cards were dealt again)
+        with games.game_lock(game_id):
+            game = games.get_game(game_id)
+            if not bot_to_play(game) or game.version != version or game.active_player != player:
+                return True
+            required = None
+            if game.drawn:
+                bot, required = self._required.get(game_id, (None, None))
+                if bot != player:
+                    required = None
+            elif count and count <= len(game.discards):
+                required = game.take_discards(player, count)[0]
+                self._required[game_id] = (player, required)
+            elif game.deck:
+                games.add_player_cards(game_id, player, games.pop_top_card(game_id))
+                game.drawn = True
+                self._required.pop(game_id, None)
+            else:
+                # the draw pile is empty - the hand is over
+                scoring.end_hand(game)
+                updates.publish_update(games, game_id)
+                games.save_game(game_id)
+                metrics.UPDATE_FANOUT.observe(self.bus.publish(game_id))
+                return True
+            games.save_game(game_id)
+            state = bot_state(game, player)
+        turn = self.decide(choose_turn, state, required.card_id if required is not None else None,
+                           self.move_seconds, random.randrange(1 << 32))
+
+        # complete the turn - score the hand when the turn ended it and update all the players
+        with games.game_lock(game_id):
+            game = games.get_game(game_id)
+            if game is None or game.version != version or game.active_player != player:
+                return True
+            games.apply_turn(game_id, player, [models.CARDS[card_id] for card_id in turn['hand']],
+                             [models.CARDS[card_id] for card_id in turn['discards']], turn['game_board_items'])
+            self._required.pop(game_id, None)
+            scoring.complete_turn(game, player, turn['discarded'])
+            updates.publish_update(games, game_id)
+            games.save_game(game_id)
+        metrics.UPDATE_FANOUT.observe(self.bus.publish(game_id))
+        return True
@@ -0,0 +1,130 @@
+"""
+NAME
+    compression.py
+
+DESCRIPTION
+    Compresses the players' streams (see views.stream).  Each stream has its own deflate compressor for
+    the life of the connection, and the compressor is flushed (Z_SYNC_FLUSH) after each event, so the
+    browser receives every event at once while the compressor's window - the events already sent - keeps
+    improving the compression of the events that follow (the updates of a game repeat the same players,
+    keys and cards over and over).
+
+    The compression is enabled with PLAYCARDS_STREAM_COMPRESSION (the zlib compression level, 0 to send
+    the streams uncompressed) and is only used when the browser accepts it (Accept-Encoding gzip or
+    deflate).  Each compressor holds memory for the life of its stream - about 2**(window_bits + 2) +
+    2**(mem_level + 9) bytes - so the window is kept small by PLAYCARDS_STREAM_COMPRESSION_WINDOW_BITS
+    and PLAYCARDS_STREAM_COMPRESSION_MEM_LEVEL (see benchmarks.bench_compression for the bytes saved and
+    the cost of each event).
+
+CLASS
+    StreamCompressor               -- the deflate compressor of a stream, flushed after each event
+
+METHODS
+                        StreamCompressor Class
+    __init__                       -- initialize the compressor for the content encoding
+    compress                       -- compress an event and flush it
+
+FUNCTIONS
+    negotiate                      -- get the content encoding to send for the request's Accept-Encoding
+    compress_stream                -- (generator) compress the events of a stream
+    async_compress_stream          -- (async generator) compress the events of an asynchronous stream
+
+DATA
+    level                          -- the compression level (PLAYCARDS_STREAM_COMPRESSION), 0 when disabled
+    ENCODINGS                      -- the content encodings supported, in order of preference, and the
+                                      zlib wbits of each
+    SSE_RAW_BYTES, SSE_COMPRESSED_BYTES, SSE_COMPRESS_SECONDS
+                                   -- the metrics of the compressed streams (see metrics.py)
+"""
+
+import time
+import zlib
+
+from django.conf import settings
+
+from . import metrics
+
+level = getattr(settings, 'PLAYCARDS_STREAM_COMPRESSION', 0)
+window_bits = getattr(settings, 'PLAYCARDS_STREAM_COMPRESSION_WINDOW_BITS', 12)
+mem_level = getattr(settings, 'PLAYCARDS_STREAM_COMPRESSION_MEM_LEVEL', 5)
+
+ENCODINGS = (('gzip', 16), ('deflate', 0))   # the zlib wbits of each content encoding (added to window_bits)
+COMPRESS_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025)
+
+SSE_RAW_BYTES = metrics.Counter('playcards_sse_raw_bytes_total',
+                                'Bytes of the events sent on the compressed streams before compression.')
+SSE_COMPRESSED_BYTES = metrics.Counter('playcards_sse_compressed_bytes_total',
+                                       'Bytes of the events sent on the compressed streams after compression.')
+SSE_COMPRESS_SECONDS = metrics.Histogram('playcards_sse_compress_seconds',
+                                         'Time to compress and flush each event of a compressed stream.',
+                                         COMPRESS_BUCKETS)
+
+
+# get the content encoding to send for the request's Accept-Encoding header - 'gzip' or 'deflate' when
+#   accepted (and not refused with q=0), None when the streams are not compressed
+def negotiate(accept_encoding, compression_level=None):
+    if not (level if compression_level is None else compression_level):
+        return None
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, __, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding, wbits in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+# the deflate compressor of a stream - each event is compressed and flushed, the window of the events
+#   already sent is kept for the events that follow
+class StreamCompressor:
+    # initialize the compressor for the content encoding ('gzip' or 'deflate') - the settings are read from
+    #   settings.py unless specified
+    def __init__(self, encoding, compression_level=None, bits=None, memory=None):
+        wbits = (window_bits if bits is None else bits) + dict(ENCODINGS)[encoding]
+        self._compressor = zlib.compressobj(level if compression_level is None else compression_level,
+                                            zlib.DEFLATED, wbits, mem_level if memory is None else memory)
+        self.raw_bytes = 0              # the bytes of the events compressed
+        self.compressed_bytes = 0       # the bytes sent
+
+    # compress the event (text) and flush it - returns the bytes to send (timed and counted in the metrics
+    #   when enabled)
+    def compress(self, event):
+        if metrics.enabled:
+            start = time.perf_counter()
+        data = event.encode()
+        compressed = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.raw_bytes += len(data)
+        self.compressed_bytes += len(compressed)
+        if metrics.enabled:
+            SSE_COMPRESS_SECONDS.observe(time.perf_counter() - start)
+            SSE_RAW_BYTES.inc(len(data))
+            SSE_COMPRESSED_BYTES.inc(len(compressed))
+        return compressed
+
+
+# (generator) compress the events of a stream with the compressor - the stream is closed when the
+#   compressed stream is closed
+def compress_stream(events, compressor):
+    try:
+        for event in events:
+            yield compressor.compress(event)
+    finally:
+        events.close()
+
+
+# (async generator) compress the events of an asynchronous stream with the compressor - the stream is
+#   closed when the compressed stream is closed
+async def async_compress_stream(events, compressor):
+    try:
+        async for event in events:
+            yield compressor.compress(event)
+    finally:
+        await events.aclose()
@@ -40,6 +40,7 @@ class GameSettingsForm(forms.Form):
                               validators=[alphanumeric])
     number_of_jokers = forms.IntegerField(min_value=0, max_value=6, required=False)
     number_of_decks = forms.ChoiceField(widget=forms.RadioSelect, choices=DECK_COUNT, initial=('One', 1))
+    target_score = forms.IntegerField(min_value=5, required=False)
 
     def clean(self):
         game_id = self.cleaned_data['game_id']
@@ -0,0 +1,300 @@
+"""
+NAME
+    gamerecord.py
+
+DESCRIPTION
+    Records how each hand of a game is played in a compact binary game record - one small opcode per
+    deal, draw, pick up, meld, addition and discard, with the cards as card ids (one byte each).  The
+    record of the hand being played is kept in the game (GameSettings.history) and is started again by
+    each deal, so a record holds everything needed to rebuild the game from the deal (see replay.py):
+        DEAL     players dealer active winner target jokers deck
+                                   -- the players (name, bot flag and running score of each), the dealer,
+                                      the active player and the winner before the deal, the target score,
+                                      the number of jokers and the shuffled deck (the hands are dealt from
+                                      it Blitz style, see GameSettings.deal)
+        DRAW     player            -- the player draws the top card of the deck
+        TAKE     player count      -- the player picks up the top count cards of the discard pile
+        MELD     player type cards -- the player plays a new book (0) or run (1) to the game board
+        ADD      player index position cards
+                                   -- the player adds cards before (0) or after (1) the meld at index
+        DISCARD  player card       -- the player discards a card from their hand
+        HAND     player cards      -- the player's hand (only when the hand posted does not follow from
+                                      the turn's draws, pick ups, plays and discards)
+        BOARD    melds             -- the whole game board (only when the game board posted is not the
+                                      previous game board with cards added by the player)
+        PASS     player            -- the turn is applied, the next player becomes the active player
+        END      player discarded  -- the turn is complete (scoring.complete_turn)
+        SCORE                      -- the hand is scored (scoring.end_hand)
+        JOIN     name              -- a player joins the game
+        BOT      player            -- the player joining is a bot
+        LEAVE    player            -- a player leaves the game
+    A player is their index in the game's players when the opcode is recorded.  Names are UTF-8 with a
+    2 byte length, scores are 4 byte signed integers.
+
+    The turns are recorded as they are applied (Games.apply_turn) - the turn's opcodes are the difference
+    between the game before the turn and the hand, discard pile and game board posted.  A turn submitted
+    as a list of moves (see moves.py) is recorded an opcode per move.  The cards drawn are found by the
+    deck getting shorter since the last opcode recorded (history_deck).
+
+    When PLAYCARDS_HAND_ARCHIVE is set, the record of each hand is appended to the archive file when the
+    next hand is dealt (or the game is removed), framed with the game id as the journal is (journal.py).
+
+CLASS
+    RecordedShuffle                -- shuffles a deck and keeps the shuffled order (the DEAL's deck)
+
+FUNCTIONS
+    encode_name                    -- encode a name (2 byte length and UTF-8)
+    player_index                   -- get the player's index in the game's players (UNKNOWN when not found)
+    record_deal                    -- start the game's record with the DEAL of a new hand
+    record_draws                   -- record the cards drawn since the last opcode recorded
+    record_take                    -- record a pick up from the discard pile made before the turn is applied
+    record_turn                    -- record the opcodes of a turn applied to the game
+    record_moves                   -- record the opcodes of a turn applied move by move
+    record_end                     -- record the completion of a turn
+    record_score                   -- record the scoring of the hand
+    record_join                    -- record a player joining the game
+    record_bot                     -- record that the player joining is a bot
+    record_leave                   -- record a player leaving the game
+    archive_hand                   -- append the record of the game's hand to the hand archive
+
+DATA
+    OP_DEAL .. OP_LEAVE            -- the opcodes
+    MELD_CODES, MELD_TYPES         -- the code of each meld type (and the meld type of each code)
+    UNKNOWN                        -- the player index of a player not in the game
+"""
+
+import struct
+from collections import Counter
+
+from django.conf import settings
+
+from . import journal, models
+
+(OP_DEAL, OP_DRAW, OP_TAKE, OP_MELD, OP_ADD, OP_DISCARD, OP_HAND, OP_BOARD, OP_PASS, OP_END, OP_SCORE,
+ OP_JOIN, OP_BOT, OP_LEAVE) = range(1, 15)
+MELD_CODES = {'Book': 0, 'Run': 1}
+MELD_TYPES = ('Book', 'Run')
+UNKNOWN = 255
+SHORT = struct.Struct('>H')
+SCORE = struct.Struct('>i')
+
+archive_path = getattr(settings, 'PLAYCARDS_HAND_ARCHIVE', '')
+
+
+# shuffles a deck with the random number generator and keeps the card ids of the shuffled deck
+class RecordedShuffle:
+    def __init__(self, rng):
+        self.rng = rng
+        self.order = b''
+
+    def shuffle(self, deck):
+        self.rng.shuffle(deck)
+        self.order = bytes([card.card_id for card in deck])
+
+
+# encode a name - the length of the UTF-8 name (2 bytes) and the UTF-8 name
+def encode_name(name):
+    encoded = name.encode()
+    return SHORT.pack(len(encoded)) + encoded
+
+
+# get the player's index in the game's players (UNKNOWN when the player is not in the game)
+def player_index(game, player):
+    try:
+        return game.players.index(player)
+    except ValueError:
+        return UNKNOWN
+
+
+# the card id of each meld card of a game board item
+def meld_ids(item):
+    return [models.CARD_IDS[(meld_card['suit'], meld_card['faceval'])] for meld_card in item['meld_cards']]
+
+
+# start the game's record with the DEAL of a new hand - the players before the deal, the dealer, the active
+#   player and winner before the deal, the target score, the number of jokers and the shuffled deck (nothing
+#   is recorded when the game's recording is disabled - history is None)
+def record_deal(game, dealer, order, active_player):
+    if game.history is None:
+        return
+    history = bytearray([OP_DEAL, len(game.players)])
+    for player in game.players:
+        history += encode_name(player)
+        history.append(1 if player in game.bots else 0)
+        history += SCORE.pack(game.scores.get(player, 0))
+    history += encode_name(dealer) + encode_name(active_player) + encode_name(game.winner)
+    history += SCORE.pack(game.target_score)
+    history.append(game.number_of_jokers)
+    history += SHORT.pack(len(order)) + order
+    game.history = history
+    game.history_deck = len(game.deck)
+
+
+# record the cards drawn from the deck by the player (index) since the last opcode recorded - returns the
+#   number of cards drawn
+def record_draws(game, ndx):
+    draws = game.history_deck - len(game.deck)
+    for count in range(draws):
+        game.history += bytes([OP_DRAW, ndx])
+    game.history_deck = len(game.deck)
+    return draws
+
+
+# record the player picking up the top count cards of the discard pile before the turn is applied (the cards
+#   are moved to the hand after it is recorded, see GameSettings.take_discards) - the cards drawn since the
+#   last opcode recorded are recorded first
+def record_take(game, player, count):
+    if not game.history:
+        return
+    ndx = player_index(game, player)
+    record_draws(game, ndx)
+    game.history += bytes([OP_TAKE, ndx, count])
+
+
+# record the opcodes of the player's turn - the difference between the game (before the turn is applied) and
+#   the hand, discard pile and game board posted.  Nothing is recorded until a hand is dealt
+def record_turn(game, player, hand, discards, game_board_items):
+    history = game.history
+    if not history:
+        return
+    ndx = player_index(game, player)
+
+    # the cards drawn from the deck since the last opcode recorded
+    draws = record_draws(game, ndx)
+
+    # the cards picked up from the discard pile (the top cards removed) and the cards discarded
+    old_discards = game.discards
+    keep = 0
+    while keep < len(old_discards) and keep < len(discards) and old_discards[keep] is discards[keep]:
+        keep += 1
+    taken = old_discards[keep:]
+    if taken:
+        history += bytes([OP_TAKE, ndx, len(taken)])
+
+    # the cards played to the game board - added before or after each meld, and the new melds
+    old_board = game.game_board_items
+    played = []
+    board_ops = bytearray()
+    consistent = len(game_board_items) >= len(old_board)
+    for index, item in enumerate(game_board_items):
+        if not consistent:
+            break
+        meld_cards = item['meld_cards']
+        if index < len(old_board):
+            old_cards = old_board[index]['meld_cards']
+            if meld_cards == old_cards:
+                continue
+            head = 0
+            while head + len(old_cards) <= len(meld_cards) and meld_cards[head:head + len(old_cards)] != old_cards:
+                head += 1
+            if item['type'] != old_board[index]['type'] or head + len(old_cards) > len(meld_cards):
+                consistent = False
+                break
+            additions = [(0, meld_cards[:head]), (1, meld_cards[head + len(old_cards):])]
+        else:
+            if item['type'] not in MELD_CODES:
+                consistent = False
+                break
+            additions = [(None, meld_cards)]
+        for position, cards in additions:
+            if not cards:
+                continue
+            if any([meld_card['player'] != player for meld_card in cards]):
+                consistent = False
+                break
+            ids = meld_ids({'meld_cards': cards})
+            played.extend(ids)
+            if position is None:
+                board_ops += bytes([OP_MELD, ndx, MELD_CODES[item['type']], len(ids)] + ids)
+            else:
+                board_ops += bytes([OP_ADD, ndx, index, position, len(ids)] + ids)
+    if consistent:
+        history += board_ops
+    else:
+        # the game board changed in a way the opcodes can not express - record the whole game board
+        played = None
+        history += bytes([OP_BOARD, len(game_board_items)])
+        for item in game_board_items:
+            ids = meld_ids(item)
+            history += bytes([MELD_CODES.get(item['type'], UNKNOWN), len(ids)])
+            for card_id, meld_card in zip(ids, item['meld_cards']):
+                history += bytes([card_id, player_index(game, meld_card['player'])])
+
+    added = discards[keep:]
+    for card in added:
+        history += bytes([OP_DISCARD, ndx, card.card_id])
+
+    # the hand posted follows from the turn when it is the previous hand (with or without the cards drawn)
+    #   with the cards picked up added, and the cards played and discarded removed
+    remaining = Counter([card.card_id for card in game.player_cards.get(player, [])])
+    remaining.update([card.card_id for card in taken])
+    if played is not None:
+        remaining.subtract(played)
+    remaining.subtract([card.card_id for card in added])
+    remaining.subtract([card.card_id for card in hand])
+    drawn = -sum(remaining.values())
+    if played is None or any([count > 0 for count in remaining.values()]) or drawn not in (0, draws):
+        history += bytes([OP_HAND, ndx, len(hand)] + [card.card_id for card in hand])
+    history += bytes([OP_PASS, ndx])
+
+
+# record the opcodes of the player's turn applied move by move (see moves.py, recorded before the moves are
+#   applied) - the cards drawn before the moves, an opcode for each move and the PASS
+def record_moves(game, player, moves):
+    history = game.history
+    if not history:
+        return
+    ndx = player_index(game, player)
+    record_draws(game, ndx)
+    for move in moves:
+        if move[0] == 'draw':
+            history += bytes([OP_DRAW, ndx])
+            game.history_deck -= 1
+        elif move[0] == 'take':
+            history += bytes([OP_TAKE, ndx, move[1]])
+        elif move[0] == 'meld':
+            history += bytes([OP_MELD, ndx, MELD_CODES[move[1]], len(move[2])] + move[2])
+        elif move[0] == 'add':
+            history += bytes([OP_ADD, ndx, move[1], move[2], len(move[3])] + move[3])
+        elif move[0] == 'discard':
+            history += bytes([OP_DISCARD, ndx, move[1]])
+    history += bytes([OP_PASS, ndx])
+
+
+# record the completion of the player's turn (scoring.complete_turn) and whether the player discarded
+def record_end(game, player, discarded):
+    if game.history:
+        game.history += bytes([OP_END, player_index(game, player), 1 if discarded else 0])
+
+
+# record the scoring of the hand (scoring.end_hand)
+def record_score(game):
+    if game.history:
+        game.history.append(OP_SCORE)
+
+
+# record a player joining the game while a hand is played
+def record_join(game, player):
+    if game.history:
+        game.history += bytes([OP_JOIN]) + encode_name(player)
+
+
+# record that the player joining the game is a bot
+def record_bot(game, player):
+    if game.history:
+        game.history += bytes([OP_BOT, player_index(game, player)])
+
+
+# record a player leaving the game while a hand is played (recorded before the player is removed)
+def record_leave(game, player):
+    if game.history:
+        game.history += bytes([OP_LEAVE, player_index(game, player)])
+
+
+# append the record of the game's hand to the hand archive (PLAYCARDS_HAND_ARCHIVE) - framed with the game id
+#   (see journal.encode_frame), read with journal.read_frames
+def archive_hand(game_id, game):
+    if archive_path and game.history:
+        with open(archive_path, 'ab') as archive:
+            archive.write(journal.encode_frame(game_id, bytes(game.history)))
+
@@ -0,0 +1,238 @@
+"""
+NAME
+    hints.py
+
+DESCRIPTION
+    Finds the legal plays for a player's hand - the new books and runs the hand can play to the game
+    board, and the cards the hand can add before or after each meld already on the game board (see
+    melds.py for the rules).  The plays are used to give hints to the players and by the bots.
+
+    Jokers and the cards with the face value of the wild card are used as wild cards.  Each play holds
+    at least one natural card (or extends a meld on the game board), and the wild cards of a play are
+    taken from the hand in a fixed order so a play is listed once:
+        new books                  -- each selection of the natural cards of a face value, completed
+                                      with 0 or more wild cards to reach 3 cards
+        new runs                   -- each window of consecutive ranks of a suit (ace low to ace high)
+                                      holding a natural card, the missing ranks filled with wild cards.
+                                      The natural ranks of each suit are kept as a bitboard (bit 0 is an
+                                      ace played low, bits 1-12 are 2 to K, bit 13 is an ace played
+                                      high) so a window is checked with a mask and a bit count
+        additions                  -- cards of the book's face value and wild cards added after a book,
+                                      or the ranks before or after a run (naturals or wild cards)
+    Every play is checked with melds.check_meld before it is listed.
+
+    The plays are memoized by the hand's card multiset (the sorted card ids), the wild card, and the
+    game board (or, for additions, the meld on the game board), so repeated queries during a turn are
+    near-free and a changed game board only finds the additions to the melds that changed.
+
+CLASS
+    Play                           -- a legal play: the meld type, the game board index and position
+                                      (None for a new meld), and the cards played
+
+FUNCTIONS
+    hand_key                       -- get the memoization key of a hand (the sorted card ids)
+    selections                     -- get each distinct selection (sub-multiset) of a list of card ids
+    new_melds                      -- (memoized) get the new books and runs of a hand
+    meld_additions                 -- (memoized) get the cards a hand can add to a meld on the game board
+    board_plays                    -- (memoized) get the plays of a hand for a wild card and game board
+    find_plays                     -- get all the legal plays of a hand for the wild card and game board
+    play_dicts                     -- convert plays to dictionaries (JSON formatted responses)
+
+DATA
+    HINT_CACHE_SIZE                -- the number of memoized hands (and melds) kept
+"""
+
+import functools
+import itertools
+from collections import namedtuple
+
+from . import melds, models
+
+HINT_CACHE_SIZE = 4096
+RANKS = len(models.all_facevals)    # the face values of a suit - the card id is 13 * suit index + face value index
+
+# a legal play - the meld type (Book or Run), the index of the meld on the game board and the position the
+#   cards are added ('Before' or 'After') - both None for a new meld - and the cards played (Card objects)
+Play = namedtuple('Play', ['meld_type', 'index', 'position', 'cards'])
+
+
+# get the memoization key of a hand - the sorted card ids (the hand's card multiset)
+def hand_key(cards):
+    return tuple(sorted([card.card_id for card in cards]))
+
+
+# get the card id of a suit (index) and run rank (0 and 13 are the ace)
+def rank_card_id(suit_index, rank):
+    return RANKS * suit_index + (rank - 1 if 0 < rank < RANKS + 1 else RANKS - 1)
+
+
+# get each distinct non-empty selection (sub-multiset) of the card ids
+def selections(ids):
+    found = set()
+    for size in range(1, len(ids) + 1):
+        found.update(itertools.combinations(sorted(ids), size))
+    return sorted(found, key=lambda selection: (len(selection), selection))
+
+
+# split a hand (sorted card ids) into its natural cards and wild cards (jokers first)
+def split_hand(key, wild_card):
+    wild_mask = melds.WILD_MASKS.get(wild_card, melds.WILD_MASKS[''])
+    naturals = [card_id for card_id in key if not wild_mask >> card_id & 1]
+    wilds = tuple(sorted([card_id for card_id in key if wild_mask >> card_id & 1], reverse=True))
+    return naturals, wilds
+
+
+# the run bitboard of each suit (bit per rank, an ace sets bits 0 and 13) and the count of each natural card
+def suit_bitboards(naturals):
+    bitboards = [0] * len(models.all_suits)
+    counts = {}
+    for card_id in naturals:
+        if card_id != models.JOKER_ID:
+            bitboards[card_id // RANKS] |= melds.RANK_MASKS[card_id]
+            counts[card_id] = counts.get(card_id, 0) + 1
+    return bitboards, counts
+
+
+# fill the ranks of a suit with the natural cards of the hand and the wild cards - returns the card ids in
+#   rank order, None when there are not enough wild cards (counts is updated with the naturals used)
+def fill_ranks(suit_index, ranks, counts, wilds):
+    ids = []
+    wild_ndx = 0
+    for rank in ranks:
+        card_id = rank_card_id(suit_index, rank)
+        if counts.get(card_id):
+            counts[card_id] -= 1
+            ids.append(card_id)
+        elif wild_ndx < len(wilds):
+            ids.append(wilds[wild_ndx])
+            wild_ndx += 1
+        else:
+            return None
+    return ids
+
+
+# get the new books and runs the hand (sorted card ids) can play for the wild card - a tuple of
+#   (meld type, card ids)
+@functools.lru_cache(maxsize=HINT_CACHE_SIZE)
+def new_melds(key, wild_card):
+    naturals, wilds = split_hand(key, wild_card)
+    plays = []
+
+    # books - each selection of the natural cards of a face value completed with wild cards
+    faces = {}
+    for card_id in naturals:
+        faces.setdefault(models.CARDS[card_id].faceval, []).append(card_id)
+    for face_ids in faces.values():
+        for chosen in selections(face_ids):
+            for wild_count in range(max(0, melds.MIN_MELD_CARDS - len(chosen)), len(wilds) + 1):
+                plays.append(('Book', chosen + wilds[:wild_count]))
+
+    # runs - each window of ranks of a suit holding a natural card, missing ranks filled with wild cards
+    bitboards, counts = suit_bitboards(naturals)
+    for suit_index, bitboard in enumerate(bitboards):
+        if not bitboard:
+            continue
+        for start in range(melds.RUN_RANKS - melds.MIN_MELD_CARDS + 1):
+            for length in range(melds.MIN_MELD_CARDS, melds.RUN_RANKS - start + 1):
+                window = ((1 << length) - 1) << start
+                present = bin(bitboard & window).count('1')
+                if length - present > len(wilds):
+                    break   # windows only get longer - more ranks are missing
+                if not present:
+                    continue
+                ids = fill_ranks(suit_index, range(start, start + length), dict(counts), wilds)
+                if ids is not None:
+                    plays.append(('Run', tuple(ids)))
+
+    legal = []
+    for meld_type, ids in plays:
+        try:
+            melds.check_meld(meld_type, ids, wild_card)
+            legal.append((meld_type, ids))
+        except melds.InvalidMeld:
+            pass
+    return tuple(legal)
+
+
+# get the cards the hand (sorted card ids) can add to a meld (type and card ids) on the game board - a tuple
+#   of (position, card ids), cards are added after a book, and before or after a run
+@functools.lru_cache(maxsize=HINT_CACHE_SIZE)
+def meld_additions(key, wild_card, meld_type, meld_ids):
+    naturals, wilds = split_hand(key, wild_card)
+    wild_mask = melds.WILD_MASKS.get(wild_card, melds.WILD_MASKS[''])
+    meld_naturals = [card_id for card_id in meld_ids if not wild_mask >> card_id & 1]
+    plays = []
+    if meld_type == 'Book':
+        # the natural cards of the book's face value (any face value when the book is all wild cards)
+        book_faces = set([models.CARDS[card_id].faceval for card_id in meld_naturals])
+        faces = {}
+        for card_id in naturals:
+            if not book_faces or models.CARDS[card_id].faceval in book_faces:
+                faces.setdefault(models.CARDS[card_id].faceval, []).append(card_id)
+        choices = [()]
+        for face_ids in faces.values():
+            choices.extend(selections(face_ids))
+        for chosen in choices:
+            for wild_count in range(0 if chosen else 1, len(wilds) + 1):
+                plays.append(('After', chosen + wilds[:wild_count]))
+    elif meld_naturals:
+        # the ranks covered by the run (low to high) and whether it was played ascending
+        ascending = True
+        starts = melds.run_starts(list(meld_ids), wild_mask)
+        if not starts:
+            ascending = False
+            starts = melds.run_starts(list(meld_ids)[::-1], wild_mask)
+        if starts:
+            low = (starts & -starts).bit_length() - 1
+            high = low + len(meld_ids) - 1
+            suit_index = meld_naturals[0] // RANKS
+            bitboards, counts = suit_bitboards(naturals)
+            # the ranks above the run, then the ranks below the run
+            for ranks, above in ([range(high + 1, high + 1 + count) for count in range(1, melds.RUN_RANKS - high)], True), \
+                                ([range(low - count, low) for count in range(1, low + 1)], False):
+                for rank_range in ranks:
+                    ids = fill_ranks(suit_index, rank_range, dict(counts), wilds)
+                    if ids is None:
+                        break   # longer extensions need more wild cards
+                    if above == ascending:
+                        plays.append(('After', tuple(ids) if ascending else tuple(ids[::-1])))
+                    else:
+                        plays.append(('Before', tuple(ids) if ascending else tuple(ids[::-1])))
+
+    legal = []
+    for position, ids in plays:
+        played = list(meld_ids) + list(ids) if position == 'After' else list(ids) + list(meld_ids)
+        try:
+            melds.check_meld(meld_type, played, wild_card)
+            legal.append((position, ids))
+        except melds.InvalidMeld:
+            pass
+    return tuple(legal)
+
+
+# get the legal plays of a hand (sorted card ids) for the wild card and the game board (a tuple of the meld
+#   type and card ids of each game board item) - the new melds followed by the additions to each meld
+@functools.lru_cache(maxsize=HINT_CACHE_SIZE)
+def board_plays(key, wild_card, board_key):
+    plays = [Play(meld_type, None, None, tuple([models.CARDS[card_id] for card_id in ids]))
+             for meld_type, ids in new_melds(key, wild_card)]
+    for index, (meld_type, meld_ids) in enumerate(board_key):
+        if meld_type not in melds.MELD_TYPES:
+            continue
+        for position, ids in meld_additions(key, wild_card, meld_type, meld_ids):
+            plays.append(Play(meld_type, index, position, tuple([models.CARDS[card_id] for card_id in ids])))
+    return tuple(plays)
+
+
+# get all the legal plays of a hand (Card objects, ie. Games.get_player_cards) for the wild card and the
+#   game board items - the new melds followed by the additions to each meld on the game board
+def find_plays(hand, wild_card, game_board_items):
+    board_key = tuple([(item['type'], tuple(melds.card_ids(item['meld_cards']))) for item in game_board_items])
+    return list(board_plays(hand_key(hand), wild_card, board_key))
+
+
+# convert plays to dictionaries (the cards as suit and face value) for JSON formatted responses
+def play_dicts(plays):
+    return [{"type": play.meld_type, "index": play.index, "position": play.position,
+             "cards": [{"suit": card.suit, "faceval": card.faceval} for card in play.cards]}
+            for play in plays]
@@ -0,0 +1,249 @@
+"""
+NAME
+    journal.py
+
+DESCRIPTION
+    Makes the games kept in memory survive a restart.  Each change to a game (create, join, deal, turn,
+    draw, exit - every Games.save_game) appends the game's compact record (see stores.encode_game) to a
+    write-ahead journal, and a removed game appends an empty record.  The journal is a directory of
+    numbered files:
+        journal-<n>.log            -- the journal segments, the records appended in order
+        snapshot-<n>.bin           -- the records of every game when segment n was started (compacted)
+    Each record is framed with its length, the length of its game id and a CRC32, so a segment torn by a
+    crash is replayed up to its last complete record.
+
+    The records are written by a single thread with group commit - all the records appended while the
+    previous batch was being written are written with one write() and made durable with one fsync().
+    When PLAYCARDS_JOURNAL_SYNC is set, saving a game waits until its record is durable.  Once a segment
+    reaches PLAYCARDS_JOURNAL_SNAPSHOT_BYTES a new segment is started and a snapshot of every game is
+    written in the background, after which the older segments and snapshots are deleted.
+
+    On startup the games are restored by loading the latest snapshot and replaying the segments written
+    since (the last record of each game wins), then a new segment is started.  Each record is the whole
+    game, so replaying a record the snapshot already holds is harmless.
+
+CLASS
+    Journal                        -- the write-ahead journal and snapshots of the games in a directory
+
+METHODS
+                        Journal Class
+    __init__                       -- initialize the journal kept in a directory
+    path                           -- get the path of a journal segment or snapshot
+    files                          -- get the numbers of the journal segments and snapshots in the directory
+    restore                        -- get the latest record of each game and start a new segment
+    append                         -- append a game's record (empty when the game was removed)
+    wait                           -- wait until an appended record is durable
+    flush                          -- wait until every appended record is durable
+    close                          -- write the appended records and stop the writing thread
+    run                            -- (thread) write the appended records with group commit
+    rotate                         -- start a new segment and write the snapshot of every game
+    compact                        -- write the snapshot of a segment and delete the older files
+
+FUNCTIONS
+    encode_frame                   -- frame a game's record (lengths and CRC32)
+    read_frames                    -- get the (game_id, record) of each complete frame in a file
+
+DATA
+    SNAPSHOT_BYTES                 -- the default size of a segment before a snapshot is written
+"""
+
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BYTES = 64 * 1024 * 1024
+FRAME = struct.Struct('>IIH')   # the record length, the CRC32 of the game id and record, the game id length
+FILE_NAME = re.compile(r'^(journal|snapshot)-(\d+)\.(log|bin)$')
+
+
+# frame a game's record - the record length, the CRC32 of the game id and record, the game id length, the
+#   game id (UTF-8) and the record
+def encode_frame(game_id, record):
+    game_key = game_id.encode()
+    body = game_key + record
+    return FRAME.pack(len(record), zlib.crc32(body), len(game_key)) + body
+
+
+# get the (game_id, record) of each complete frame in the file - the frames after a torn or corrupt frame
+#   (the file was being written when the process stopped) are not read
+def read_frames(path):
+    with open(path, 'rb') as file:
+        data = memoryview(file.read())
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc, id_length = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        end = start + id_length + length
+        if end > len(data) or zlib.crc32(data[start:end]) != crc:
+            logger.warning("journal %s ends with a torn record at %d", path, offset)
+            return
+        yield bytes(data[start:start + id_length]).decode(), bytes(data[start + id_length:end])
+        offset = end
+
+
+# the write-ahead journal and snapshots of the games kept in a directory
+class Journal:
+    # initialize the journal kept in the directory - sync waits for each record to be durable when the game
+    #   is saved, and a snapshot is written each time a segment reaches snapshot_bytes
+    def __init__(self, directory, sync=True, snapshot_bytes=SNAPSHOT_BYTES):
+        self.directory = directory
+        self.sync = sync
+        self.snapshot_bytes = snapshot_bytes
+        self.source = None          # returns the (game_id, record) of every game (set by the store)
+        self.segment = 0            # the number of the segment being written
+        self._file = None
+        self._size = 0              # the bytes written to the segment
+        self._pending = []          # the frames appended and not yet written
+        self._appended = 0          # the sequence number of the last record appended
+        self._committed = 0         # the sequence number of the last record written and fsync'ed
+        self.commits = 0            # the batches written (fsync'ed)
+        self._closing = False
+        self._compacting = None     # the thread writing a snapshot
+        self._thread = None
+        self._pid = None
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()     # held while writing to (or replacing) the segment
+
+    # get the path of a journal segment or snapshot
+    def path(self, kind, number):
+        return os.path.join(self.directory, kind + '-%08d.' % number + ('log' if kind == 'journal' else 'bin'))
+
+    # get the numbers of the journal segments and the snapshots in the directory
+    def files(self):
+        found = {'journal': [], 'snapshot': []}
+        for name in os.listdir(self.directory):
+            match = FILE_NAME.match(name)
+            if match:
+                found[match.group(1)].append(int(match.group(2)))
+        return sorted(found['journal']), sorted(found['snapshot'])
+
+    # get the latest record of each game - the latest snapshot's records replaced by the records of the
+    #   segments written since (a game removed by an empty record) - and start a new segment
+    def restore(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments, snapshots = self.files()
+        records = {}
+        base = snapshots[-1] if snapshots else 0
+        if snapshots:
+            records.update(read_frames(self.path('snapshot', base)))
+        for number in segments:
+            if number >= base:
+                for game_id, record in read_frames(self.path('journal', number)):
+                    if record:
+                        records[game_id] = record
+                    else:
+                        records.pop(game_id, None)
+        self.segment = max(segments + snapshots + [0]) + 1
+        self._file = open(self.path('journal', self.segment), 'ab')
+        self._size = 0
+        return records
+
+    # append a game's record (empty when the game was removed) - returns the record's sequence number
+    def append(self, game_id, record):
+        if self._pid != os.getpid():
+            self._start()
+        frame = encode_frame(game_id, record)
+        with self._condition:
+            self._pending.append(frame)
+            self._appended += 1
+            self._condition.notify_all()
+            return self._appended
+
+    # wait until the record with the sequence number is durable
+    def wait(self, sequence):
+        with self._condition:
+            self._condition.wait_for(lambda: self._committed >= sequence or self._closing)
+
+    # wait until every appended record is durable
+    def flush(self):
+        self.wait(self._appended)
+
+    # write the appended records and stop the writing thread (and wait for a snapshot being written)
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._compacting is not None:
+            self._compacting.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # start the thread writing the records
+    def _start(self):
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            if self._file is None:
+                self.restore()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    # (thread) write the appended records - the records appended while a batch is written and fsync'ed are
+    #   written together in the next batch (group commit)
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closing)
+                if not self._pending:
+                    return
+                batch = self._pending
+                self._pending = []
+                sequence = self._appended
+            data = b''.join(batch)
+            with self._write_lock:
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._size += len(data)
+            with self._condition:
+                self._committed = sequence
+                self.commits += 1
+                self._condition.notify_all()
+            if self._size >= self.snapshot_bytes and self.source is not None and \
+                    (self._compacting is None or not self._compacting.is_alive()):
+                self.rotate()
+
+    # start a new segment and write the snapshot of every game in the background (the records appended
+    #   before the new segment was started are all held by the snapshot)
+    def rotate(self, background=True):
+        with self._write_lock:
+            self._file.close()
+            self.segment += 1
+            self._file = open(self.path('journal', self.segment), 'ab')
+            self._size = 0
+        if background:
+            self._compacting = threading.Thread(target=self.compact, args=(self.segment,), daemon=True)
+            self._compacting.start()
+        else:
+            self.compact(self.segment)
+
+    # write the snapshot of the segment (the records of every game) and delete the older segments and
+    #   snapshots - the snapshot is written to a temporary file and renamed, so it is never read half written
+    def compact(self, segment):
+        path = self.path('snapshot', segment)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(b''.join([encode_frame(game_id, record) for game_id, record in self.source()]))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        segments, snapshots = self.files()
+        for number in segments:
+            if number < segment:
+                os.unlink(self.path('journal', number))
+        for number in snapshots:
+            if number < segment:
+                os.unlink(self.path('snapshot', number))
@@ -0,0 +1,419 @@
+"""
+NAME
+    loadtest.py
+
+DESCRIPTION
+    Load tests the server with many games played at the same time through the HTTP interface, as the
+    players' browsers do:
+        /create/, /join/           -- each game is created by its first player and joined by the others
+        /stream/<game_id>/<user>   -- a server sent events (SSE) stream is opened for every player and
+                                      tracks the game updates received by the player
+        /deal/<game_id>/<user>     -- the first player deals (again when the draw pile is empty) - posted
+                                      as the game page does, so every player's stream is sent the deal
+        draw_card, turn_complete_post
+                                   -- the active player draws the top card of the draw pile and discards
+                                      it (the turns are played from the state received on the streams)
+    The games are played from a thread each.  The report holds the turns per second, the latency from
+    each turn being posted to the update arriving on every other player's stream (p50, p95, p99), the
+    events received, the errors, and the server's memory per game (the growth of the server's resident
+    memory divided by the number of games - for a server in this process it includes the client's
+    threads).
+
+    The load test is run with the loadtest management command.  By default the server is started in this
+    process (the Django WSGI server on a free local port) - the client and the server then share the
+    interpreter, so an external server (ie. an ASGI server running playcards.asgi) gives the truer numbers:
+        python manage.py loadtest [--games N] [--players N] [--turns N] [--url URL] [--server-pid PID]
+                                  [--output FILE]
+    The report is JSON so the reports of releases can be compared.
+
+CLASS
+    HttpClient                     -- sends the requests of the players (with the CSRF token of the forms)
+    StreamReader                   -- (thread) reads a player's SSE stream and tracks the game state received
+    GameDriver                     -- (thread) creates, joins, deals and plays the turns of a game
+
+METHODS
+                        HttpClient Class
+    __init__                       -- get the CSRF token (cookie and form field) from the server
+    request                        -- send a request, returns the status and the body
+                        StreamReader Class
+    run                            -- (thread) read the stream's events, recording the arrival of each version
+    apply                          -- apply an update (full or delta) to the game state received
+    wait_for                       -- wait until the stream received a version of the game
+    close                          -- close the stream's connection
+                        GameDriver Class
+    run                            -- (thread) play the game: create, join, open the streams, deal and play
+    deal                           -- a player deals the cards (again when the draw pile is empty)
+    play_turn                      -- the active player draws and discards the top card of the draw pile
+
+FUNCTIONS
+    percentile                     -- get a percentile of a sorted list of values
+    memory_rss                     -- get the resident memory (bytes) of a process
+    start_server                   -- start the Django WSGI server in this process on a free local port
+    stop_server                    -- end the streams held by the server in this process and stop the server
+    end_game                       -- the player exits the game (the games are removed after the load test)
+    run_load_test                  -- run the load test and return the report
+
+DATA
+    STREAM_TIMEOUT                 -- the seconds to wait for an update on a stream before it is an error
+"""
+
+import http.client
+import json
+import os
+import platform
+import re
+import threading
+import time
+import urllib.parse
+
+import django
+
+STREAM_TIMEOUT = 10     # the seconds to wait for an update on a stream before it is an error
+
+
+# get a percentile (0-100) of a sorted list of values (None when there are no values)
+def percentile(values, pct):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+# get the resident memory (bytes) of a process (this process by default), None when it can not be read
+def memory_rss(pid='self'):
+    try:
+        with open('/proc/' + str(pid) + '/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# sends the requests of the players - the CSRF token is read from the create game form once and sent with
+#   every POST (as the cookie and the form field)
+class HttpClient:
+    def __init__(self, base_url):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.cookie = ''
+        self.token = ''
+        status, body = self.request('GET', '/create/')
+        match = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', body)
+        if match:
+            self.token = match.group(1)
+
+    # send a request (form fields are POSTed), returns the status and the body (the redirect is not followed)
+    def request(self, method, path, fields=None):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=STREAM_TIMEOUT)
+        try:
+            headers = {'Cookie': self.cookie} if self.cookie else {}
+            body = None
+            if fields is not None:
+                fields = dict(fields, csrfmiddlewaretoken=self.token)
+                body = urllib.parse.urlencode(fields)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            cookie = re.search(r'csrftoken=([^;]+)', response.getheader('Set-Cookie') or '')
+            if cookie:
+                self.cookie = 'csrftoken=' + cookie.group(1)
+            return response.status, response.read().decode()
+        finally:
+            connection.close()
+
+
+# (thread) reads a player's SSE stream - the arrival time of each version of the game is recorded, and the
+#   game state received (the active player, the discard pile, the game board and the player's cards) is
+#   kept as the player's browser does
+class StreamReader(threading.Thread):
+    def __init__(self, client, game_id, user_name):
+        super().__init__(daemon=True)
+        self.client = client
+        self.game_id = game_id
+        self.user_name = user_name
+        self.arrivals = {}      # the arrival time (perf_counter) of each version received
+        self.state = {'version': 0, 'active_player': '', 'discards': [], 'gameboard': [], 'player_cards': []}
+        self.events = 0
+        self.error = None
+        self._connection = None
+        self._condition = threading.Condition()
+
+    # (thread) open the stream (with version 0 so the game is sent at once) and read the events
+    def run(self):
+        try:
+            self._connection = http.client.HTTPConnection(self.client.host, self.client.port)
+            self._connection.request('GET', '/stream/' + self.game_id + '/' + self.user_name + '?version=0',
+                                     headers={'Cookie': self.client.cookie} if self.client.cookie else {})
+            response = self._connection.getresponse()
+            data = []
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.decode().rstrip('\r\n')
+                if line.startswith('data: '):
+                    data.append(line[len('data: '):])
+                elif not line and data:
+                    self.apply(json.loads('\n'.join(data)), time.perf_counter())
+                    data = []
+        except (OSError, http.client.HTTPException, ValueError) as error:
+            if self._connection is not None:
+                self.error = repr(error)
+        with self._condition:
+            self._condition.notify_all()
+
+    # apply an update (the full game or a delta from the version received) to the game state received
+    def apply(self, update, arrival):
+        with self._condition:
+            state = self.state
+            if update['type'] == 'update_game':
+                state.update({key: update[key] for key in ('active_player', 'discards', 'gameboard')})
+            else:
+                if 'active_player' in update:
+                    state['active_player'] = update['active_player']
+                if 'discards' in update:
+                    head, tail, cards = update['discards']
+                    old = state['discards']
+                    state['discards'] = old[:head] + cards + old[len(old) - tail:]
+                for index, head, cards in update.get('melds_extended', []):
+                    meld_cards = state['gameboard'][index]['meld_cards']
+                    meld_cards[head:head] = cards
+                state['gameboard'] = state['gameboard'] + update.get('melds_added', [])
+            if 'player_cards' in update:
+                state['player_cards'] = update['player_cards']
+            state['version'] = update['version']
+            self.arrivals[update['version']] = arrival
+            self.events += 1
+            self._condition.notify_all()
+
+    # wait until the stream received the version of the game (or a later version), returns False on a timeout
+    def wait_for(self, version, timeout=STREAM_TIMEOUT):
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.state['version'] >= version or not self.is_alive(), timeout) and \
+                self.state['version'] >= version
+
+    # close the stream's connection
+    def close(self):
+        connection = self._connection
+        self._connection = None
+        if connection is not None and connection.sock is not None:
+            try:
+                connection.sock.shutdown(2)
+            except OSError:
+                pass
+            connection.close()
+
+
+# (thread) plays a game through the HTTP interface - the game is created and joined, every player's stream
+#   is opened, the first player deals and the turns are played.  The posting time of each turn (and the
+#   version it published) is recorded to measure the turn to event latency
+class GameDriver(threading.Thread):
+    def __init__(self, client, game_id, options):
+        super().__init__(daemon=True)
+        self.client = client
+        self.game_id = game_id
+        self.options = options
+        self.players = ['p' + str(ndx) for ndx in range(options['players'])]
+        self.streams = {}
+        self.turns = []         # the (version published, posting time, player) of each turn
+        self.turns_played = 0
+        self.errors = []
+        self.version = 0        # the version of the game published by the last change
+
+    # (thread) play the game - create, join, open the streams, deal and play the turns
+    def run(self):
+        try:
+            status, body = self.client.request('POST', '/create/', {
+                'user_name': self.players[0], 'game_id': self.game_id, 'number_of_decks': self.options['decks'],
+                'number_of_jokers': self.options['jokers']})
+            if status != 302:
+                raise RuntimeError('create failed: ' + str(status))
+            self.version = 1
+            for player in self.players[1:]:
+                status, body = self.client.request('POST', '/join/', {'user_name': player, 'game_id': self.game_id})
+                if status != 302:
+                    raise RuntimeError('join failed: ' + str(status))
+                self.version += 1
+            for player in self.players:
+                self.streams[player] = StreamReader(self.client, self.game_id, player)
+                self.streams[player].start()
+            for player in self.players:
+                if not self.streams[player].wait_for(self.version):
+                    raise RuntimeError('stream of ' + player + ' not opened')
+            self.deal(self.players[0])
+            for turn in range(self.options['turns']):
+                self.play_turn()
+        except (RuntimeError, OSError, http.client.HTTPException, ValueError, KeyError) as error:
+            self.errors.append(repr(error))
+
+    # deal the cards (posted as the game page does - every player's stream, the dealer's included, is sent the
+    #   deal)
+    def deal(self, dealer):
+        status, body = self.client.request('POST', '/deal/' + self.game_id + '/' + dealer, {})
+        if status != 200:
+            raise RuntimeError('deal failed: ' + str(status))
+        self.version += 1
+        self.dealer = dealer
+        self.active = self.players[(self.players.index(dealer) + 1) % len(self.players)]
+
+    # the active player draws the top card of the draw pile and discards it - played from the state received
+    #   on the player's stream (the player's stream was not sent their own last turn)
+    def play_turn(self):
+        player = self.active
+        stream = self.streams[player]
+        if not stream.wait_for(self.version):
+            raise RuntimeError('update ' + str(self.version) + ' not received by ' + player)
+        with stream._condition:
+            hand = list(stream.state['player_cards'])
+            discards = list(stream.state['discards'])
+            gameboard = stream.state['gameboard']
+        status, body = self.client.request('POST', '/game-page/' + self.game_id + '/' + player + '/draw_card/', {})
+        if status == 400:
+            # the draw pile is empty - the deal passes to the player after the dealer
+            self.deal(self.players[(self.players.index(self.dealer) + 1) % len(self.players)])
+            return
+        if status != 200:
+            raise RuntimeError('draw failed: ' + str(status))
+        self.version += 1
+        card = json.loads(body)['card']
+        start = time.perf_counter()
+        status, body = self.client.request('POST', '/game-page/' + self.game_id + '/' + player + '/turn_complete_post/', {
+            'updated_players_hand': json.dumps(hand), 'discards': json.dumps(discards + [card]),
+            'game_board': json.dumps(gameboard)})
+        if status != 200:
+            raise RuntimeError('turn failed: ' + str(status) + ' ' + body[:200])
+        self.version += 1
+        self.turns.append((self.version, start, player))
+        self.turns_played += 1
+        self.active = self.players[(self.players.index(player) + 1) % len(self.players)]
+
+
+# start the Django WSGI server (threaded) in this process on a free local port - returns the server and its URL
+def start_server():
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    # a request handler not logging each request
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    # a server with a listen backlog for every stream being opened at once (connections refused by a full
+    #   backlog are retried after a second, hiding the latency being measured)
+    class LoadTestServer(ThreadedWSGIServer):
+        request_queue_size = 1024
+
+    server = LoadTestServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:' + str(server.server_address[1])
+
+
+# end the streams held by the server in this process (each stream is woken as a replaced stream so its thread
+#   ends) and stop the server
+def stop_server(server):
+    from . import views
+    for players in list(views.bus.notifiers.values()):
+        for notifier in list(players.values()):
+            notifier.stream_id += 1
+            notifier.set()
+    server.shutdown()
+    server.server_close()
+
+
+# the player exits the game - through the server at the client's URL, or in this process when there is no client
+#   (the server in this process was stopped)
+def end_game(client, game_id, player):
+    if client is None:
+        from . import updates, views
+        with views.games.game_lock(game_id):
+            views.games.remove_player(game_id, player)
+            views.bus.unsubscribe(game_id, player)
+            if not views.games.get_game(game_id):
+                updates.discard_game(game_id)
+        return
+    try:
+        client.request('GET', '/exit/' + game_id + '/' + player)
+    except (OSError, http.client.HTTPException):
+        pass
+
+
+# run the load test - the games are played at the same time (a thread each) against the server at the URL
+#   (started in this process when no URL is given).  The options hold the games, players, turns, decks, jokers,
+#   url and server_pid.  Returns the report (a dictionary, saved as JSON)
+def run_load_test(options):
+    server = None
+    url = options.get('url')
+    if not url:
+        server, url = start_server()
+        server_pid = os.getpid()
+    else:
+        server_pid = options.get('server_pid')
+    run_id = str(int(time.time() * 1000) % 1000000)
+    rss_before = memory_rss(server_pid) if server_pid else None
+    client = HttpClient(url)
+    drivers = [GameDriver(client, 'load' + run_id + 'g' + str(ndx), options) for ndx in range(options['games'])]
+    start = time.perf_counter()
+    for driver in drivers:
+        driver.start()
+    for driver in drivers:
+        driver.join()
+    elapsed = time.perf_counter() - start
+
+    # the turn to event latency of every other player in the game (the player posting the turn is not sent it)
+    latencies = []
+    missed = 0
+    for driver in drivers:
+        for player, stream in driver.streams.items():
+            versions = [version for version, posted, poster in driver.turns if poster != player]
+            if versions:
+                stream.wait_for(max(versions), STREAM_TIMEOUT if not driver.errors else 0)
+        for version, posted, player in driver.turns:
+            for other, stream in driver.streams.items():
+                if other == player:
+                    continue
+                if version in stream.arrivals:
+                    latencies.append((stream.arrivals[version] - posted) * 1000)
+                elif stream.state['version'] < version:
+                    missed += 1
+    latencies.sort()
+    rss_after = memory_rss(server_pid) if server_pid else None
+
+    # close the streams, end the games (the players exit) and stop the server
+    for driver in drivers:
+        for stream in driver.streams.values():
+            stream.close()
+    if server is not None:
+        stop_server(server)
+    for driver in drivers:
+        for player in driver.players:
+            end_game(client if server is None else None, driver.game_id, player)
+
+    turns = sum([driver.turns_played for driver in drivers])
+    errors = [error for driver in drivers for error in driver.errors] + \
+        [stream.error for driver in drivers for stream in driver.streams.values() if stream.error]
+    return {
+        'config': {key: options.get(key) for key in ('games', 'players', 'turns', 'decks', 'jokers')},
+        'server': url if server is None else 'in-process wsgi',
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'elapsed_sec': elapsed,
+        'turns': turns,
+        'turns_per_sec': turns / elapsed if elapsed else 0.0,
+        'events': sum([stream.events for driver in drivers for stream in driver.streams.values()]),
+        'latency_ms': {
+            'count': len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        },
+        'missed_events': missed,
+        'errors': errors,
+        'memory': {
+            'rss_before': rss_before,
+            'rss_after': rss_after,
+            'per_game_bytes': (rss_after - rss_before) // options['games']
+            if rss_before is not None and rss_after is not None and options['games'] else None,
+        },
+    }
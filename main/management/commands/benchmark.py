@@ -0,0 +1,35 @@
+"""
+NAME
+    benchmark.py
+
+DESCRIPTION
+    Management command running the game play benchmarks (see main/benchmarks.py):
+        python manage.py benchmark [name ...] [--iterations N] [--decks N] [--jokers N] [--players N]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmarks import BENCHMARKS
+
+
+# runs the selected benchmarks (all benchmarks when none are selected) and prints the results
+class Command(BaseCommand):
+    help = 'Runs the game play benchmarks: ' + ', '.join(BENCHMARKS)
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='benchmarks to run (default all)')
+        parser.add_argument('--iterations', type=int, default=10000)
+        parser.add_argument('--decks', type=int, default=2)
+        parser.add_argument('--jokers', type=int, default=6)
+        parser.add_argument('--players', type=int, default=10)
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        for name in names:
+            if name not in BENCHMARKS:
+                raise CommandError('Unknown benchmark: ' + name)
+        for name in names:
+            result = BENCHMARKS[name](options)
+            self.stdout.write(name + ': ' + ', '.join(
+                key + '=' + ('%.2f' % value if isinstance(value, float) else str(value))
+                for key, value in result.items()))
@@ -0,0 +1,44 @@
+"""
+NAME
+    loadtest.py
+
+DESCRIPTION
+    Management command load testing the server with many games played at the same time through the HTTP
+    interface (see main/loadtest.py) and writing the JSON report:
+        python manage.py loadtest [--games N] [--players N] [--turns N] [--decks N] [--jokers N]
+                                  [--url URL] [--server-pid PID] [--output FILE]
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.loadtest import run_load_test
+
+
+# runs the load test and writes the report (to the output file, or printed)
+class Command(BaseCommand):
+    help = 'Load tests the server with concurrent games and SSE streams and writes a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=10)
+        parser.add_argument('--players', type=int, default=4)
+        parser.add_argument('--turns', type=int, default=20, help='turns played in each game')
+        parser.add_argument('--decks', type=int, default=2)
+        parser.add_argument('--jokers', type=int, default=2)
+        parser.add_argument('--url', default=None,
+                            help='URL of a running server (default a server started in this process)')
+        parser.add_argument('--server-pid', type=int, default=None,
+                            help='process id of the running server (to report its memory per game)')
+        parser.add_argument('--output', default=None, help='file to write the JSON report to')
+
+    def handle(self, *args, **options):
+        if options['games'] < 1 or options['players'] < 2:
+            raise CommandError('The load test needs at least 1 game of 2 players')
+        report = run_load_test(options)
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report_json + '\n')
+        else:
+            self.stdout.write(report_json)
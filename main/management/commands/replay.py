@@ -0,0 +1,49 @@
+"""
+NAME
+    replay.py
+
+DESCRIPTION
+    Management command replaying the hands of a hand archive (see main/gamerecord.py and main/replay.py):
+        python manage.py replay ARCHIVE [--game GAME_ID] [--hand N] [--ops]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import replay
+
+
+# replays the archived hands (of a game, or a single hand) and prints the result of each hand, and each
+#   opcode with --ops
+class Command(BaseCommand):
+    help = 'Replays the hands of a hand archive (PLAYCARDS_HAND_ARCHIVE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='the hand archive file')
+        parser.add_argument('--game', default=None, help='replay only the hands of the game')
+        parser.add_argument('--hand', type=int, default=None, help='replay only the Nth hand (from 0) selected')
+        parser.add_argument('--ops', action='store_true', help='print the opcodes of each hand')
+
+    def handle(self, *args, **options):
+        try:
+            records = [(game_id, record) for game_id, record in replay.read_archive(options['archive'])
+                       if options['game'] is None or game_id == options['game']]
+        except OSError as error:
+            raise CommandError(str(error))
+        if options['hand'] is not None:
+            records = records[options['hand']:options['hand'] + 1]
+        start = time.perf_counter()
+        for game_id, record in records:
+            try:
+                game = replay.replay(record)
+            except ValueError as error:
+                self.stdout.write('game=%s: %s' % (game_id, error))
+                continue
+            self.stdout.write('game=%s, bytes=%d, dealer=%s, wild_card=%s, hand_scores=%s, winner=%s' % (
+                game_id, len(record), game.dealer, game.wild_card, game.hand_scores, game.winner))
+            if options['ops']:
+                for name, op_args in replay.decode(record):
+                    self.stdout.write('    %s %s' % (name, ' '.join([str(arg) for arg in op_args])))
+        seconds = time.perf_counter() - start
+        self.stdout.write('hands=%d, seconds=%.2f' % (len(records), seconds))
@@ -0,0 +1,52 @@
+"""
+NAME
+    simulate.py
+
+DESCRIPTION
+    Management command playing complete Blitz hands across a process pool (see main/simulation.py):
+        python manage.py simulate [--hands N] [--players N] [--decks N] [--jokers N]
+                                  [--policies greedy,random] [--target-score N] [--workers N] [--seed N]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import models
+from main.simulation import POLICIES, simulate
+
+
+# plays the hands and prints the hands/second, the hand endings and the results of each policy
+class Command(BaseCommand):
+    help = 'Plays complete Blitz hands with the player policies: ' + ', '.join(POLICIES)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hands', type=int, default=10000)
+        parser.add_argument('--players', type=int, default=4)
+        parser.add_argument('--decks', type=int, default=2)
+        parser.add_argument('--jokers', type=int, default=2)
+        parser.add_argument('--policies', default='greedy,random', help='policies cycled over the seats')
+        parser.add_argument('--target-score', type=int, default=models.TARGET_SCORE)
+        parser.add_argument('--workers', type=int, default=None, help='worker processes (default the CPUs)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        policies = options['policies'].split(',')
+        for name in policies:
+            if name not in POLICIES:
+                raise CommandError('Unknown policy: ' + name)
+        if options['players'] < 2:
+            raise CommandError('A game needs at least 2 players')
+        stats = simulate(options['hands'], {
+            'players': options['players'],
+            'decks': options['decks'],
+            'jokers': options['jokers'],
+            'policies': policies,
+            'target_score': options['target_score'],
+        }, options['workers'], options['seed'])
+        hands = stats['hands'] or 1
+        self.stdout.write('hands=%d, workers=%d, seconds=%.2f, hands_per_sec=%.2f, turns_per_hand=%.2f' % (
+            stats['hands'], stats['workers'], stats['seconds'], stats['hands_per_sec'], stats['turns'] / hands))
+        self.stdout.write('blitz=%d, last_turn=%d, stalled=%d, games=%d' % (
+            stats['blitz'], stats['last_turn'], stats['stalled'], stats['games']))
+        for name, counts in sorted(stats['policies'].items()):
+            self.stdout.write('%s: seat_hands=%d, points_per_hand=%.2f, wins=%d' % (
+                name, counts['seat_hands'], counts['points'] / (counts['seat_hands'] or 1), counts['wins']))
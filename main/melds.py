@@ -0,0 +1,144 @@
+"""
+NAME
+    melds.py
+
+DESCRIPTION
+    Validates the card melds played on the game board.  The game board posted by a player when their
+    turn is complete is checked against the game board held by the server and the game's wild card:
+        Book                       -- 3 or more cards of the same face value (any suits)
+        Run                        -- 3 or more cards of the same suit in consecutive order (ascending
+                                      or descending) as placed on the game board, aces are high
+                                      (Q, K, A) or low (A, 2, 3)
+    Jokers and cards with the face value of the current wild card substitute for any card.  The game
+    board items held by the server can only be extended - cards are added before or after an item's
+    cards (the cards already played keep the player they are credited to) and new items are added to the
+    end of the game board, the cards added credited to the player posting the turn.
+
+    Each card is represented by precomputed bitmasks (accessed by card id) so a meld is checked with
+    a few integer operations per card:
+        rank mask                  -- the ranks the card can take in a run (bit 0 is an ace played low,
+                                      bits 1-12 are 2 to K, bit 13 is an ace played high)
+        suit mask                  -- one bit for the card's suit
+        wild mask                  -- one bit per card id for the cards that are wild for a wild card
+    A run is valid when, for every natural card at position i, shifting its rank mask right by i leaves
+    a common bit - the rank of the run's first card.
+
+CLASS
+    InvalidMeld                    -- raised when a meld or a change to the game board is not allowed
+
+FUNCTIONS
+    card_ids                       -- get the card ids of a list of cards (dictionaries or Card objects)
+    run_starts                     -- get the ranks a run can start at (a bit per rank, 0 when no rank fits)
+    check_meld                     -- check a meld (type and cards) against the wild card
+    check_board                    -- check the game board after a turn against the game board before the turn
+
+DATA
+    MELD_TYPES                     -- the types of melds played on the game board
+    MIN_MELD_CARDS                 -- the minimum number of cards in a meld
+    RANK_MASKS                     -- the rank mask of each card accessed by card id
+    SUIT_MASKS                     -- the suit mask of each card accessed by card id (0 for jokers)
+    WILD_MASKS                     -- the wild mask of each wild card face value
+"""
+
+from . import models
+
+MELD_TYPES = ('Book', 'Run')
+MIN_MELD_CARDS = 3
+RUN_RANKS = len(models.all_facevals) + 1    # the ranks in a run - ace low, 2 to K, ace high
+
+# the rank mask of each card accessed by card id - an ace is played low (bit 0) or high (bit 13)
+RANK_MASKS = tuple([0 if card.card_id == models.JOKER_ID
+                    else (1 | 1 << (RUN_RANKS - 1)) if card.faceval == 'A'
+                    else 1 << (models.all_facevals.index(card.faceval) + 1)
+                    for card in models.CARDS])
+
+# the suit mask of each card accessed by card id (jokers have no suit)
+SUIT_MASKS = tuple([0 if card.card_id == models.JOKER_ID else 1 << models.all_suits.index(card.suit)
+                    for card in models.CARDS])
+
+# the wild mask of each wild card face value (no wild card before the cards are dealt) - jokers are always wild
+WILD_MASKS = {faceval: sum([1 << card.card_id for card in models.CARDS
+                            if card.card_id == models.JOKER_ID or card.faceval == faceval])
+              for faceval in [''] + models.all_facevals}
+
+
+# raised when a meld or a change to the game board is not allowed
+class InvalidMeld(ValueError):
+    pass
+
+
+# get the card ids of a list of cards - game board meld cards (dictionaries) or Card objects
+def card_ids(cards):
+    if cards and not isinstance(cards[0], dict):
+        return [card.card_id for card in cards]
+    try:
+        return [models.CARD_IDS[(card['suit'], card['faceval'])] for card in cards]
+    except (KeyError, TypeError):
+        raise InvalidMeld('Unknown card on the game board')
+
+
+# get the ranks the first card of a run of card ids can take (a bit per rank) - each natural card at
+#   position i must have the rank of the first card plus i, and the run must fit between ace low and ace high
+def run_starts(ids, wild_mask):
+    starts = (1 << (RUN_RANKS - len(ids) + 1)) - 1
+    for position, card_id in enumerate(ids):
+        if not wild_mask >> card_id & 1:
+            starts &= RANK_MASKS[card_id] >> position
+    return starts
+
+
+# check a meld (Book or Run) of card ids in the order placed on the game board against the wild card
+def check_meld(meld_type, ids, wild_card):
+    if meld_type not in MELD_TYPES:
+        raise InvalidMeld('Unknown meld type ' + str(meld_type))
+    if len(ids) < MIN_MELD_CARDS:
+        raise InvalidMeld(meld_type + ' needs at least ' + str(MIN_MELD_CARDS) + ' cards')
+    wild_mask = WILD_MASKS.get(wild_card, WILD_MASKS[''])
+    if meld_type == 'Book':
+        # the natural cards share one face value (an ace's low and high bits are the same face value)
+        ranks = 0
+        for card_id in ids:
+            if not wild_mask >> card_id & 1:
+                ranks |= RANK_MASKS[card_id] & ~1
+        if ranks & (ranks - 1):
+            raise InvalidMeld('Book cards must have the same face value')
+    else:
+        if len(ids) > RUN_RANKS:
+            raise InvalidMeld('Run has more than ' + str(RUN_RANKS) + ' cards')
+        suits = 0
+        for card_id in ids:
+            if not wild_mask >> card_id & 1:
+                suits |= SUIT_MASKS[card_id]
+        if suits & (suits - 1):
+            raise InvalidMeld('Run cards must have the same suit')
+        if not run_starts(ids, wild_mask) and not run_starts(ids[::-1], wild_mask):
+            raise InvalidMeld('Run cards must be in consecutive order')
+
+
+# check the game board after a player's turn against the game board held by the server - the existing
+#   items keep their type and cards (cards can only be added before or after them, the cards played keep
+#   their player), new items are added to the end of the game board, the cards added are credited to the
+#   player (when specified), and each new or extended item is a valid meld for the wild card
+def check_board(old_board, new_board, wild_card, player=None):
+    if len(new_board) < len(old_board):
+        raise InvalidMeld('Melds can not be removed from the game board')
+    for index, item in enumerate(new_board):
+        meld_cards = item['meld_cards']
+        ids = card_ids(meld_cards)
+        if index < len(old_board):
+            if item['type'] != old_board[index]['type']:
+                raise InvalidMeld('The type of a meld on the game board can not be changed')
+            old_cards = old_board[index]['meld_cards']
+            if meld_cards == old_cards:
+                continue
+            head = 0
+            while head < len(meld_cards) and meld_cards[head:head + len(old_cards)] != old_cards:
+                head += 1
+            if head == len(meld_cards):
+                raise InvalidMeld('Cards can only be added before or after a meld on the game board')
+            added = meld_cards[:head] + meld_cards[head + len(old_cards):]
+        else:
+            added = meld_cards
+        if player is not None and any([meld_card.get('player') != player for meld_card in added]):
+            raise InvalidMeld('The cards played must be credited to ' + player)
+        check_meld(item['type'], ids, wild_card)
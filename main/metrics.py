@@ -0,0 +1,223 @@
+"""
+NAME
+    metrics.py
+
+DESCRIPTION
+    Instruments the hot paths of the server - the create, join, deal and turn complete requests and the
+    fan-out of the game updates to the players' streams - and renders the measurements in the Prometheus
+    text exposition format (served at /metrics/, see views.py):
+        playcards_request_seconds          -- histogram of the request latency of each view
+        playcards_update_fanout            -- histogram of the streams woken by each published update
+        playcards_sse_event_bytes          -- histogram of the bytes of each SSE event sent to a player
+        playcards_sse_events_total         -- counter of the SSE events sent to the players
+        playcards_active_games             -- gauge of the games in the store
+        playcards_subscribers              -- gauge of the players' streams connected to this process
+        playcards_queued_updates           -- gauge of the updates held in the games' event logs
+        playcards_queued_updates_max       -- gauge of the most updates held by a single game's event log
+    The counters and histograms are kept by this process (each worker process is scraped separately),
+    and the gauges (registered by views.py) are read when the metrics are rendered.
+
+    The metrics are enabled with PLAYCARDS_METRICS in settings.py.  When disabled, recording a
+    measurement is a single flag check and the timed views are not wrapped at all.
+
+    The debug logging of the hot paths is sampled - sampled() lets through PLAYCARDS_LOG_SAMPLE_RATE of
+    the calls, and only when the logger is enabled for the level, so the per-turn details logged while
+    debugging cost nothing otherwise.
+
+CLASS
+    Counter                        -- a monotonically increasing count (for each set of label values)
+    Histogram                      -- the count of the observed values in fixed buckets, and their sum
+    Gauge                          -- a value read from a callback when the metrics are rendered
+
+METHODS
+                        Counter Class
+    inc                            -- add to the count of the label values
+    render                         -- the text exposition lines of the counter
+                        Histogram Class
+    observe                        -- count a value in its bucket and add it to the sum
+    render                         -- the text exposition lines of the histogram
+                        Gauge Class
+    render                         -- the text exposition lines of the gauge (the callback's values)
+
+FUNCTIONS
+    timed                          -- decorator observing the latency of a view in REQUEST_SECONDS
+    sampled                        -- returns True for the sampled calls logged at a level
+    render                         -- render every registered metric in the text exposition format
+    reset                          -- clear the counts of every counter and histogram (used during testing)
+
+DATA
+    enabled                        -- True when the metrics are recorded (PLAYCARDS_METRICS)
+    registry                       -- the registered metrics, in the order rendered
+    REQUEST_SECONDS, UPDATE_FANOUT, SSE_EVENT_BYTES, SSE_EVENTS
+                                   -- the metrics recorded by the views
+"""
+
+import bisect
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+FANOUT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+
+enabled = getattr(settings, 'PLAYCARDS_METRICS', True)
+log_sample_rate = getattr(settings, 'PLAYCARDS_LOG_SAMPLE_RATE', 0.01)
+registry = []
+
+
+# format the labels of a sample - {name="value",...} (empty without labels)
+def format_labels(label_names, label_values):
+    if not label_names:
+        return ''
+    return '{' + ','.join([name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                           for name, value in zip(label_names, label_values)]) + '}'
+
+
+# format a sample value - integers without a decimal point
+def format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+# a monotonically increasing count for each set of label values
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}        # the count of each tuple of label values
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    # add to the count of the label values
+    def inc(self, amount=1, *label_values):
+        if not enabled:
+            return
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    # the text exposition lines of the counter
+    def render(self):
+        lines = ['# HELP ' + self.name + ' ' + self.help_text, '# TYPE ' + self.name + ' counter']
+        with self._lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            lines.append(self.name + format_labels(self.label_names, label_values) + ' ' + format_value(value))
+        return lines
+
+
+# the count of the observed values in fixed buckets (the upper bounds, +Inf is added) and their sum for each
+#   set of label values
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self.values = {}        # the [bucket counts, sum] of each tuple of label values
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    # count a value in its bucket (the first upper bound >= value) and add it to the sum
+    def observe(self, value, *label_values):
+        if not enabled:
+            return
+        ndx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            counts[0][ndx] += 1
+            counts[1] += value
+
+    # the text exposition lines of the histogram - the cumulative count of each bucket, the sum and the count
+    def render(self):
+        lines = ['# HELP ' + self.name + ' ' + self.help_text, '# TYPE ' + self.name + ' histogram']
+        with self._lock:
+            values = sorted([(label_values, list(counts), total) for label_values, (counts, total) in self.values.items()])
+        label_names = self.label_names + ('le',)
+        for label_values, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else format_value(float(bound))
+                lines.append(self.name + '_bucket' + format_labels(label_names, label_values + (le,)) + ' ' +
+                             str(cumulative))
+            labels = format_labels(self.label_names, label_values)
+            lines.append(self.name + '_sum' + labels + ' ' + format_value(total))
+            lines.append(self.name + '_count' + labels + ' ' + str(cumulative))
+        return lines
+
+
+# a value read when the metrics are rendered - the callback returns the value, or a list of (label values,
+#   value) when the gauge has labels
+class Gauge:
+    def __init__(self, name, help_text, callback, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.label_names = label_names
+        registry.append(self)
+
+    # the text exposition lines of the gauge
+    def render(self):
+        lines = ['# HELP ' + self.name + ' ' + self.help_text, '# TYPE ' + self.name + ' gauge']
+        values = self.callback()
+        if not self.label_names:
+            values = [((), values)]
+        for label_values, value in values:
+            lines.append(self.name + format_labels(self.label_names, label_values) + ' ' + format_value(value))
+        return lines
+
+
+REQUEST_SECONDS = Histogram('playcards_request_seconds', 'Latency of the requests of each view in seconds.',
+                            LATENCY_BUCKETS, ('view',))
+UPDATE_FANOUT = Histogram('playcards_update_fanout', "Players' streams woken by each published game update.",
+                          FANOUT_BUCKETS)
+SSE_EVENT_BYTES = Histogram('playcards_sse_event_bytes', 'Bytes of each server sent event sent to a player.',
+                            BYTES_BUCKETS)
+SSE_EVENTS = Counter('playcards_sse_events_total', 'Server sent events sent to the players.')
+
+
+# decorator observing the latency of a view in REQUEST_SECONDS (labeled with the view's name) - the view is
+#   returned unwrapped when the metrics are disabled
+def timed(view):
+    if not enabled:
+        return view
+    name = view.__name__
+
+    @functools.wraps(view)
+    def timed_view(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, name)
+    return timed_view
+
+
+# returns True for the sampled calls (log_sample_rate of them) when the logger is enabled for the level
+def sampled(logger, level):
+    return logger.isEnabledFor(level) and random.random() < log_sample_rate
+
+
+# render every registered metric in the text exposition format
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# clear the counts of every counter and histogram (used during testing)
+def reset():
+    for metric in registry:
+        if isinstance(metric, (Counter, Histogram)):
+            with metric._lock:
+                metric.values = {}
@@ -11,10 +11,24 @@ CLASS
     GameSettings                   -- stores the settings for a particular game (current wild card,
                                       current card deck, list of players, each player's cards, the
                                       discard pile, items displayed on the game board, the number of
-                                      jokers, the active player, and the current dealer)
-    Card                           -- defines a playing card: the suit and face value (Note:
-                                      jokers have a suit of 'joker' and face value of 'joker')
-    Games                          -- stores all the currently active games
+                                      jokers, the active player, the current dealer, the version, the
+                                      scores - see scoring.py, the players that are bots - see bots.py,
+                                      the game record of the hand being played - see gamerecord.py, and
+                                      whether the active player drew this turn)
+    Card                           -- defines a playing card: the suit, face value and card id (Note:
+                                      jokers have a suit of 'joker' and face value of '?').  A single
+                                      Card instance is created for each card value (see CARDS) and
+                                      shared by all the games
+    HeldGameLock                   -- the lock of a game kept in a record store or a journaled store,
+                                      holding the game in the store while the lock is held (see
+                                      stores.RecordStore.hold and stores.JournaledStore.hold)
+    Games                          -- stores all the currently active games (in the selected store, see
+                                      stores.py - by default the games are kept in memory).  A change
+                                      to a game (a turn, a deal, a player joining or leaving) is made
+                                      while holding the game's lock, and readers creating the players'
+                                      updates hold the same lock, so a half-applied change is never
+                                      sent.  The locks are striped - each game uses one of LOCK_STRIPES
+                                      locks selected by the game_id, so games never wait on a global lock
 
 METHODS
                         GameSettings Class
@@ -25,14 +39,20 @@ METHODS
     get_wild_card                  -- getter - get the current wild card value
     set_wild_card                  -- setter - set the current wild card value
     get_players                    -- get the list of players in the game
-    get_top_card                   -- get the top card from the card deck
+    get_top_card                   -- get the top card from the card deck (the end of the deck list)
     append_card                    -- append a card to the card deck (when building the deck)
+    collect_cards                  -- return all the cards in play (hands, discard pile, game board)
+                                      to the card deck
+    deal                           -- shuffle the card deck and deal a Blitz round to all the players
     get_players_cards              -- get a list of all the players' cards (dictionary style)
     get_player_cards               -- get a list of a particular player's cards
     get_discards                   -- get a list of the cards in the discard pile
     get_game_board_items           -- get all the card melds and types of melds (book or run) from game board
     add_player                     -- add a player to the player list for a game
     add_player_cards               -- add cards to a selected player's hand
+    take_discards                  -- pick up the top cards of the discard pile into a player's hand
+    is_playing                     -- returns True when a hand is being played (dealt and not yet scored)
+    next_dealer                    -- get the player to deal the next hand (the deal passes to the left)
     del_player_cards               -- delete a card from a player's hand
     add_discards                   -- add a card to the discard pile
     del_discards                   -- delete the cards in the discard pile
@@ -43,16 +63,37 @@ METHODS
     get_active_player              -- getter - get the active player's name
     set_dealer                     -- setter - set the dealer's name
     get_dealer                     -- getter - get the current dealer's name
+    get_version                    -- getter - get the game's version (number of updates sent to players)
+    bump_version                   -- increment the game's version when an update is sent to players
+    get_scores                     -- getter - get each player's running total score
+    get_hand_scores                -- getter - get each player's score for the last hand scored
+    get_target_score               -- getter - get the score to reach to end the game
+    set_target_score               -- setter - set the score to reach to end the game
+    get_winner                     -- getter - get the winner of the game ("" until the game is won)
+    add_bot                        -- add a bot player (a computer opponent) to the game
+    get_bots                       -- getter - get the list of the game's bot players
                         Card Class
-    __init__                       -- initialize a card's value - suit and face value
+    __init__                       -- initialize a card's value - suit, face value and card id
     __gt__                         -- used to determine card order (used durirng testing)
     __str__                        -- used to print formatted string of card value (used during testing)
+                        Card Table
+    get_card                       -- get the shared Card instance for a suit and face value
+    picked_up                      -- get the top cards of the discard pile in the order they are picked up
                         Games Class
-    __init__                       -- initializes the games dictionary accessible by game_id
+    __init__                       -- initializes the games dictionary (store) accessible by game_id
+    game_lock                      -- get the lock held while changing or reading the specified game_id (the
+                                      game is read from a record store once while the lock is held)
+    save_game                      -- save the changes to the specified game_id to the store
+    is_in_memory                   -- returns True when the games are kept in memory (not in a record store)
     __str__                        -- used to print all games contents (used during testing)
     add_game                       -- adds a new game using the specified game_id
     add_player                     -- adds a player to an existing game using the player name and game_id
     pop_top_card                   -- obtains the top card from the deck of cards for the selected game_id
+    deal                           -- shuffles the deck and deals a Blitz round for the selected game_id
+                                      (the record of the previous hand is archived, see gamerecord.py)
+    apply_turn                     -- replaces the player's hand, the discard pile and the game board with
+                                      the result of the player's turn and makes the next player active
+                                      (the turn is recorded in the game record, see gamerecord.py)
     clear_deck                     -- clears the deck for the specified game
     append_card                    -- appends a card (suit, face value) to the deck for the specified game_id
     get_wild_card                  -- getter - get the current wild card value
@@ -78,19 +119,44 @@ METHODS
     get_active_player              -- getter - get the active player for the specified game_id, it is their turn
     set_dealer                     -- setter - set the current dealer for the specified game_id
     get_dealer                     -- getter - get the current dealer for the specified game_id
-    remove_player                  -- remove a player from the player list for a specified game_id
+    get_version                    -- getter - get the version of the game for the specified game_id
+    bump_version                   -- increment the version of the game for the specified game_id
+    get_scores                     -- getter - get each player's running total score for the specified game_id
+    get_hand_scores                -- getter - get each player's score for the last hand of the specified game_id
+    get_target_score               -- getter - get the score to reach for the specified game_id
+    set_target_score               -- setter - set the score to reach for the specified game_id
+    get_winner                     -- getter - get the winner of the specified game_id ("" until won)
+    add_bot                        -- adds a bot player to an existing game using the bot's name and game_id
+    get_bots                       -- getter - get the list of bot players for the specified game_id
+    is_bot                         -- returns True when the player is a bot in the specified game_id
+    remove_player                  -- remove a player from the player list for a specified game_id (the game
+                                      is removed when only bots remain)
     remove_game                    -- remove a game from the dictionary of games for the specified game_id
     print_game                     -- print the contents of the game for the specified game_id
 
 DATA
+    TARGET_SCORE                   -- the default score to reach to end the game
+    LOCK_STRIPES                   -- the number of locks shared by the games (see Games.game_lock)
+    CARDS                          -- the shared Card instances accessed by card id (0-51 are the
+                                      cards of each suit in face value order, JOKER_ID is the joker)
+    CARD_IDS                       -- the card id of each (suit, face value)
     games                          -- contains any active game data (settings, players, cards, ...)
 """
 
 import random
+import threading
+
+from . import gamerecord
 
 all_suits = ['spades', 'clubs', 'hearts', 'diamonds']
 all_facevals = ['2','3','4','5','6','7','8','9','10','J','Q','K', 'A']
 
+BLITZ_DEAL_VALUE_TEN = ['J', 'Q', 'K', 'A', '?']   # first cards dealt resulting in 10 cards being dealt
+
+TARGET_SCORE = 1000  # the default score to reach to end the game
+
+LOCK_STRIPES = 64   # the number of locks shared by the games - a game uses the lock selected by its game_id
+
 
 # Contains all the settings for a particular game play
 class GameSettings:
@@ -104,6 +170,19 @@ class GameSettings:
         self.number_of_jokers = 0   # the number of jokers in the game
         self.active_player = ""     # the name of the active player
         self.dealer = ""            # the name of the player that dealt the cards
+        self.version = 0            # incremented each time an update is sent to the players
+        self.scores = {}            # each player's running total score
+        self.hand_scores = {}       # each player's score for the hand once scored (cleared by a deal)
+        self.target_score = TARGET_SCORE    # the score to reach to end the game
+        self.out_player = ""        # the player that went out by discarding their last card (the hand
+                                    #   ends when their turn comes around again)
+        self.winner = ""            # the player with the highest score once the target score is reached
+        self.bots = []              # the players that are bots (their turns are played by the server)
+        self.history = bytearray()  # the game record of the hand being played (see gamerecord.py), None
+                                    #   when the game's hands are not recorded
+        self.history_deck = 0       # the number of cards in the deck when the last opcode was recorded
+        self.drawn = False          # the active player drew from the draw pile (or picked up from the
+                                    #   discard pile) this turn
 
     def __str__(self):
         return_string = "Deck Size="+str(len(self.deck)) + "\n"
@@ -132,14 +211,71 @@ class GameSettings:
     def get_players(self):
         return self.players
 
-    # return the top card from the card deck
+    # return the top card from the card deck (the top of the deck is the end of the list)
     def get_top_card(self):
-        return self.deck.pop(0)
+        return self.deck.pop()
 
     # append a card to the card deck
     def append_card(self, card):
         self.deck.append(card)
 
+    # return all the cards in play (each player's hand, the discard pile and the game board) to the deck
+    def collect_cards(self):
+        deck = self.deck
+        for player in self.player_cards:
+            deck.extend(self.player_cards[player])
+            self.player_cards[player] = []
+        deck.extend(self.discards)
+        self.discards = []
+        for item in self.game_board_items:
+            deck.extend([get_card(meld_card['suit'], meld_card['faceval']) for meld_card in item['meld_cards']])
+        self.game_board_items = []
+
+    # shuffle the cards and deal cards Blitz style - the first card dealt determines how many cards
+    #   the player is dealt, the dealer's first card is the wild card, and the next card is placed
+    #   on the discard pile.  The player after the dealer becomes the active player
+    def deal(self, dealer, rng=random):
+        active_player = self.active_player
+        shuffle = gamerecord.RecordedShuffle(rng)
+        self.collect_cards()
+        self.out_player = ""
+        self.hand_scores = {}
+        self.drawn = False
+        shuffle.shuffle(self.deck)
+        deck = self.deck
+        self.dealer = dealer
+        self.wild_card = ""
+
+        # set the active player to player after dealer
+        if dealer in self.players:
+            self.active_player = self.players[(self.players.index(dealer) + 1) % len(self.players)]
+
+        # deal each player's hand from the top of the deck
+        for player in self.players:
+            if not deck:
+                break
+            first_card = deck[-1]
+            if first_card.faceval in BLITZ_DEAL_VALUE_TEN:  # 10 cards will be dealt for non-numbered cards
+                cards_to_deal = 10
+            else:
+                cards_to_deal = int(first_card.faceval)  # the numerical value determines the # of cards to deal
+            cards_to_deal = min(cards_to_deal, len(deck))
+            hand = deck[-cards_to_deal:]
+            hand.reverse()
+            del deck[-cards_to_deal:]
+            self.player_cards[player] = hand
+
+            # set the wild card to the dealer's first card (Blitz rules)
+            if player == dealer:
+                self.wild_card = first_card.faceval
+
+        # place next card on discard pile
+        if deck:
+            self.discards.append(deck.pop())
+
+        # start the record of the hand (see gamerecord.py)
+        gamerecord.record_deal(self, dealer, shuffle.order, active_player)
+
     # getter - get the list of cards for each player
     def get_players_cards(self):
         return self.player_cards
@@ -158,13 +294,44 @@ class GameSettings:
 
     # add a player to the game
     def add_player(self, player):
+        gamerecord.record_join(self, player)
         self.players.append(player)
         self.player_cards[player] = []
+        self.scores.setdefault(player, 0)
 
     # add a card for a specified player in the game
     def add_player_cards(self, player, card):
         self.player_cards[player].append(card)
 
+    # pick up the top count cards of the discard pile into the player's hand (see picked_up) - the pick up is
+    #   recorded (see gamerecord.py).  Returns the cards picked up
+    def take_discards(self, player, count):
+        gamerecord.record_take(self, player, count)
+        taken = picked_up(self.discards, count)
+        self.player_cards[player] = self.player_cards[player] + taken
+        self.discards = self.discards[:len(self.discards) - count]
+        self.drawn = True
+        return taken
+
+    # returns True when a hand is being played - the cards were dealt and the hand is not yet scored
+    def is_playing(self):
+        return bool(self.dealer) and not self.hand_scores
+
+    # get the player to deal the next hand - the active player deals the first hand, then the deal passes to the
+    #   player after the dealer (a bot never deals, the next human player deals in its place).  "" when the game
+    #   has no human players
+    def next_dealer(self):
+        players = self.players
+        if not self.dealer:
+            start = players.index(self.active_player) if self.active_player in players else 0
+        else:
+            start = players.index(self.dealer) + 1 if self.dealer in players else 0
+        for ndx in range(len(players)):
+            player = players[(start + ndx) % len(players)]
+            if player not in self.bots:
+                return player
+        return ""
+
     # delete the list of cards for the specified player
     def del_player_cards(self, player):
         del self.player_cards[player]
@@ -190,7 +357,10 @@ class GameSettings:
 
     # remove a player from the game
     def remove_player(self, user_name):
+        gamerecord.record_leave(self, user_name)
         self.players.remove(user_name)
+        if user_name in self.bots:
+            self.bots.remove(user_name)
 
     # setter - set the active player to the specified user
     def set_active_player(self, user_name):
@@ -208,13 +378,56 @@ class GameSettings:
     def get_dealer(self):
         return self.dealer
 
+    # getter - get the game's version (the number of updates sent to the players)
+    def get_version(self):
+        return self.version
+
+    # increment the game's version when an update is sent to the players
+    def bump_version(self):
+        self.version += 1
+        return self.version
+
+    # getter - get each player's running total score
+    def get_scores(self):
+        return self.scores
 
-# contains the suit and face value for a particular card object
+    # getter - get each player's score for the last hand scored
+    def get_hand_scores(self):
+        return self.hand_scores
+
+    # getter - get the score to reach to end the game
+    def get_target_score(self):
+        return self.target_score
+
+    # setter - set the score to reach to end the game
+    def set_target_score(self, target_score):
+        self.target_score = target_score
+
+    # getter - get the winner of the game ("" until the game is won)
+    def get_winner(self):
+        return self.winner
+
+    # add a bot player (a computer opponent) to the game
+    def add_bot(self, bot):
+        self.add_player(bot)
+        self.bots.append(bot)
+        gamerecord.record_bot(self, bot)
+
+    # getter - get the list of the game's bot players
+    def get_bots(self):
+        return self.bots
+
+
+# contains the suit, face value and card id for a particular card object - cards are shared
+#   by all games (see CARDS) and must not be modified
 class Card:
-    # initialize the suit and face value for the card
-    def __init__(self, suit, faceval):
+    __slots__ = ('suit', 'faceval', 'card_id')
+
+    # initialize the suit, face value and card id for the card
+    def __init__(self, suit, faceval, card_id=None):
         self.suit = suit
         self.faceval = faceval
+        self.card_id = card_id
 
     # compare a card to another card (used during testing)
     def __gt__(self, other):
@@ -233,11 +446,78 @@ class Card:
         return self.faceval + " of " + self.suit
 
 
+# the shared Card instances accessed by card id, and the card id of each (suit, face value)
+JOKER_ID = len(all_suits) * len(all_facevals)
+CARDS = tuple([Card(suit, faceval, len(all_facevals) * sndx + fndx)
+               for sndx, suit in enumerate(all_suits)
+               for fndx, faceval in enumerate(all_facevals)] +
+              [Card('joker', '?', JOKER_ID)])
+CARD_IDS = {(card.suit, card.faceval): card.card_id for card in CARDS}
+
+
+# get the shared Card instance for the suit and face value (KeyError for an unknown card)
+def get_card(suit, faceval):
+    return CARDS[CARD_IDS[(suit, faceval)]]
+
+
+# get the top count cards of the discard pile in the order they are picked up - the order they lie on the
+#   pile, so the first card is the last card picked up (the card the player must play this turn)
+def picked_up(discards, count):
+    return discards[len(discards) - count:]
+
+
+# the lock of a game kept in a store holding its games (see Games.game_lock) - the game is held by the store
+#   while the lock is held: a record store reads the game once and saves the changes made under the lock over
+#   the revision read (see stores.RecordStore.hold), a journaled store waits for the records saved under the
+#   lock to be durable once the lock is released (see stores.JournaledStore.settle)
+class HeldGameLock:
+    def __init__(self, lock, store, game_id):
+        self.lock = lock
+        self.store = store
+        self.game_id = game_id
+        self.settle = getattr(store, 'settle', None)
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.store.hold(self.game_id)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.store.release(self.game_id)
+        finally:
+            self.lock.release()
+        if self.settle is not None:
+            self.settle()
+
+
 # contains all the active games in play
 class Games:
-    # Initialize the game dictionary - games accessed by game id selected by the users
-    def __init__(self):
-        self.games = {}
+    # Initialize the game dictionary - games accessed by game id selected by the users.  The games are
+    #   kept in the specified store (see stores.py), by default in memory
+    def __init__(self, store=None):
+        self.games = store if store is not None else {}
+        self.locks = [threading.RLock() for ndx in range(LOCK_STRIPES)]
+
+    # get the lock held while changing (or reading a consistent view of) the specified game_id - the lock
+    #   is reentrant so a change can publish the game's update while holding it
+    def game_lock(self, game_id):
+        lock = self.locks[hash(game_id) % LOCK_STRIPES]
+        if hasattr(self.games, 'hold'):
+            return HeldGameLock(lock, self.games, game_id)
+        return lock
+
+    # save the changes made to the specified game_id to the store (nothing to do when kept in a dictionary or
+    #   in memory without a journal).  A record store raises stores.StaleGame when another process saved the
+    #   game since it was read
+    def save_game(self, game_id):
+        save = getattr(self.games, 'save', None)
+        if save is not None:
+            save(game_id)
+
+    # returns True when the games are kept in memory (accessing a game does not block on a store)
+    def is_in_memory(self):
+        return isinstance(self.games, dict)
 
     # create custom string for printing all game contents (used during testing)
     def __str__(self):
@@ -249,23 +529,16 @@ class Games:
 
     # add a new game to the game object including: number_of_jokers and number_of decks
     def add_game(self, game_id, number_of_jokers, number_of_decks):
-        deck = []
-        self.games[game_id] = GameSettings()
-        # add the selected number of decks to the game deck
-        for deck_ctr in range(0,int(number_of_decks)):
-            # add each card (2,...10, J, Q,K, A) to the game deck
-            for suit in all_suits:
-                for faceval in all_facevals:
-                    card = Card(suit, faceval)
-                    deck.append(card)
+        game = GameSettings()
+        # add the selected number of decks to the game deck - each card (2,...10, J, Q,K, A) of each suit
+        deck = list(CARDS[:JOKER_ID]) * int(number_of_decks)
         if number_of_jokers is None:
             number_of_jokers = 2
         # add the selected number of jokers to the game deck
-        for i in range(0, number_of_jokers):
-            card = Card('joker', '?')
-            deck.append(card)
-        self.games[game_id].deck = deck
-        self.games[game_id].add_selections(number_of_jokers)
+        deck.extend([CARDS[JOKER_ID]] * number_of_jokers)
+        game.deck = deck
+        game.add_selections(number_of_jokers)
+        self.games[game_id] = game
 
     # add the specified player for the specified game_id
     def add_player(self, game_id, player):
@@ -278,14 +551,35 @@ class Games:
     def pop_top_card(self, game_id):
         return self.games[game_id].get_top_card()
 
+    # shuffle the deck and deal a Blitz round by the specified dealer for the specified game_id
+    def deal(self, game_id, dealer, rng=random):
+        game = self.games.get(game_id)
+        if game is not None:
+            gamerecord.archive_hand(game_id, game)
+            game.deal(dealer, rng)
+
+    # replace the player's hand, the discard pile and the game board with the result of the player's turn
+    #   (lists of Card objects and game board items) and make the player after the specified player active
+    def apply_turn(self, game_id, player, hand, discards, game_board_items):
+        game = self.games[game_id]
+        gamerecord.record_turn(game, player, hand, discards, game_board_items)
+        game.player_cards[player] = list(hand)
+        game.discards = list(discards)
+        game.game_board_items = list(game_board_items)
+        game.drawn = False
+        players = game.get_players()
+        if player in players:
+            game.set_active_player(players[(players.index(player) + 1) % len(players)])
+        else:
+            game.set_active_player(players[0])
+
     # clear the deck for the specified game_id
     def clear_deck(self, game_id):
         self.games[game_id].deck = []
 
     # append a card (suit, face value) to the deck for the specified game_id
     def append_card(self, game_id, suit, faceval):
-        card = Card(suit, faceval)
-        self.games[game_id].append_card(card)
+        self.games[game_id].append_card(get_card(suit, faceval))
 
     # get the current wild card for the specified game_id
     def get_wild_card(self, game_id):
@@ -297,10 +591,11 @@ class Games:
 
     # add a card to a player's hand for the specified player for the specified game_id
     def add_player_cards(self, game_id, player, card):
-        if game_id in self.games.keys():
-            players_cards = self.games[game_id].get_players_cards()
+        game = self.games.get(game_id)
+        if game is not None:
+            players_cards = game.get_players_cards()
             if player in players_cards.keys():
-                self.games[game_id].add_player_cards(player, card)
+                game.add_player_cards(player, card)
 
     # delete all cards for the specified player for the specified game_id
     def del_player_cards(self, game_id, player):
@@ -308,8 +603,9 @@ class Games:
 
     # add a card (suit, face value) to the discard pile for the specified game_id
     def add_discards(self, game_id, card):
-        if game_id in self.games.keys():
-            self.games[game_id].add_discards(card)
+        game = self.games.get(game_id)
+        if game is not None:
+            game.add_discards(card)
 
     # delete all cards from the discard pile for the specified game_id
     def del_discards(self, game_id):
@@ -317,8 +613,9 @@ class Games:
 
     # add cards and meld type (run or book) to the game board for the specified game_id
     def add_game_board_items(self, game_id, meld_type, meld_cards):
-        if game_id in self.games.keys():
-            self.games[game_id].add_game_board_items(meld_type, meld_cards)
+        game = self.games.get(game_id)
+        if game is not None:
+            game.add_game_board_items(meld_type, meld_cards)
 
     # delete all game board items for the specified game_id
     def del_game_board_items(self, game_id):
@@ -326,87 +623,172 @@ class Games:
 
     # getter - get the list of players for the specified game_id
     def get_players(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id].players
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.players
         else:
             return None
 
     # getter - get the list of cards for the specified player for the specified game_id
     def get_player_cards(self, game_id, user_name):
-        if game_id in self.games.keys():
-            players_cards = self.games[game_id].get_players_cards()
+        game = self.games.get(game_id)
+        if game is not None:
+            players_cards = game.get_players_cards()
             if user_name in players_cards.keys():
-                return self.games[game_id].get_player_cards(user_name)
+                return game.get_player_cards(user_name)
         return None
 
     # getter - get the list of cards in the discard pile for the specified game_id
     def get_discards(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id].get_discards()
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_discards()
 
     # getter - get the list of items (cards and meld_type-run or book) for the specified game_id
     def get_game_board_items(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id].get_game_board_items()
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_game_board_items()
 
     # getter - get the game contents for the specified game_id
     def get_game(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id]
+        game = self.games.get(game_id)
+        if game is not None:
+            return game
         else:
             return None
 
     # getter - get the deck of cards for the specified game_id
     def get_deck(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id].deck
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.deck
         else:
             return None
 
     # randomize the cards in the deck of cards for the specified game_id
     def shuffle(self, game_id):
-        if game_id in self.games.keys():
-            self.games[game_id].reset_game()
-            random.shuffle(self.games[game_id].deck)
-            return self.games[game_id].deck
+        game = self.games.get(game_id)
+        if game is not None:
+            game.reset_game()
+            random.shuffle(game.deck)
+            return game.deck
         else:
             return None
 
     # setter - set the active player in the game for the specified game_id
     def set_active_player(self, game_id, player):
-        if game_id in self.games.keys():
-            self.games[game_id].set_active_player(player)
+        game = self.games.get(game_id)
+        if game is not None:
+            game.set_active_player(player)
 
     # getter - get the active player in the game for the specified game_id
     def get_active_player(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id].get_active_player()
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_active_player()
         else:
             return None
 
     # setter - set the dealer's name in the game for the specified game_id
     def set_dealer(self, game_id, dealer):
-        if game_id in self.games.keys():
-            self.games[game_id].set_dealer(dealer)
+        game = self.games.get(game_id)
+        if game is not None:
+            game.set_dealer(dealer)
 
     # getter - get the dealer's name in the game for the specified game_id
     def get_dealer(self, game_id):
-        if game_id in self.games.keys():
-            return self.games[game_id].get_dealer()
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_dealer()
+        else:
+            return None
+
+    # getter - get the version of the game for the specified game_id
+    def get_version(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_version()
+        else:
+            return None
+
+    # increment the version of the game for the specified game_id
+    def bump_version(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.bump_version()
+        else:
+            return None
+
+    # getter - get each player's running total score for the specified game_id
+    def get_scores(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_scores()
         else:
             return None
 
-    # remove a player from the game for the specified game_id
+    # getter - get each player's score for the last hand scored for the specified game_id
+    def get_hand_scores(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_hand_scores()
+        else:
+            return None
+
+    # getter - get the score to reach to end the game for the specified game_id
+    def get_target_score(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_target_score()
+        else:
+            return None
+
+    # setter - set the score to reach to end the game for the specified game_id
+    def set_target_score(self, game_id, target_score):
+        game = self.games.get(game_id)
+        if game is not None:
+            game.set_target_score(target_score)
+
+    # getter - get the winner of the game for the specified game_id ("" until the game is won)
+    def get_winner(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_winner()
+        else:
+            return None
+
+    # add the specified bot player for the specified game_id
+    def add_bot(self, game_id, bot):
+        if bot not in self.games[game_id].get_players():
+            self.games[game_id].add_bot(bot)
+
+    # getter - get the list of bot players for the specified game_id
+    def get_bots(self, game_id):
+        game = self.games.get(game_id)
+        if game is not None:
+            return game.get_bots()
+        else:
+            return None
+
+    # returns True when the player is a bot in the specified game_id
+    def is_bot(self, game_id, player):
+        return player in (self.get_bots(game_id) or [])
+
+    # remove a player from the game for the specified game_id - the game is removed when only bots remain
     def remove_player(self, game_id, player):
-        if game_id in self.games.keys():
-            if player in self.games[game_id].get_players():
-                self.games[game_id].remove_player(player)
-            if len(self.games[game_id].get_players()) == 0:
+        game = self.games.get(game_id)
+        if game is not None:
+            if player in game.get_players():
+                game.remove_player(player)
+            if len(game.get_players()) == len(game.get_bots()):
                 self.remove_game(game_id)
 
     # remove a game from the game dictionary using the specified game_id
     def remove_game(self, game_id):
-        if game_id in self.games.keys():
+        game = self.games.get(game_id)
+        if game is not None:
+            gamerecord.archive_hand(game_id, game)
             del self.games[game_id]
 
     # print the contents of all the games - used during testing
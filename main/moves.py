@@ -0,0 +1,246 @@
+"""
+NAME
+    moves.py
+
+DESCRIPTION
+    Applies a player's turn submitted as the ordered list of the moves made (see views.turnmovespost),
+    instead of the whole hand, discard pile and game board after the turn.  A turn is a JSON list of
+    moves, the cards are card ids (see models.CARDS):
+        ["draw"]                   -- draw the top card of the deck
+        ["take", count]            -- pick up the top count cards of the discard pile
+        ["meld", type, [cards]]    -- play a new Book or Run to the end of the game board
+        ["add", index, position, [cards]]
+                                   -- add cards before (0) or after (1) the meld at index of the game
+                                      board (a meld played earlier in the turn included)
+        ["discard", card]          -- discard a card from the hand (the last move of the turn)
+    ie. [["draw"], ["meld", "Book", [4, 17, 30]], ["add", 2, 1, [9]], ["discard", 51]].
+
+    The moves are checked against the game before anything is changed - it is the player's turn, the turn
+    starts with exactly one draw or pick up (none when the player already drew, see views.draw), the last
+    card picked up from the discard pile is played to the game board, each card played or discarded is in
+    the player's hand (as drawn and picked up by the earlier moves), and each new or extended meld is
+    valid for the wild card (see melds.py) - so a turn with an invalid move leaves the game as it was.  The
+    valid moves are then applied to the game's deck, discard pile, hand and game board in place, and
+    recorded an opcode per move (see gamerecord.record_moves), so a turn costs the cards moved rather than
+    the whole game state posted, parsed and compared.
+
+CLASS
+    InvalidMove                    -- raised when the moves can not be read or applied to the game
+
+    A turn posted as the whole hand, discard pile and game board after the turn (see views.turncompletepost)
+    is checked by the same rules (see check_turn) - the player drew (see views.draw) or picked up from the
+    discard pile, not both, the last card picked up is played to the game board, and the cards are conserved:
+    the cards of the hand before the turn (the cards drawn included) and the cards picked up from the discard
+    pile are the cards of the hand after the turn, the cards played to the game board and the card discarded.
+
+FUNCTIONS
+    parse_moves                    -- get the moves of a turn from its JSON
+    apply_moves                    -- check and apply the moves of the player's turn to the game
+    check_turn                     -- check the hand, discard pile and game board posted after the player's
+                                      turn (the draw, the card picked up played, the cards conserved),
+                                      returns whether the player discarded
+
+DATA
+    MOVES                          -- the moves of a turn
+    MAX_MOVES                      -- the most moves in a turn
+"""
+
+import json
+from collections import Counter
+
+from . import gamerecord, melds, models
+
+MOVES = ('draw', 'take', 'meld', 'add', 'discard')
+MAX_MOVES = 64
+
+
+# raised when the moves of a turn can not be read or applied to the game
+class InvalidMove(ValueError):
+    pass
+
+
+# get the card of a card id - raises InvalidMove when it is not a card id
+def move_card(card_id):
+    if not isinstance(card_id, int) or isinstance(card_id, bool) or not 0 <= card_id < len(models.CARDS):
+        raise InvalidMove('Unknown card ' + str(card_id)[:20])
+    return card_id
+
+
+# get a count or an index (an integer, least or more) of a move - raises InvalidMove when it is not
+def move_count(count, least=0):
+    if not isinstance(count, int) or isinstance(count, bool) or count < least:
+        raise InvalidMove('Invalid count ' + str(count)[:20])
+    return count
+
+
+# get the moves of a turn from its JSON (see above) - a list of tuples (the move's name and arguments, the cards
+#   as card ids).  Raises InvalidMove when the moves can not be read
+def parse_moves(text):
+    try:
+        data = json.loads(text)
+    except (ValueError, TypeError):
+        raise InvalidMove('The moves are not valid JSON')
+    if not isinstance(data, list) or len(data) > MAX_MOVES:
+        raise InvalidMove('The moves must be a list of at most ' + str(MAX_MOVES) + ' moves')
+    moves = []
+    for move in data:
+        if not isinstance(move, list) or not move or move[0] not in MOVES:
+            raise InvalidMove('Unknown move ' + str(move)[:40])
+        try:
+            if move[0] == 'draw':
+                moves.append(('draw',))
+            elif move[0] == 'take':
+                moves.append(('take', move_count(move[1], 1)))
+            elif move[0] == 'meld':
+                moves.append(('meld', move[1], [move_card(card_id) for card_id in move[2]]))
+            elif move[0] == 'add':
+                if move[2] not in (0, 1):
+                    raise InvalidMove('The position of an addition is 0 (before) or 1 (after)')
+                moves.append(('add', move_count(move[1]), move[2], [move_card(card_id) for card_id in move[3]]))
+            else:
+                moves.append(('discard', move_card(move[1])))
+        except (IndexError, TypeError):
+            raise InvalidMove('The ' + move[0] + ' move is missing its arguments')
+    return moves
+
+
+# remove the cards (card ids) from the hand (Card objects) - returns the cards removed.  Raises InvalidMove when
+#   a card is not in the hand
+def remove_cards(hand, ids):
+    cards = []
+    for card_id in ids:
+        card = models.CARDS[card_id]
+        if card not in hand:
+            raise InvalidMove('Card ' + card.faceval + '-' + card.suit + ' is not in the hand')
+        hand.remove(card)
+        cards.append(card)
+    return cards
+
+
+# the meld cards (game board dictionaries) of the cards played by the player
+def meld_cards(player, cards):
+    return [{"player": player, "suit": card.suit, "faceval": card.faceval} for card in cards]
+
+
+# check and apply the moves of the player's turn (see parse_moves) to the game (GameSettings) - the moves are
+#   checked before the game is changed, then recorded and applied, and the next player becomes the active
+#   player.  Returns whether the player discarded and the cards drawn from the deck.  Raises InvalidMove when
+#   a move can not be made, or melds.InvalidMeld when a meld played is not valid
+def apply_moves(game, player, moves):
+    if player not in game.players or player not in game.player_cards:
+        raise InvalidMove('Player not found')
+    if game.active_player != player:
+        raise InvalidMove('It is not the turn of ' + player)
+    draws = [ndx for ndx, move in enumerate(moves) if move[0] in ('draw', 'take')]
+    if game.drawn and draws:
+        raise InvalidMove('The player already drew this turn')
+    if not game.drawn and draws != [0]:
+        raise InvalidMove('The turn starts with one draw from the draw pile or pick up from the discard pile')
+    deck = game.deck
+    discards = game.discards
+    board = game.game_board_items
+    hand = list(game.player_cards[player])
+    drawn = []
+    taken = 0
+    required = None       # the last card picked up from the discard pile (played this turn)
+    changed = {}          # the game board items extended (by index)
+    new_items = []        # the game board items played
+    discard = None
+
+    # make the moves on the copy of the hand (the deck and discard pile are only looked at)
+    for move in moves:
+        if discard is not None:
+            raise InvalidMove('The discard must be the last move of the turn')
+        if move[0] == 'draw':
+            if len(drawn) >= len(deck):
+                raise InvalidMove('Draw pile is empty')
+            drawn.append(deck[len(deck) - len(drawn) - 1])
+            hand.append(drawn[-1])
+        elif move[0] == 'take':
+            if move[1] > len(discards):
+                raise InvalidMove('Not enough cards on the discard pile')
+            taken = move[1]
+            hand.extend(models.picked_up(discards, taken))
+            required = hand[-taken]
+        elif move[0] == 'meld':
+            if move[1] not in melds.MELD_TYPES:
+                raise InvalidMove('Unknown meld type ' + str(move[1])[:20])
+            cards = remove_cards(hand, move[2])
+            if required in cards:
+                required = None
+            new_items.append({"type": move[1], "meld_cards": meld_cards(player, cards)})
+        elif move[0] == 'add':
+            index = move[1]
+            if index < len(board):
+                item = changed.get(index, board[index])
+            elif index - len(board) < len(new_items):
+                item = new_items[index - len(board)]
+            else:
+                raise InvalidMove('No meld at ' + str(index) + ' on the game board')
+            cards = remove_cards(hand, move[3])
+            if required in cards:
+                required = None
+            added = meld_cards(player, cards)
+            item = {"type": item['type'],
+                    "meld_cards": added + item['meld_cards'] if move[2] == 0 else item['meld_cards'] + added}
+            if index < len(board):
+                changed[index] = item
+            else:
+                new_items[index - len(board)] = item
+        else:
+            discard = remove_cards(hand, [move[1]])[0]
+
+    # the last card picked up is played, and each new or extended meld is valid for the wild card
+    if required is not None:
+        raise InvalidMove('The last card picked up (' + required.faceval + '-' + required.suit + ') must be played')
+    for item in list(changed.values()) + new_items:
+        melds.check_meld(item['type'], melds.card_ids(item['meld_cards']), game.wild_card)
+
+    # the moves are valid - record them and apply them to the game
+    gamerecord.record_moves(game, player, moves)
+    if drawn:
+        del deck[len(deck) - len(drawn):]
+    if taken:
+        del discards[len(discards) - taken:]
+    if discard is not None:
+        discards.append(discard)
+    for index, item in changed.items():
+        board[index] = item
+    board.extend(new_items)
+    game.player_cards[player] = hand
+    game.drawn = False
+    players = game.players
+    game.active_player = players[(players.index(player) + 1) % len(players)]
+    return discard is not None, drawn
+
+
+# check the hand, discard pile (lists of Card objects) and game board (checked by melds.check_board) posted after
+#   the player's turn against the game - the player drew from the draw pile or picked up from the top of the
+#   discard pile (not both), the last card picked up is played to the game board, and the cards of the hand
+#   before the turn (with the cards drawn) and the cards picked up must be the cards of the hand posted, the
+#   cards added to the game board and at most one card discarded, as multisets.  Returns whether the player
+#   discarded.  Raises InvalidMove when the turn breaks a rule or the cards are not conserved
+def check_turn(game, player, hand, discards, game_board_items):
+    if player not in game.player_cards:
+        raise InvalidMove('Player not found')
+    old_discards = game.discards
+    keep = 0
+    while keep < len(old_discards) and keep < len(discards) and old_discards[keep] is discards[keep]:
+        keep += 1
+    taken = old_discards[keep:]
+    added = discards[keep:]
+    if len(added) > 1:
+        raise InvalidMove('Only one card can be discarded')
+    if taken and game.drawn:
+        raise InvalidMove('The player already drew this turn')
+    if not taken and not game.drawn:
+        raise InvalidMove('The turn starts with one draw from the draw pile or pick up from the discard pile')
+    played = Counter([card_id for item in game_board_items for card_id in melds.card_ids(item['meld_cards'])])
+    played.subtract([card_id for item in game.game_board_items for card_id in melds.card_ids(item['meld_cards'])])
+    if taken and played[taken[0].card_id] <= 0:
+        raise InvalidMove('The last card picked up (' + taken[0].faceval + '-' + taken[0].suit + ') must be played')
+    before = Counter([card.card_id for card in game.player_cards[player] + taken])
+    after = Counter([card.card_id for card in hand + added]) + played
+    if before != after:
+        raise InvalidMove('The cards of the turn do not add up')
+    return bool(added)
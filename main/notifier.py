@@ -0,0 +1,298 @@
+"""
+NAME
+    notifier.py
+
+DESCRIPTION
+    Provides the notifier used to wake a player's server sent event (SSE) stream when a game update
+    is available.  The notifier replaces the per-player threading.Event() so that a stream served
+    through ASGI waits inside the server's asyncio event loop instead of holding a worker thread for
+    as long as the player is connected.  A blocking wait is still provided for streams served
+    through WSGI (ie. the development server).
+
+    Each notifier counts the player's open streams, so the reaper (see reaper.py) can close the streams of
+    an evicted game and remove the notifiers of the players that went away without exiting the game.
+
+CLASS
+    UpdateNotifier                 -- signals a player's stream(s) that a game update is available
+
+METHODS
+                        UpdateNotifier Class
+    __init__                       -- initializes the notifier in the cleared state
+    set                            -- indicate an update is available and wake all waiting streams
+                                      (safe to call from any thread)
+    clear                          -- indicate the update for the player is complete
+    is_set                         -- returns True when an update is available
+    wait                           -- coroutine - wait without blocking the event loop until an update
+                                      is available
+    wait_blocking                  -- wait (blocking the calling thread) until an update is available
+    stream_opened                  -- count a stream of the player as open
+    stream_closed                  -- count a stream of the player as closed
+                        NotificationBus Class
+    subscribe                      -- get (or create) the notifier of a player's stream
+    unsubscribe                    -- remove the notifier of a player
+    get_notifier                   -- get the notifier of a player (None when not connected here)
+    open_streams                   -- get the number of streams of a game's players open in this process
+    close                          -- close the streams of a game's players and remove their notifiers
+    prune                          -- remove the notifiers without an open stream (the players went away)
+    publish                        -- publish a game update, waking the streams of the game's players
+                                      (returns the number of streams woken by this process)
+    wake                           -- wake the streams of a game's players held by this process
+                        UnixSocketBus Class
+    publish                        -- publish a game update to this and every other worker process
+    receive                        -- (thread) receive the updates from the other worker processes
+
+FUNCTIONS
+    create_bus                     -- create the notification bus selected in settings.py
+"""
+
+import asyncio
+import glob
+import os
+import socket
+import threading
+import time
+
+
+# wake the future of a waiting stream - always called in the future's event loop
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+# signals a player's stream(s) that a game update is available
+class UpdateNotifier:
+    # initialize the notifier in the cleared state
+    def __init__(self):
+        self.stream_id = 0                              # id of the player's active stream
+        self._flag = False                              # True when an update is available
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)   # used by blocking (WSGI) waiters
+        self._waiters = []                              # (event loop, future) of each async waiter
+        self.streams = 0                                # the number of the player's streams open
+        self.last_used = time.monotonic()               # when a stream last subscribed or closed
+
+    # indicate an update is available and wake all waiting streams
+    def set(self):
+        with self._lock:
+            self._flag = True
+            waiters = self._waiters
+            self._waiters = []
+            self._condition.notify_all()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass    # the event loop was closed - nothing left to wake
+
+    # indicate the update for the player is complete
+    def clear(self):
+        with self._lock:
+            self._flag = False
+
+    # returns True when an update is available
+    def is_set(self):
+        return self._flag
+
+    # wait without blocking the event loop until an update is available
+    async def wait(self):
+        with self._lock:
+            if self._flag:
+                return True
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        finally:
+            # remove the waiter when the stream was cancelled (ie. the player disconnected)
+            if future.cancelled():
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+        return True
+
+    # wait (blocking the calling thread) until an update is available, returns False when the timeout
+    #   expired first
+    def wait_blocking(self, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: self._flag, timeout)
+            return self._flag
+
+    # count a stream of the player as open
+    def stream_opened(self):
+        with self._lock:
+            self.streams += 1
+            self.last_used = time.monotonic()
+
+    # count a stream of the player as closed (the stream ended or the player disconnected)
+    def stream_closed(self):
+        with self._lock:
+            self.streams -= 1
+            self.last_used = time.monotonic()
+
+
+# holds the notifiers of the players connected to this process and wakes them when an update is published
+class NotificationBus:
+    def __init__(self):
+        self.notifiers = {}     # the UpdateNotifier of each player accessed by game_id and user_name
+        self._lock = threading.Lock()
+
+    # get (or create) the notifier of a player's stream
+    def subscribe(self, game_id, user_name):
+        with self._lock:
+            players = self.notifiers.setdefault(game_id, {})
+            if user_name not in players:
+                players[user_name] = UpdateNotifier()
+            notifier = players[user_name]
+            notifier.last_used = time.monotonic()
+            return notifier
+
+    # remove the notifier of a player (the player left the game)
+    def unsubscribe(self, game_id, user_name):
+        with self._lock:
+            players = self.notifiers.get(game_id)
+            if players is not None:
+                players.pop(user_name, None)
+                if not players:
+                    del self.notifiers[game_id]
+
+    # get the notifier of a player, None when the player is not connected to this process
+    def get_notifier(self, game_id, user_name):
+        return self.notifiers.get(game_id, {}).get(user_name)
+
+    # get the number of streams of the game's players open in this process
+    def open_streams(self, game_id):
+        return sum([notifier.streams for notifier in list(self.notifiers.get(game_id, {}).values())])
+
+    # close the streams of the game's players held by this process (each stream exits when woken with a
+    #   stream_id that is no longer active) and remove their notifiers - the game was removed
+    def close(self, game_id):
+        with self._lock:
+            players = self.notifiers.pop(game_id, {})
+        for notifier in players.values():
+            notifier.stream_id += 1
+            notifier.set()
+
+    # remove the notifiers that had no open stream for idle_seconds (the players closed their browsers
+    #   without exiting the game), returns the number removed
+    def prune(self, idle_seconds):
+        cutoff = time.monotonic() - idle_seconds
+        removed = 0
+        with self._lock:
+            for game_id, players in list(self.notifiers.items()):
+                for user_name, notifier in list(players.items()):
+                    if not notifier.streams and notifier.last_used < cutoff:
+                        del players[user_name]
+                        removed += 1
+                if not players:
+                    del self.notifiers[game_id]
+        return removed
+
+    # publish a game update - wake the streams of the game's players (except the specified player), returns
+    #   the number of streams woken
+    def publish(self, game_id, exclude=None):
+        return self.wake(game_id, exclude)
+
+    # wake the streams of the game's players held by this process (except the specified player), returns
+    #   the number of streams woken
+    def wake(self, game_id, exclude=None):
+        woken = 0
+        for user_name, notifier in list(self.notifiers.get(game_id, {}).items()):
+            if user_name != exclude:
+                notifier.set()
+                woken += 1
+        return woken
+
+
+# notification bus delivering the updates to all the worker processes - each worker binds a Unix domain
+#   datagram socket named <pid>.sock in the shared directory, and an update is sent to every socket in
+#   the directory.  A receiving thread in each worker wakes the streams held by the worker
+class UnixSocketBus(NotificationBus):
+    def __init__(self, socket_dir):
+        super().__init__()
+        self.socket_dir = socket_dir
+        self._pid = None
+        self._socket = None     # this worker's socket receiving the updates
+        self._sender = None     # non-blocking socket sending the updates to the other workers
+        self._path = None
+
+    # bind this worker's socket and start the receiving thread (again after a fork)
+    def _bind(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.socket_dir, exist_ok=True)
+            self._path = os.path.join(self.socket_dir, str(os.getpid()) + '.sock')
+            if os.path.exists(self._path):
+                os.unlink(self._path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(self._path)
+            self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sender.setblocking(False)
+            self._pid = os.getpid()
+            threading.Thread(target=self.receive, args=(self._socket,), daemon=True).start()
+
+    # get (or create) the notifier of a player's stream
+    def subscribe(self, game_id, user_name):
+        self._bind()
+        return super().subscribe(game_id, user_name)
+
+    # publish a game update to this worker and to every other worker process, returns the number of streams
+    #   woken by this worker
+    def publish(self, game_id, exclude=None):
+        self._bind()
+        woken = self.wake(game_id, exclude)
+        message = (game_id + '\0' + (exclude or '')).encode()
+        for path in glob.glob(os.path.join(self.socket_dir, '*.sock')):
+            if path == self._path:
+                continue
+            try:
+                self._sender.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # the worker owning the socket is gone - remove the stale socket
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                pass    # the worker is not keeping up - it is already waking the game's streams
+        return woken
+
+    # (thread) receive the updates from the other worker processes - all the pending updates are
+    #   read before waking the streams so each game's streams are woken once per batch
+    def receive(self, sock):
+        while True:
+            try:
+                batch = [sock.recv(4096)]
+            except OSError:
+                return      # the socket was closed
+            try:
+                while True:
+                    batch.append(sock.recv(4096, socket.MSG_DONTWAIT))
+            except OSError:
+                pass
+            updated = {}
+            for message in batch:
+                game_id, _, exclude = message.decode().partition('\0')
+                exclude = exclude or None
+                # a player is only excluded when every update of the game in the batch excluded them
+                if game_id in updated and updated[game_id] != exclude:
+                    updated[game_id] = None
+                else:
+                    updated[game_id] = exclude
+            for game_id, exclude in updated.items():
+                self.wake(game_id, exclude)
+
+
+# create the notification bus selected by PLAYCARDS_NOTIFICATION_BUS in settings.py
+def create_bus():
+    from django.conf import settings
+    bus = getattr(settings, 'PLAYCARDS_NOTIFICATION_BUS', 'local')
+    if bus == 'local':
+        return NotificationBus()
+    if bus == 'unix':
+        return UnixSocketBus(getattr(settings, 'PLAYCARDS_BUS_SOCKET_DIR', '/tmp/playcards-bus'))
+    raise ValueError('Unknown PLAYCARDS_NOTIFICATION_BUS: ' + str(bus))
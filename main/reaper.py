@@ -0,0 +1,155 @@
+"""
+NAME
+    reaper.py
+
+DESCRIPTION
+    Keeps the memory of a long running server flat.  Games are only removed when their last player exits,
+    so the games of players that closed their browsers, the game's cached snapshot and event log (see
+    updates.py) and the players' notifiers (see notifier.py) would otherwise stay in memory forever.  A
+    background thread (started when the app is ready unless PLAYCARDS_REAPER_AUTOSTART is off, see apps.py)
+    sweeps the games resident in the process every PLAYCARDS_REAPER_INTERVAL seconds:
+        idle games                 -- a game that has not changed (its version) for
+                                      PLAYCARDS_GAME_IDLE_SECONDS and has no open stream in the process
+        abandoned games            -- a game that has not changed for PLAYCARDS_GAME_ABANDONED_SECONDS, even
+                                      with streams open (ie. a browser tab left open)
+        resident game cap          -- the least recently changed games over PLAYCARDS_MAX_RESIDENT_GAMES
+        orphaned notifiers         -- the notifiers of players without an open stream for the idle time
+    An evicted game's snapshot and event log are discarded and its streams are closed.  Only the resident
+    game is dropped (see stores.py) - with a record store (PLAYCARDS_GAME_STORE 'sqlite' or 'keyvalue')
+    the game stays in persistent storage, with the in-memory store (journaled or not) the game is parked
+    as its compact record, and the game is decoded again when a player returns.  A game is only removed
+    from the in-memory store when it is abandoned - resident or parked, it has not changed for
+    PLAYCARDS_GAME_ABANDONED_SECONDS.
+
+    The streams end themselves once their player is gone: a superseded stream (the player refreshed the
+    page, see views.stream) is woken so it exits at once, and a stream sends an SSE comment every
+    PLAYCARDS_STREAM_KEEPALIVE_SECONDS without updates so a disconnected player's stream fails its write
+    and is closed.
+
+CLASS
+    Reaper                         -- evicts the idle and abandoned games and enforces the resident game cap
+
+METHODS
+                        Reaper Class
+    __init__                       -- initialize the reaper of the games and notification bus
+    start                          -- start the sweeping thread (again in a forked worker process)
+    stop                           -- stop the sweeping thread
+    run                            -- (thread) sweep every interval seconds until stopped
+    sweep                          -- evict the idle and abandoned games, enforce the resident game cap,
+                                      remove the abandoned parked games and prune the orphaned notifiers
+    evict                          -- evict a game from the process and close its streams
+
+DATA
+    GAMES_EVICTED                  -- counter of the evicted games by reason (see metrics.py)
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics, updates
+
+logger = logging.getLogger(__name__)
+
+GAMES_EVICTED = metrics.Counter('playcards_games_evicted_total', 'Games evicted from the process by the reaper.',
+                                ('reason',))
+
+
+# evicts the idle and abandoned games resident in the process and enforces the resident game cap
+class Reaper:
+    # initialize the reaper of the games (models.Games) and the notification bus - the settings are
+    #   read from settings.py unless specified
+    def __init__(self, games, bus, interval=None, idle_seconds=None, abandoned_seconds=None, max_games=None):
+        self.games = games
+        self.bus = bus
+        self.interval = interval if interval is not None else getattr(settings, 'PLAYCARDS_REAPER_INTERVAL', 60)
+        self.idle_seconds = (idle_seconds if idle_seconds is not None
+                             else getattr(settings, 'PLAYCARDS_GAME_IDLE_SECONDS', 3600))
+        self.abandoned_seconds = (abandoned_seconds if abandoned_seconds is not None
+                                  else getattr(settings, 'PLAYCARDS_GAME_ABANDONED_SECONDS', 86400))
+        self.max_games = max_games if max_games is not None else getattr(settings, 'PLAYCARDS_MAX_RESIDENT_GAMES', 10000)
+        self.changed = {}       # the (version, time the version was first seen) of each resident game
+        self.parked = {}        # the time each parked game last changed (see stores.MemoryStore.evict)
+        self._pid = None
+        self._stop = threading.Event()
+
+    # start the sweeping thread (nothing to do when the interval is 0) - the thread is started again in a
+    #   forked worker process, threads do not survive a fork
+    def start(self):
+        if not self.interval or self._pid == os.getpid():
+            return
+        if self._pid is None:
+            os.register_at_fork(after_in_child=self.start)
+        self._pid = os.getpid()
+        self._stop.clear()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    # stop the sweeping thread
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    # (thread) sweep the games every interval seconds until stopped
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("reaper sweep failed")
+
+    # evict the idle and abandoned games, then the least recently changed games over the resident game cap,
+    #   remove the parked games abandoned, and prune the notifiers of the players without an open stream -
+    #   returns the (game_id, reason) of each game evicted
+    def sweep(self, now=None):
+        now = time.monotonic() if now is None else now
+        store = self.games.games
+        changed = {}
+        evicted = []            # the (game_id, reason, (version, time the version was first seen)) evicted
+        for game_id in store.resident_ids():
+            version = self.games.get_version(game_id)
+            seen = self.changed.get(game_id)
+            if seen is None or seen[0] != version:
+                seen = (version, now)
+            idle = now - seen[1]
+            if idle >= self.abandoned_seconds:
+                evicted.append((game_id, 'abandoned', seen))
+            elif idle >= self.idle_seconds and not self.bus.open_streams(game_id):
+                evicted.append((game_id, 'idle', seen))
+            else:
+                changed[game_id] = seen
+        if self.max_games and len(changed) > self.max_games:
+            oldest = sorted(changed, key=lambda game_id: changed[game_id][1])
+            for game_id in oldest[:len(changed) - self.max_games]:
+                evicted.append((game_id, 'capacity', changed.pop(game_id)))
+
+        # a parked game is removed once it has not changed for the abandoned time (a parked game read again is
+        #   resident, its idle time starts again)
+        parked = {}
+        for game_id in store.parked_ids():
+            time_changed = self.parked.get(game_id, now)
+            if now - time_changed >= self.abandoned_seconds:
+                evicted.append((game_id, 'abandoned', None))
+            else:
+                parked[game_id] = time_changed
+        for game_id, reason, seen in evicted:
+            self.evict(game_id, reason)
+            if reason != 'abandoned':
+                parked[game_id] = seen[1]
+        self.changed = changed
+        self.parked = parked
+        self.bus.prune(self.idle_seconds)
+        return [(game_id, reason) for game_id, reason, seen in evicted]
+
+    # evict a game from the process - the resident game is dropped from the store (an abandoned game is removed,
+    #   see stores.py), the game's snapshot and event log are discarded and the streams of the game's players are
+    #   closed
+    def evict(self, game_id, reason):
+        with self.games.game_lock(game_id):
+            self.games.games.evict(game_id, remove=reason == 'abandoned')
+            updates.discard_game(game_id)
+        self.bus.close(game_id)
+        GAMES_EVICTED.inc(1, reason)
+        logger.info("evicted %s game %s", reason, game_id)
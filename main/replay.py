@@ -0,0 +1,302 @@
+"""
+NAME
+    replay.py
+
+DESCRIPTION
+    Rebuilds the game (GameSettings) of a recorded hand from its game record (see gamerecord.py).  The
+    record is replayed opcode by opcode on a new game, so the state of the game after any opcode - the
+    deal, each draw, meld, addition and discard, each turn - can be inspected:
+        for op, game in replay.states(record):
+            ...
+    The DEAL deals the recorded deck with GameSettings.deal (the deck is kept in its recorded order), the
+    completed turns and the scoring of the hand are replayed with the same code as the live game
+    (scoring.complete_turn and scoring.end_hand), so a replayed game holds the same hands, deck, discard
+    pile, game board, active player and scores as the game recorded.  The order of the cards in a player's
+    hand is not recorded (the players arrange their hands), compare treats a hand as a set of cards.
+
+    The replayed game is not recorded (its history is None) and the opcodes are applied to the game's
+    lists in place, so replaying a hand costs a few microseconds per opcode.
+
+    The records archived with PLAYCARDS_HAND_ARCHIVE are read with read_archive, and replayed with the
+    replay management command:
+        python manage.py replay ARCHIVE [--game GAME_ID] [--hand N] [--ops]
+
+CLASS
+    KeptShuffle                    -- leaves the deck in its recorded order when the DEAL is dealt
+
+FUNCTIONS
+    decode                         -- get the (opcode name, arguments) of each opcode of a record
+    states                         -- (generator) replay a record - the (opcode, game) after each opcode
+    replay                         -- get the game after the record (or its first count opcodes) is replayed
+    compare                        -- get the fields that differ between two games
+    read_archive                   -- get the (game_id, record) of each hand in a hand archive
+
+DATA
+    OP_NAMES                       -- the name of each opcode
+"""
+
+from . import journal, models, scoring
+from .gamerecord import (OP_DEAL, OP_DRAW, OP_TAKE, OP_MELD, OP_ADD, OP_DISCARD, OP_HAND, OP_BOARD, OP_PASS,
+                         OP_END, OP_SCORE, OP_JOIN, OP_BOT, OP_LEAVE, MELD_TYPES, SHORT, SCORE)
+
+OP_NAMES = {OP_DEAL: 'DEAL', OP_DRAW: 'DRAW', OP_TAKE: 'TAKE', OP_MELD: 'MELD', OP_ADD: 'ADD',
+            OP_DISCARD: 'DISCARD', OP_HAND: 'HAND', OP_BOARD: 'BOARD', OP_PASS: 'PASS', OP_END: 'END',
+            OP_SCORE: 'SCORE', OP_JOIN: 'JOIN', OP_BOT: 'BOT', OP_LEAVE: 'LEAVE'}
+
+
+# leaves the deck in the order it was recorded when the DEAL is dealt (GameSettings.deal shuffles the deck)
+class KeptShuffle:
+    @staticmethod
+    def shuffle(deck):
+        pass
+
+
+# read a name (2 byte length and UTF-8) at the offset - returns the name and the offset after it
+def read_name(record, offset):
+    length = SHORT.unpack_from(record, offset)[0]
+    offset += SHORT.size
+    return record[offset:offset + length].decode(), offset + length
+
+
+# read a list of card ids (1 byte count and the card ids) at the offset - returns the cards and the offset
+#   after them
+def read_cards(record, offset):
+    count = record[offset]
+    offset += 1
+    return [models.CARDS[card_id] for card_id in record[offset:offset + count]], offset + count
+
+
+# read the DEAL's arguments at the offset - returns the (players, bots, scores, dealer, active player, winner,
+#   target score, number of jokers, deck) and the offset after them
+def read_deal(record, offset):
+    players = []
+    bots = []
+    scores = {}
+    count = record[offset]
+    offset += 1
+    for ndx in range(count):
+        player, offset = read_name(record, offset)
+        players.append(player)
+        if record[offset]:
+            bots.append(player)
+        scores[player] = SCORE.unpack_from(record, offset + 1)[0]
+        offset += 1 + SCORE.size
+    dealer, offset = read_name(record, offset)
+    active_player, offset = read_name(record, offset)
+    winner, offset = read_name(record, offset)
+    target_score = SCORE.unpack_from(record, offset)[0]
+    offset += SCORE.size
+    number_of_jokers = record[offset]
+    length = SHORT.unpack_from(record, offset + 1)[0]
+    offset += 1 + SHORT.size
+    deck = [models.CARDS[card_id] for card_id in record[offset:offset + length]]
+    return (players, bots, scores, dealer, active_player, winner, target_score, number_of_jokers, deck), \
+        offset + length
+
+
+# read the BOARD's game board at the offset - returns the (meld type, meld cards) of each game board item (the
+#   meld cards are (player index, suit, face value)) and the offset after them
+def read_board(record, offset):
+    items = []
+    count = record[offset]
+    offset += 1
+    for ndx in range(count):
+        meld_type = record[offset]
+        pairs = record[offset + 2:offset + 2 + 2 * record[offset + 1]]
+        offset += 2 + len(pairs)
+        meld_cards = [(player, models.CARDS[card_id].suit, models.CARDS[card_id].faceval)
+                      for card_id, player in zip(pairs[0::2], pairs[1::2])]
+        items.append((MELD_TYPES[meld_type] if meld_type < len(MELD_TYPES) else '', meld_cards))
+    return items, offset
+
+
+# read the opcode at the offset - returns the opcode, its arguments and the offset of the next opcode
+def read_op(record, offset):
+    op = record[offset]
+    offset += 1
+    if op == OP_DEAL:
+        args, offset = read_deal(record, offset)
+    elif op in (OP_DRAW, OP_PASS, OP_BOT, OP_LEAVE):
+        args = (record[offset],)
+        offset += 1
+    elif op in (OP_TAKE, OP_END):
+        args = (record[offset], record[offset + 1])
+        offset += 2
+    elif op == OP_MELD:
+        cards, end = read_cards(record, offset + 2)
+        args = (record[offset], MELD_TYPES[record[offset + 1]], cards)
+        offset = end
+    elif op == OP_ADD:
+        cards, end = read_cards(record, offset + 3)
+        args = (record[offset], record[offset + 1], record[offset + 2], cards)
+        offset = end
+    elif op == OP_DISCARD:
+        args = (record[offset], models.CARDS[record[offset + 1]])
+        offset += 2
+    elif op == OP_HAND:
+        cards, end = read_cards(record, offset + 1)
+        args = (record[offset], cards)
+        offset = end
+    elif op == OP_BOARD:
+        board, offset = read_board(record, offset)
+        args = (board,)
+    elif op == OP_SCORE:
+        args = ()
+    elif op == OP_JOIN:
+        name, offset = read_name(record, offset)
+        args = (name,)
+    else:
+        raise ValueError("unknown opcode %d at offset %d of the game record" % (op, offset - 1))
+    return op, args, offset
+
+
+# show a card (ie. 10-hearts), or a list of cards, of an opcode's arguments (other arguments as they are)
+def show_cards(arg):
+    if isinstance(arg, models.Card):
+        return arg.faceval + '-' + arg.suit
+    if isinstance(arg, list) and arg and isinstance(arg[0], models.Card):
+        return [show_cards(card) for card in arg]
+    return arg
+
+
+# get the (opcode name, arguments) of each opcode of the record - the cards are shown as cards (ie. 10-hearts)
+def decode(record):
+    ops = []
+    offset = 0
+    while offset < len(record):
+        op, args, offset = read_op(record, offset)
+        if op == OP_DEAL:
+            args = args[:-1] + (len(args[-1]),)
+        ops.append((OP_NAMES[op], tuple([show_cards(arg) for arg in args])))
+    return ops
+
+
+# create the game of a DEAL - the players, bots, scores and settings before the deal, dealt from the recorded
+#   deck (the game is not recorded)
+def deal_game(args):
+    players, bots, scores, dealer, active_player, winner, target_score, number_of_jokers, deck = args
+    game = models.GameSettings()
+    game.history = None
+    game.players = players
+    game.bots = bots
+    game.scores = scores
+    game.player_cards = {player: [] for player in players}
+    game.active_player = active_player
+    game.winner = winner
+    game.target_score = target_score
+    game.number_of_jokers = number_of_jokers
+    game.deck = deck
+    game.deal(dealer, KeptShuffle)
+    return game
+
+
+# the name of the player at the index of the game's players ('' for a player not in the game)
+def player_name(game, ndx):
+    return game.players[ndx] if ndx < len(game.players) else ''
+
+
+# (generator) replay the record - yields the opcode and the game after each opcode is applied.  The same game
+#   is yielded after each opcode (it changes as the record is replayed).  Raises ValueError when the record
+#   does not start with a DEAL or an opcode can not be applied to the game
+def states(record):
+    game = None
+    offset = 0
+    while offset < len(record):
+        start = offset
+        op, args, offset = read_op(record, offset)
+        if op == OP_DEAL:
+            game = deal_game(args)
+            yield op, game
+            continue
+        if game is None:
+            raise ValueError("the game record does not start with a DEAL")
+        try:
+            player = player_name(game, args[0]) if args and isinstance(args[0], int) else ''
+            if op == OP_DRAW:
+                game.player_cards.setdefault(player, []).append(game.deck.pop())
+            elif op == OP_TAKE:
+                count = args[1]
+                game.player_cards.setdefault(player, []).extend(models.picked_up(game.discards, count))
+                del game.discards[-count:]
+            elif op == OP_MELD:
+                hand = game.player_cards.setdefault(player, [])
+                for card in args[2]:
+                    hand.remove(card)
+                game.game_board_items.append({"type": args[1], "meld_cards": [
+                    {"player": player, "suit": card.suit, "faceval": card.faceval} for card in args[2]]})
+            elif op == OP_ADD:
+                hand = game.player_cards.setdefault(player, [])
+                for card in args[3]:
+                    hand.remove(card)
+                added = [{"player": player, "suit": card.suit, "faceval": card.faceval} for card in args[3]]
+                item = game.game_board_items[args[1]]
+                meld_cards = added + item['meld_cards'] if args[2] == 0 else item['meld_cards'] + added
+                game.game_board_items[args[1]] = {"type": item['type'], "meld_cards": meld_cards}
+            elif op == OP_DISCARD:
+                game.player_cards.setdefault(player, []).remove(args[1])
+                game.discards.append(args[1])
+            elif op == OP_HAND:
+                game.player_cards[player] = list(args[1])
+            elif op == OP_BOARD:
+                game.game_board_items = [{"type": meld_type, "meld_cards": [
+                    {"player": player_name(game, ndx), "suit": suit, "faceval": faceval}
+                    for ndx, suit, faceval in meld_cards]} for meld_type, meld_cards in args[0]]
+            elif op == OP_PASS:
+                players = game.players
+                if player in players:
+                    game.active_player = players[(players.index(player) + 1) % len(players)]
+                elif players:
+                    game.active_player = players[0]
+            elif op == OP_END:
+                scoring.complete_turn(game, player, bool(args[1]))
+            elif op == OP_SCORE:
+                scoring.end_hand(game)
+            elif op == OP_JOIN:
+                game.add_player(args[0])
+            elif op == OP_BOT:
+                game.bots.append(player)
+            elif op == OP_LEAVE:
+                game.remove_player(player)
+        except (ValueError, IndexError, KeyError):
+            raise ValueError("opcode %s at offset %d can not be applied to the game" % (OP_NAMES[op], start))
+        yield op, game
+
+
+# get the game after the record is replayed - only the first count opcodes when count is specified
+def replay(record, count=None):
+    game = None
+    for ndx, (op, game) in enumerate(states(record)):
+        if count is not None and ndx + 1 >= count:
+            break
+    return game
+
+
+# the card ids of a list of cards
+def card_ids(cards):
+    return [card.card_id for card in cards]
+
+
+# get the fields that differ between two games (GameSettings) - the hands are compared as sets of cards
+#   (their order is not recorded), the deck, discard pile and game board in order.  An empty list when
+#   the games are the same
+def compare(game, other):
+    fields = []
+    for field in ['players', 'bots', 'dealer', 'active_player', 'wild_card', 'out_player', 'winner', 'scores',
+                  'hand_scores', 'target_score', 'number_of_jokers', 'game_board_items']:
+        if getattr(game, field) != getattr(other, field):
+            fields.append(field)
+    if card_ids(game.deck) != card_ids(other.deck):
+        fields.append('deck')
+    if card_ids(game.discards) != card_ids(other.discards):
+        fields.append('discards')
+    hands = {player: sorted(card_ids(cards)) for player, cards in game.player_cards.items() if cards}
+    other_hands = {player: sorted(card_ids(cards)) for player, cards in other.player_cards.items() if cards}
+    if hands != other_hands:
+        fields.append('player_cards')
+    return fields
+
+
+# get the (game_id, record) of each hand in the hand archive (PLAYCARDS_HAND_ARCHIVE, see
+#   gamerecord.archive_hand)
+def read_archive(path):
+    return journal.read_frames(path)
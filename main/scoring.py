@@ -0,0 +1,130 @@
+"""
+NAME
+    scoring.py
+
+DESCRIPTION
+    Scores each hand of a Blitz game.  A player scores the points of the cards they played to the game
+    board (each meld card's player) less the points of the cards remaining in their hand:
+        Jokers                     -- 500 points
+        Aces and wild cards        -- 100 points
+        10, J, Q, K                -- 10 points
+        2 thru 9                   -- 5 points
+    The hand is over when a player plays all their cards to the game board without discarding (they
+    have Blitzed), or when the turn comes around again to a player that discarded their last card.  The
+    hand scores are added to each player's running total, and once a player reaches the game's target
+    score the player with the highest score wins.
+
+    The points of every card are multiples of 5, so the points / 5 of each card fit in a byte.  For
+    each wild card a 256 byte table translates the compact card encoding (one byte per card, see
+    stores.py) to the points / 5 of each card - a list of cards is scored with a single bytes.translate
+    and sum, and a whole table (every player's played cards and hand) is scored with one translate.
+
+FUNCTIONS
+    card_points                    -- get the points of a card for a wild card
+    score_table_bytes              -- create the translate table of a wild card (see SCORE_TABLES)
+    encode_cards                   -- encode a list of Card objects as bytes (the compact card encoding)
+    score_encoded                  -- get the points of the cards in the compact card encoding
+    score_table                    -- score every player's hand (played cards less the cards in hand)
+    end_hand                       -- score the hand and add the scores to the running totals (recorded)
+    score_hand                     -- score the hand and add the scores to the running totals
+    complete_turn                  -- end the hand when the turn completed it (Blitz or the last turn)
+
+DATA
+    POINT_UNIT                     -- the points of every card are multiples of POINT_UNIT
+    SCORE_TABLES                   -- the translate table (compact card encoding to points / POINT_UNIT)
+                                      of each wild card face value
+"""
+
+from . import gamerecord, models, stores
+
+POINT_UNIT = 5
+FACE_POINTS = {'?': 500, 'A': 100, '10': 10, 'J': 10, 'Q': 10, 'K': 10}   # the points of the cards not worth 5
+
+
+# get the points of a card for the wild card (face value)
+def card_points(card, wild_card):
+    if card.faceval == wild_card and card.card_id != models.JOKER_ID:
+        return 100
+    return FACE_POINTS.get(card.faceval, POINT_UNIT)
+
+
+# the translate table of a wild card - the byte of each card's compact encoding translates to its points / 5
+def score_table_bytes(wild_card):
+    table = bytearray(256)
+    for card in models.CARDS:
+        table[stores.CARD_OFFSET + card.card_id] = card_points(card, wild_card) // POINT_UNIT
+    return bytes(table)
+
+
+SCORE_TABLES = {faceval: score_table_bytes(faceval) for faceval in [''] + models.all_facevals}
+
+
+# encode a list of Card objects as bytes - the compact card encoding (see stores.encode_cards)
+def encode_cards(cards):
+    return bytes([stores.CARD_OFFSET + card.card_id for card in cards])
+
+
+# get the points of the cards in the compact card encoding (bytes) for the wild card
+def score_encoded(encoded, wild_card=''):
+    return POINT_UNIT * sum(encoded.translate(SCORE_TABLES.get(wild_card, SCORE_TABLES[''])))
+
+
+# score every player's hand - the points of the cards the player played to the game board less the points
+#   of the cards in the player's hand.  The cards of the whole table are encoded once and translated once
+def score_table(game):
+    offset = stores.CARD_OFFSET
+    played = {player: bytearray() for player in game.players}
+    for item in game.game_board_items:
+        for meld_card in item['meld_cards']:
+            if meld_card['player'] in played:
+                played[meld_card['player']].append(offset + models.CARD_IDS[(meld_card['suit'], meld_card['faceval'])])
+    encoded = bytearray()
+    bounds = []
+    for player in game.players:
+        start = len(encoded)
+        encoded += played[player]
+        middle = len(encoded)
+        encoded += bytes([offset + card.card_id for card in game.player_cards.get(player, [])])
+        bounds.append((player, start, middle, len(encoded)))
+    points = bytes(encoded).translate(SCORE_TABLES.get(game.wild_card, SCORE_TABLES['']))
+    return {player: POINT_UNIT * (sum(points[start:middle]) - sum(points[middle:end]))
+            for player, start, middle, end in bounds}
+
+
+# score the hand, add each player's hand score to their running total, and set the winner once a player
+#   reaches the target score (the player with the highest total).  The scoring is recorded in the game
+#   record (see gamerecord.py)
+def end_hand(game):
+    gamerecord.record_score(game)
+    return score_hand(game)
+
+
+# score the hand and add the scores to the running totals (see end_hand) - not recorded, the hand ended by a
+#   completed turn is scored again when the turn is replayed
+def score_hand(game):
+    game.hand_scores = score_table(game)
+    for player, score in game.hand_scores.items():
+        game.scores[player] = game.scores.get(player, 0) + score
+    game.out_player = ""
+    totals = [(game.scores[player], player) for player in game.players]
+    if totals and max(totals)[0] >= game.target_score:
+        game.winner = max(totals)[1]
+    return game.hand_scores
+
+
+# end the hand when the player's completed turn finished it - the player played all their cards without
+#   discarding (Blitz), or the turn came around again to the player that went out by discarding their
+#   last card.  Returns the hand scores when the hand is over, otherwise None (a hand is only scored once,
+#   after the cards are dealt)
+def complete_turn(game, player, discarded):
+    gamerecord.record_end(game, player, discarded)
+    if not game.dealer or game.hand_scores:
+        return None
+    if game.out_player:
+        if game.active_player == game.out_player or game.out_player not in game.players:
+            return score_hand(game)
+    elif not game.player_cards.get(player):
+        if not discarded:
+            return score_hand(game)
+        game.out_player = player
+    return None
@@ -0,0 +1,338 @@
+"""
+NAME
+    simulation.py
+
+DESCRIPTION
+    Plays complete Blitz hands in-process (without the views) for rule tuning and balance analysis.
+    The hands are played on a Games object (see models.py) by the same rules the players follow:
+        deal                       -- the dealer rotates each hand, the first card dealt to a player
+                                      sets the number of cards dealt, the dealer's first card is the
+                                      wild card (GameSettings.deal)
+        draw                       -- the top card of the draw pile, or 1 or more cards from the top of
+                                      the discard pile - the last card picked up from the discard pile
+                                      must be played during the turn
+        play                       -- new books and runs, and cards added to the melds on the game board
+                                      (the legal plays are found with hints.find_plays)
+        discard                    -- a card from the player's hand, unless the player played all their
+                                      cards (they Blitzed)
+        end of the hand            -- a Blitz, or the turn coming around again to the player that went
+                                      out by discarding their last card (scoring.complete_turn).  A hand
+                                      with an empty draw pile (or longer than MAX_TURNS) is stalled and
+                                      scored as it stands
+    Each player seat is played by a policy choosing the draw, the plays and the discard.  A policy is a
+    class with the draw, play and discard methods (see Policy) registered in POLICIES.
+
+    The hands are split into chunks played across a process pool.  Each chunk is played with its own
+    random.Random seeded from the simulation seed and the chunk number, so a simulation is repeatable
+    whatever the number of worker processes.  The simulation is run with the simulate management command:
+        python manage.py simulate [--hands N] [--players N] [--decks N] [--jokers N]
+                                  [--policies greedy,random] [--workers N] [--seed N]
+
+CLASS
+    Policy                         -- base class of the player policies (draws from the draw pile, makes
+                                      no plays, discards the first card)
+    RandomPolicy                   -- chooses a random draw, random plays and a random discard
+    GreedyPolicy                   -- picks up the top discard when it can be played, plays the plays
+                                      worth the most points, and discards the natural card worth the
+                                      most points
+    HandSimulator                  -- plays complete hands of a game with a policy for each player
+
+METHODS
+                        Policy Class
+    draw                           -- choose the number of cards to pick up from the discard pile (0
+                                      to draw from the draw pile)
+    play                           -- choose the next play (None to stop playing)
+    discard                        -- choose the card to discard (index into the hand)
+                        HandSimulator Class
+    __init__                       -- create the game, the players and the policy of each player
+    seat                           -- seat the players of a game in progress with a policy for each player
+    play_hand                      -- deal and play a hand to the end, returns the hand's results
+    play_out                       -- play the turns of the hand in progress to the end
+    play_turn                      -- play the active player's turn, returns how the turn ended the hand
+    apply_play                     -- play cards from the player's hand to the game board
+
+FUNCTIONS
+    play_points                    -- get the points of the cards of a play
+    can_take                       -- returns True when the last card picked up from the discard pile can
+                                      be played
+    new_stats                      -- create the (empty) statistics of a simulation
+    merge_stats                    -- add the statistics of a chunk of hands to a simulation's statistics
+    run_chunk                      -- (worker process) play a chunk of hands and return its statistics
+    simulate                       -- play the hands across a process pool and report hands/second
+
+DATA
+    MAX_TURNS                      -- the turns after which a hand is stalled
+    CHUNK_HANDS                    -- the number of hands played by each task of the process pool
+    POLICIES                       -- the policy classes accessed by name
+"""
+
+import multiprocessing
+import os
+import random
+import time
+
+from . import hints, models, scoring
+
+MAX_TURNS = 500     # the turns after which a hand is stalled (scored as it stands)
+CHUNK_HANDS = 200   # the number of hands played by each task of the process pool
+GAME_ID = 'simulation'
+
+
+# get the points of the cards of a play for the wild card
+def play_points(play, wild_card):
+    return sum([scoring.card_points(card, wild_card) for card in play.cards])
+
+
+# base class of the player policies - draws from the draw pile, makes no plays and discards the first card
+class Policy:
+    name = 'pass'
+
+    # choose the number of cards to pick up from the discard pile (0 to draw from the draw pile) -
+    #   can_take(count) returns True when the last card picked up can be played this turn
+    def draw(self, game, player, can_take, rng):
+        return 0
+
+    # choose the next play from the legal plays (None to stop playing)
+    def play(self, game, player, plays, rng):
+        return None
+
+    # choose the card to discard - an index into the player's hand
+    def discard(self, game, player, hand, rng):
+        return 0
+
+
+# chooses a random draw, random plays and a random discard
+class RandomPolicy(Policy):
+    name = 'random'
+
+    def draw(self, game, player, can_take, rng):
+        count = rng.randrange(len(game.discards) + 1)
+        return count if count and can_take(count) else 0
+
+    def play(self, game, player, plays, rng):
+        if rng.random() < 0.2:
+            return None
+        return rng.choice(plays)
+
+    def discard(self, game, player, hand, rng):
+        return rng.randrange(len(hand))
+
+
+# picks up the top discard when it can be played, plays the plays worth the most points, and discards the
+#   natural card worth the most points (the wild cards are kept)
+class GreedyPolicy(Policy):
+    name = 'greedy'
+
+    def draw(self, game, player, can_take, rng):
+        return 1 if game.discards and can_take(1) else 0
+
+    def play(self, game, player, plays, rng):
+        return max(plays, key=lambda play: (play_points(play, game.wild_card), len(play.cards)))
+
+    def discard(self, game, player, hand, rng):
+        points = [(-1 if card.card_id == models.JOKER_ID or card.faceval == game.wild_card
+                   else scoring.card_points(card, game.wild_card), ndx) for ndx, card in enumerate(hand)]
+        return max(points)[1]
+
+
+# the policy classes accessed by name
+POLICIES = {policy.name: policy for policy in [Policy, RandomPolicy, GreedyPolicy]}
+
+
+# plays complete hands of a game on a Games object - each player seat is played by a policy
+class HandSimulator:
+    # create the game with the selected decks and jokers, and a player for each policy (named by seat
+    #   and policy, ie. P0-greedy)
+    def __init__(self, policies, number_of_decks=2, number_of_jokers=2, rng=None,
+                 target_score=models.TARGET_SCORE):
+        self.rng = rng if rng is not None else random.Random()
+        self.games = models.Games()
+        self.games.add_game(GAME_ID, number_of_jokers, number_of_decks)
+        self.game = self.games.get_game(GAME_ID)
+        self.game.set_target_score(target_score)
+        self.policies = {}
+        for seat, policy in enumerate(policies):
+            player = 'P' + str(seat) + '-' + policy.name
+            self.games.add_player(GAME_ID, player)
+            self.policies[player] = policy
+        self.dealer_ndx = -1
+
+    # seat the players of a game (GameSettings) with a policy for each player (dictionary by player name) -
+    #   used to play out a hand from a game in progress (see bots.py)
+    def seat(self, game, policies):
+        self.games.games[GAME_ID] = game
+        self.game = game
+        self.policies = policies
+
+    # deal the next hand (the dealer rotates) and play it to the end - returns the hand's results: the
+    #   number of turns, how the hand ended ('blitz', 'last_turn' or 'stalled'), the hand scores and the
+    #   game's winner when the hand won the game (the scores are then reset for the next game)
+    def play_hand(self):
+        game = self.game
+        players = game.get_players()
+        self.dealer_ndx = (self.dealer_ndx + 1) % len(players)
+        self.games.deal(GAME_ID, players[self.dealer_ndx], self.rng)
+        turns, ending = self.play_out()
+        winner = game.get_winner()
+        if winner:
+            game.winner = ""
+            game.scores = {player: 0 for player in players}
+        return {'turns': turns, 'ending': ending, 'hand_scores': dict(game.get_hand_scores()), 'winner': winner}
+
+    # play the turns of the hand in progress to the end - returns the number of turns played and how the hand
+    #   ended ('blitz', 'last_turn' or 'stalled')
+    def play_out(self, max_turns=MAX_TURNS):
+        turns = 0
+        ending = None
+        while ending is None:
+            turns += 1
+            if turns > max_turns:
+                scoring.end_hand(self.game)
+                ending = 'stalled'
+            else:
+                ending = self.play_turn(self.game.get_active_player())
+        return turns, ending
+
+    # play the player's turn - draw, play and discard, then complete the turn (see scoring.complete_turn).
+    #   The turn is played by the player's policy unless another policy is specified, and the draw is skipped
+    #   when the player already drew (required is the last card picked up from the discard pile).  Returns how
+    #   the turn ended the hand ('blitz', 'last_turn' or 'stalled'), None when the hand goes on
+    def play_turn(self, player, policy=None, drawn=False, required=None):
+        game = self.game
+        policy = policy or self.policies[player]
+        hand = list(game.get_player_cards(player))
+        discards = list(game.get_discards())
+        self.game_board_items = list(game.get_game_board_items())
+
+        # draw - the last card picked up from the discard pile must be played this turn
+        count = policy.draw(game, player, lambda count: can_take(hand, discards, count, game.wild_card,
+                                                                 self.game_board_items), self.rng) \
+            if discards and not drawn else 0
+        if drawn:
+            pass
+        elif count:
+            taken = models.picked_up(discards, count)
+            required = taken[0]
+            hand.extend(taken)
+            del discards[-count:]
+        elif game.deck:
+            hand.append(game.get_top_card())
+        else:
+            scoring.end_hand(game)
+            return 'stalled'
+
+        # play - the plays holding the required card are offered until it is played
+        while hand:
+            plays = hints.find_plays(hand, game.wild_card, self.game_board_items)
+            if required is not None:
+                plays = [play for play in plays if required in play.cards]
+            play = policy.play(game, player, plays, self.rng) if plays else None
+            if play is None and required is not None:
+                play = plays[0] if plays else None
+            if play is None:
+                break
+            self.apply_play(player, hand, play)
+            if required in play.cards:
+                required = None
+
+        # discard (unless the player Blitzed) and complete the turn
+        discarded = bool(hand)
+        if discarded:
+            discards.append(hand.pop(policy.discard(game, player, hand, self.rng)))
+        last_turn = bool(game.out_player)
+        self.games.apply_turn(GAME_ID, player, hand, discards, self.game_board_items)
+        if scoring.complete_turn(game, player, discarded) is not None:
+            return 'last_turn' if last_turn else 'blitz'
+        return None
+
+    # play the cards of a play from the player's hand to the game board - a new meld is added to the end of
+    #   the game board, added cards are placed before or after the meld's cards
+    def apply_play(self, player, hand, play):
+        for card in play.cards:
+            hand.remove(card)
+        meld_cards = [{"player": player, "suit": card.suit, "faceval": card.faceval} for card in play.cards]
+        if play.index is None:
+            self.game_board_items.append({"type": play.meld_type, "meld_cards": meld_cards})
+        else:
+            item = self.game_board_items[play.index]
+            if play.position == 'Before':
+                meld_cards = meld_cards + item['meld_cards']
+            else:
+                meld_cards = item['meld_cards'] + meld_cards
+            self.game_board_items[play.index] = {"type": item['type'], "meld_cards": meld_cards}
+
+
+# returns True when the last card picked up from the top count cards of the discard pile can be played from
+#   the hand (with the cards picked up) to the game board
+def can_take(hand, discards, count, wild_card, game_board_items):
+    if not 0 < count <= len(discards):
+        return False
+    taken = models.picked_up(discards, count)
+    plays = hints.find_plays(hand + taken, wild_card, game_board_items)
+    required = taken[0]
+    return any([required in play.cards for play in plays])
+
+
+# create the (empty) statistics of a simulation - the counts of the hands, turns and hand endings, and the
+#   seat-hands, points and game wins of each policy
+def new_stats():
+    return {'hands': 0, 'turns': 0, 'blitz': 0, 'last_turn': 0, 'stalled': 0, 'games': 0, 'policies': {}}
+
+
+# add the statistics of a chunk of hands to the statistics of a simulation
+def merge_stats(stats, chunk):
+    for key in ['hands', 'turns', 'blitz', 'last_turn', 'stalled', 'games']:
+        stats[key] += chunk[key]
+    for name, counts in chunk['policies'].items():
+        totals = stats['policies'].setdefault(name, {'seat_hands': 0, 'points': 0, 'wins': 0})
+        for key in totals:
+            totals[key] += counts[key]
+    return stats
+
+
+# (worker process) play a chunk of hands - the chunk's random.Random is seeded from the simulation seed and
+#   the chunk number.  Returns the statistics of the chunk
+def run_chunk(task):
+    seed, chunk, hands, options = task
+    rng = random.Random(seed * 1000003 + chunk)
+    policies = [POLICIES[name]() for name in options['policies']]
+    seats = [policies[seat % len(policies)] for seat in range(options['players'])]
+    simulator = HandSimulator(seats, options['decks'], options['jokers'], rng, options['target_score'])
+    stats = new_stats()
+    for ndx in range(hands):
+        result = simulator.play_hand()
+        stats['hands'] += 1
+        stats['turns'] += result['turns']
+        stats[result['ending']] += 1
+        if result['winner']:
+            stats['games'] += 1
+        for player, score in result['hand_scores'].items():
+            counts = stats['policies'].setdefault(simulator.policies[player].name,
+                                                  {'seat_hands': 0, 'points': 0, 'wins': 0})
+            counts['seat_hands'] += 1
+            counts['points'] += score
+            if player == result['winner']:
+                counts['wins'] += 1
+    return stats
+
+
+# play the hands in chunks across a pool of worker processes (in this process for 1 worker) and return the
+#   statistics with the elapsed time and hands/second.  The options hold the players, decks, jokers,
+#   policies (names, cycled over the seats) and target_score
+def simulate(hands, options, workers=None, seed=0, chunk_hands=CHUNK_HANDS):
+    workers = workers or os.cpu_count() or 1
+    tasks = [(seed, chunk, min(chunk_hands, hands - start), options)
+             for chunk, start in enumerate(range(0, hands, chunk_hands))]
+    stats = new_stats()
+    start = time.perf_counter()
+    if workers == 1:
+        for task in tasks:
+            merge_stats(stats, run_chunk(task))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for chunk in pool.imap_unordered(run_chunk, tasks):
+                merge_stats(stats, chunk)
+    stats['seconds'] = time.perf_counter() - start
+    stats['hands_per_sec'] = stats['hands'] / stats['seconds'] if stats['seconds'] else 0.0
+    stats['workers'] = workers
+    return stats
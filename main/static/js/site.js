@@ -139,7 +139,7 @@ playingCards.AddCardValueAttributes = function() {
 }
 
 // Update the player menu being viewed
-playingCards.UpdatePlayerMenu = function(players, active_player, card_counts, wild_card) {
+playingCards.UpdatePlayerMenu = function(players, active_player, card_counts, wild_card, scores, hand_scores) {
     // Update the wild card data being viewed on the player menu
     var $player_menu_ul = $('#player_menu>ul').clone();
     $player_menu_ul.find('#wild_card').text("Wild Card "+wild_card);
@@ -153,6 +153,14 @@ playingCards.UpdatePlayerMenu = function(players, active_player, card_counts, wi
         var $new_player = $first_in_players_list.clone(); // copy from original list
         $new_player.find('.player_card_count').text("+"+card_counts[pndx]);
         $new_player.find('.player_name').text(players[pndx]);
+        // show the player's running total score and their score for the hand once scored
+        if (scores) {
+            var score_text = String(scores[pndx]);
+            if (hand_scores && hand_scores[pndx] !== null) {
+                score_text += " (" + (hand_scores[pndx] >= 0 ? "+" : "") + hand_scores[pndx] + ")";
+            }
+            $new_player.find('.player_score').text(score_text);
+        }
         if (String(players[pndx]) == String(active_player)) {
             $new_player.addClass('active');
             $new_player.find('.collapsible-header').addClass("teal");
@@ -335,21 +343,84 @@ playingCards.AddCardToDiscardPile = function(suit, faceval) {
     $card_value_p.text(faceval);
 }
 
+// Seat a bot player (computer opponent) in the game - the game update is received from the server
+playingCards.AddBot = function() {
+    $.ajax({
+        url : "add_bot/", // the endpoint
+        type : "POST", // http method
+        data : {
+            csrfmiddlewaretoken : $('input[name=csrfmiddlewaretoken]').val(),
+        },
+        // handle a successful response
+        success : function(json) {
+            $('#status_msg').text(json.bot + " joined the game");
+        },
+        // handle a non-successful response
+        error : function(xhr,errmsg,err) {
+            $('#status_msg').text("Unable to add a bot!");
+        }
+    });
+}
+
+// Show the plays available for the player's hand and game board being viewed (found by the server)
+playingCards.ShowHints = function() {
+    $.ajax({
+        url : "hints/", // the endpoint
+        type : "POST", // http method
+        data : {
+            hand : JSON.stringify(playingCards.my_hand),
+            game_board : JSON.stringify(playingCards.game_board || []),
+            csrfmiddlewaretoken : $('input[name=csrfmiddlewaretoken]').val(),
+        },
+        // handle a successful response - list each play (the cards and where to play them)
+        success : function(json) {
+            var $hint_list = $('#hint_list');
+            $hint_list.empty();
+            if (json.plays.length == 0) {
+                $("<p/>").text("No plays available").appendTo($hint_list);
+            }
+            for (var pndx = 0; pndx < json.plays.length; pndx++) {
+                var play = json.plays[pndx];
+                var cards = [];
+                for (var cndx = 0; cndx < play.cards.length; cndx++) {
+                    cards.push(play.cards[cndx].faceval + " " + play.cards[cndx].suit);
+                }
+                var where = (play.index === null) ? "New " + play.type :
+                    play.position + " " + play.type + " " + (play.index + 1);
+                $("<p/>").text(where + ": " + cards.join(", ")).appendTo($hint_list);
+            }
+        },
+        // handle a non-successful response
+        error : function(xhr,errmsg,err) {
+            $('#status_msg').text("Unable to find plays!");
+        }
+    });
+}
+
 // Draw a card from the deck and add to the player's hand being viewed
 playingCards.DrawCardFromDeck = function() {
-    // retrieve the deck from the hidden field storage area
-    var deck = $('#the_deck').text();
-    // convert the deck to json format, extract the top card from the deck
-    // convert the deck back to text format, and store in the hidden storage area
-    var deck_json = JSON.parse(deck);
-    var top_card = deck_json.pop(0);
-    deck = JSON.stringify(deck_json);
-    $('#the_deck').text(JSON.stringify(deck_json));
-    // add the top card from the deck to the player's hand being viewed
-    playingCards.my_hand.push(top_card);
-    playingCards.AddPlayerCard(top_card);
-    // update the number of cards in the user's hand being viewed
-    playingCards.UpdateCardCount();
+    // the server removes the top card from the deck and returns only the drawn card
+    $.ajax({
+        url : "draw_card/", // the endpoint
+        type : "POST", // http method
+        data : {
+            csrfmiddlewaretoken : $('input[name=csrfmiddlewaretoken]').val(),
+        },
+        // handle a successful response
+        success : function(json) {
+            // store the number of cards remaining in the deck
+            $('#deck_size').text(json.deck_size);
+            // add the top card from the deck to the player's hand being viewed
+            playingCards.my_hand.push(json.card);
+            playingCards.AddPlayerCard(json.card);
+            // update the number of cards in the user's hand being viewed
+            playingCards.UpdateCardCount();
+        },
+        // handle a non-successful response
+        error : function(xhr,errmsg,err) {
+            $('#status_msg').text("Unable to draw from draw pile!");
+        }
+    });
     // collapse the draw selection body
     $('#draw-selection-body').hide();
 }
@@ -393,10 +464,98 @@ playingCards.UpdateCardCount = function() {
     });
 }
 
+// Get the card id of a card (see models.CARDS) - 13 face values for each suit, then the joker
+playingCards.CardId = function(card) {
+    if (card.suit == joker_suit) {
+        return all_suits.length * all_facevals.length;
+    }
+    return all_facevals.length * all_suits.indexOf(card.suit) + all_facevals.indexOf(card.faceval);
+}
+
+// Encode a list of cards in the compact wire format - the base64 of the card ids (see wire.py)
+playingCards.EncodeCards = function(cards) {
+    var ids = "";
+    for (var ndx in cards) {
+        ids += String.fromCharCode(playingCards.CardId(cards[ndx]));
+    }
+    return btoa(ids);
+}
+
+// Decode a list of cards in the compact wire format to a list of cards (suit and face value)
+playingCards.DecodeCards = function(encoded) {
+    var ids = atob(encoded);
+    var cards = [];
+    for (var ndx = 0; ndx < ids.length; ndx++) {
+        var card_id = ids.charCodeAt(ndx);
+        if (card_id >= all_suits.length * all_facevals.length) {
+            cards.push({'suit': joker_suit, 'faceval': joker_faceval});
+        } else {
+            cards.push({'suit': all_suits[Math.floor(card_id / all_facevals.length)],
+                        'faceval': all_facevals[card_id % all_facevals.length]});
+        }
+    }
+    return cards;
+}
+
+// Encode the meld cards of a game board item in the compact wire format - [type, cards, owners] where the
+// owners are [player, count, ...] of the consecutive meld cards played by each player
+playingCards.EncodeMeld = function(type, meld_cards) {
+    var owners = [];
+    for (var ndx in meld_cards) {
+        if (owners.length && owners[owners.length - 2] == meld_cards[ndx].player) {
+            owners[owners.length - 1]++;
+        } else {
+            owners.push(meld_cards[ndx].player, 1);
+        }
+    }
+    return [type, playingCards.EncodeCards(meld_cards), owners];
+}
+
+// Decode the meld cards of a game board item in the compact wire format
+playingCards.DecodeMeldCards = function(encoded, owners) {
+    var cards = playingCards.DecodeCards(encoded);
+    var meld_cards = [];
+    for (var odx = 0; odx < owners.length; odx += 2) {
+        for (var count = 0; count < owners[odx + 1] && meld_cards.length < cards.length; count++) {
+            var card = cards[meld_cards.length];
+            meld_cards.push({"player": owners[odx], "suit": card.suit, "faceval": card.faceval});
+        }
+    }
+    return meld_cards;
+}
+
+// Decode an update received from the server in the compact wire format to the update as sent in JSON
+playingCards.DecodeUpdate = function(update) {
+    if (typeof(update.player_cards) == 'string') {
+        update.player_cards = playingCards.DecodeCards(update.player_cards);
+    }
+    if (typeof(update.discards) == 'string') {
+        update.discards = playingCards.DecodeCards(update.discards);
+    } else if (update.discards && typeof(update.discards[2]) == 'string') {
+        update.discards[2] = playingCards.DecodeCards(update.discards[2]);
+    }
+    var board_keys = ['gameboard', 'melds_added'];
+    for (var kdx in board_keys) {
+        var items = update[board_keys[kdx]];
+        for (var ndx in items) {
+            if (Array.isArray(items[ndx])) {
+                items[ndx] = {"type": items[ndx][0],
+                              "meld_cards": playingCards.DecodeMeldCards(items[ndx][1], items[ndx][2])};
+            }
+        }
+    }
+    for (var edx in update.melds_extended) {
+        var extended = update.melds_extended[edx];
+        if (extended.length == 4) {
+            update.melds_extended[edx] = [extended[0], extended[1],
+                                          playingCards.DecodeMeldCards(extended[2], extended[3])];
+        }
+    }
+    return update;
+}
+
 // post the changes to the server and pass the torch to the next player
 playingCards.TurnCompletePost = function() {
-    // retrieve the deck from the hidden field storage area
-    var deck = $('#the_deck').text();
     var my_hand = JSON.stringify(playingCards.my_hand);
     var discard_pile = JSON.stringify(playingCards.discard_pile);
     var game_board = [];
@@ -404,28 +563,43 @@ playingCards.TurnCompletePost = function() {
     if (playingCards.game_board) {
         game_board = JSON.stringify(playingCards.game_board);
     }
+    var turn = {
+        updated_players_hand : my_hand,
+        discards : discard_pile,
+        game_board: game_board,
+        csrfmiddlewaretoken : $('input[name=csrfmiddlewaretoken]').val(),
+    };
+    // the cards are posted as card ids in the compact wire format (see wire.py)
+    if (playingCards.wire_format == 'compact') {
+        var melds = [];
+        for (var ndx in playingCards.game_board) {
+            melds.push(playingCards.EncodeMeld(playingCards.game_board[ndx].type,
+                                               playingCards.game_board[ndx].meld_cards));
+        }
+        turn.format = 'compact';
+        turn.updated_players_hand = playingCards.EncodeCards(playingCards.my_hand);
+        turn.discards = playingCards.EncodeCards(playingCards.discard_pile);
+        turn.game_board = JSON.stringify(melds);
+    }
 
-    // send the updated deck, players hand and discard pile back to the server
+    // send the updated players hand, discard pile and game board back to the server
     $.ajax({
         url : "turn_complete_post/", // the endpoint
         type : "POST", // http method
-        data : {
-            updated_deck : deck,
-            updated_players_hand : my_hand,
-            discards : discard_pile,
-            game_board: game_board,
-            csrfmiddlewaretoken : $('input[name=csrfmiddlewaretoken]').val(),
-        },
+        data : turn,
         // handle a successful response
         success : function(json) {
             //console.log(json); // log the returned json to the console
             //console.log("success"); // another sanity check
 
-            // Reload the page to obtain server updates
-            location.reload();
+            // load the game from the server (the player's stream is not sent the player's own turn)
+            playingCards.LoadServerState();
         },
-        // handle a non-successful response
+        // handle a non-successful response (the server rejected a meld played on the game board)
         error : function(xhr,errmsg,err) {
+            if (xhr.responseJSON && xhr.responseJSON.error) {
+                $('#status_msg').text(xhr.responseJSON.error);
+            }
             console.log("ajax error");
         }
     });
@@ -433,6 +607,117 @@ playingCards.TurnCompletePost = function() {
     $('#turn-complete-body').hide();
 }
 
+// Load the game from the server (the full update sent on the player's stream, see views.state_view) and show
+// it - when the page is loaded, when the player's turn is complete and when the turn is started over.  The
+// update deltas received from the server are applied to this data.  The callback is called once loaded
+playingCards.LoadServerState = function(callback) {
+    $.ajax({
+        url : "state/?format=" + playingCards.wire_format, // the endpoint
+        type : "GET", // http method
+        cache : false,
+        // handle a successful response - an update older than the game being viewed shows the game being
+        // viewed again (the player's stream was faster)
+        success : function(json) {
+            var update = playingCards.DecodeUpdate(json);
+            if (playingCards.version === undefined || update.version >= playingCards.version) {
+                playingCards.server_state = update;
+            }
+            playingCards.ShowServerUpdate(playingCards.server_state);
+            if (callback) {
+                callback();
+            }
+        },
+        // handle a non-successful response
+        error : function(xhr,errmsg,err) {
+            $('#status_msg').text("Unable to load the game!");
+        }
+    });
+}
+
+// Deal the cards to the game's players - the deal is received on the player's stream, as it is by every
+// other player
+playingCards.Deal = function() {
+    $.ajax({
+        url : "/deal/" + $('#game_id').text() + "/" + $('#user_name').text(), // the endpoint
+        type : "POST", // http method
+        data : {
+            csrfmiddlewaretoken : $('input[name=csrfmiddlewaretoken]').val(),
+        },
+        // handle a non-successful response
+        error : function(xhr,errmsg,err) {
+            $('#status_msg').text("Unable to deal!");
+        }
+    });
+}
+
+// Apply a [keep_head, keep_tail, cards] change received from the server to a list of cards
+playingCards.ApplySplice = function(list, splice) {
+    return list.slice(0, splice[0]).concat(splice[2], list.slice(list.length - splice[1]));
+}
+
+// Apply an update delta received from the server to the stored server game data,
+// returns false when the delta does not apply to the version of the game being viewed
+playingCards.ApplyServerDelta = function(delta) {
+    if (delta.base_version != playingCards.version) {
+        return false;
+    }
+    var state = playingCards.server_state;
+    var keys = ['deck_size', 'players', 'card_counts', 'dealer', 'active_player', 'wild_card',
+                'scores', 'hand_scores', 'target_score', 'winner'];
+    for (var kdx in keys) {
+        if (keys[kdx] in delta) {
+            state[keys[kdx]] = delta[keys[kdx]];
+        }
+    }
+    if ('discards' in delta) {
+        state.discards = playingCards.ApplySplice(state.discards, delta.discards);
+    }
+    // insert cards added to melds already on the game board
+    for (var edx in delta.melds_extended) {
+        var extended = delta.melds_extended[edx];
+        var meld_cards = state.gameboard[extended[0]].meld_cards;
+        state.gameboard[extended[0]].meld_cards =
+            meld_cards.slice(0, extended[1]).concat(extended[2], meld_cards.slice(extended[1]));
+    }
+    // add new melds to the end of the game board
+    if ('melds_added' in delta) {
+        state.gameboard = state.gameboard.concat(delta.melds_added);
+    }
+    // the player's cards are only included in the latest update sent
+    if ('player_cards' in delta) {
+        state.player_cards = delta.player_cards;
+    }
+    state.version = delta.version;
+    return true;
+}
+
+// Update the game being viewed with the game data received from the server
+playingCards.ShowServerUpdate = function(update) {
+    playingCards.version = update.version;
+    playingCards.UpdatePlayerCards(update.player_cards);
+    $('#deck_size').text(update.deck_size);
+    // clear stored discard_pile object
+    playingCards.discard_pile = []
+    // remove all cards from the discard pile being viewed
+    $('.discard_pile_card').remove();
+    // add each card to the discard pile being viewed
+    for (var ndx in update.discards) {
+        playingCards.AddCardToDiscardPile(update.discards[ndx].suit, update.discards[ndx].faceval);
+    }
+    // update the player menu being viewed
+    playingCards.UpdatePlayerMenu(update.players, update.active_player, update.card_counts, update.wild_card,
+                                  update.scores, update.hand_scores);
+    // update the score to reach and the winner once the game is won
+    $('#target_score').text("Score to reach " + update.target_score +
+                            (update.winner ? " - " + update.winner + " wins!" : ""));
+    // update the dealer name being viewed
+    $('#dealer').text("Dealer: "+update.dealer);
+    // Update game board with game board received from server
+    playingCards.UpdateGameBoard(update.gameboard);
+    // Re-initialize after receiving server updates
+    playingCards.Initialize();
+}
+
 // Function to check for updates from the server via server sent events - SSE
 playingCards.CheckForServerEvents = function () {
     var user_name = $('#user_name').text();
@@ -440,30 +725,30 @@ playingCards.CheckForServerEvents = function () {
     if ((String(user_name) != String("")) && (String(game_id) != String("")))
     {
         if(typeof(EventSource) !== "undefined") {
-            // create new SSE - server side event object
-            var source = new EventSource("/stream/"+game_id+"/"+user_name);
+            // create new SSE - server side event object (the server sends the updates missed
+            // when the version of the game being viewed is out of date, and the browser sends
+            // the version last received - the event id - when it reconnects)
+            // (the updates are sent in the wire format of the page, see wire.py)
+            var source = new EventSource("/stream/"+game_id+"/"+user_name+"?version="+playingCards.version+
+                                         "&format="+playingCards.wire_format);
             // check for messages from the server
             source.onmessage = function(event) {
-                var json = JSON.parse(event.data);
+                var json = playingCards.DecodeUpdate(JSON.parse(event.data));
                 if (String(json.type) == String('update_game')) {
-                    playingCards.UpdatePlayerCards(json.player_cards);
-                    $('#the_deck').text(JSON.stringify(json.deck_cards));
-                    // clear stored discard_pile object
-                    playingCards.discard_pile = []
-                    // remove all cards from the discard pile being viewed
-                    $('.discard_pile_card').remove();
-                    // add each card to the discard pile being viewed
-                    for (var ndx in json.discards) {
-                        playingCards.AddCardToDiscardPile(json.discards[ndx].suit, json.discards[ndx].faceval);
+                    playingCards.server_state = json;
+                    playingCards.ShowServerUpdate(json);
+                } else if (String(json.type) == String('update_delta')) {
+                    if (json.version <= playingCards.version) {
+                        // the update is in the game loaded from the server (see LoadServerState)
+                        return;
+                    }
+                    if (playingCards.ApplyServerDelta(json)) {
+                        playingCards.ShowServerUpdate(playingCards.server_state);
+                    } else {
+                        // an update was missed - reconnect to receive a full update
+                        source.close();
+                        playingCards.CheckForServerEvents();
                     }
-                    // update the player menu being viewed
-                    playingCards.UpdatePlayerMenu(json.players, json.active_player, json.card_counts, json.wild_card);
-                    // update the dealer name being viewed
-                    $('#dealer').text("Dealer: "+json.dealer);
-                    // Update game board with game board received from server
-                    playingCards.UpdateGameBoard(json.gameboard);
-                    // Re-initialize after receiving server updates
-                    playingCards.Initialize();
                 }
             };
         }
@@ -662,12 +947,19 @@ $(document).ready(function() {
     $('.collapsible').collapsible();
     // perform iniitalization
     playingCards.Initialize();
-    // check for server updates
-    playingCards.CheckForServerEvents();
+    // load the game from the server then check for server updates (the updates are sent in the wire format
+    // of the page, see wire.py)
+    playingCards.wire_format = $('#wire_format').text().trim() || 'json';
+    playingCards.LoadServerState(playingCards.CheckForServerEvents);
     // reset menu selections when deal menu selected
     $('#deal-selection-header').on('click', function(event) {
         playingCards.ResetMenuSelections();
     });
+    // deal the cards without loading the page again when selected
+    $('#deal_button').on('click', function(event) {
+        event.preventDefault();
+        playingCards.Deal();
+    });
     // perform draw card action when selected
     $('#draw_pile_button').on('click', function(event) {
         playingCards.DrawCardFromDeck();
@@ -689,14 +981,30 @@ $(document).ready(function() {
     $('#discard_button').on("click", function() {
         playingCards.DiscardCardFromHand();
     });
+    // reset menu selections when hint menu selected
+    $('#hint-header').on('click', function(event) {
+        playingCards.ResetMenuSelections();
+    });
+    // list the plays available for the player's hand when selected
+    $('#hint_button').on('click', function(event) {
+        playingCards.ShowHints();
+    });
+    // reset menu selections when add bot menu selected
+    $('#add-bot-header').on('click', function(event) {
+        playingCards.ResetMenuSelections();
+    });
+    // seat a bot player when selected
+    $('#add_bot_button').on('click', function(event) {
+        playingCards.AddBot();
+    });
     // reset menu selections when undue menu selected
     $('#undue-header').on("click", function(event) {
         playingCards.ResetMenuSelections();
     });
     // perform undue action when seleected
     $('#undue_button').on("click", function(event) {
-        // simply reload the page from the server and get game data prior to last complete turn update
-        location.reload();
+        // load the game from the server - the game data prior to last complete turn update
+        playingCards.LoadServerState();
     });
     // reset menu selections when complete menu selected
     $('#turn-complete-header').on('click', function(event) {
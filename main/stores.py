@@ -0,0 +1,639 @@
+"""
+NAME
+    stores.py
+
+DESCRIPTION
+    Contains the storage backends holding the game state (the GameSettings of each game) behind the
+    Games model.  A store is a dictionary-like object accessed by game_id.  The in-memory store keeps
+    the GameSettings objects in the process (the default).  The record stores keep each game as a
+    compact serialized record so the games can be shared by more than one worker process and survive
+    a restart:
+        SQLiteStore                -- records kept in the database configured as DATABASES['default']
+        KeyValueStore              -- records kept in a Redis compatible key-value client (get, set,
+                                      delete, keys), ie. redis.Redis() or LocalKeyValueClient()
+    The record stores cache the decoded GameSettings of each game and only decode a record again when
+    another process saved a new revision of the game.  While the game's lock is held (Games.game_lock)
+    the game is held by the store - it is read from the store once, and the reads under the lock return
+    the game read.  After modifying a game the changes are written to the store with save()
+    (Games.save_game) - saving is a no-op for the in-memory store.  A record is only written over the
+    revision it was read from (compare and swap - a conditional UPDATE in the database, a WATCH/MULTI
+    transaction in the key-value client), so when another process saved the game since it was read the
+    save raises StaleGame and the change is rejected rather than overwriting the other process's change.
+
+    The games resident in the process (see reaper.py) are the GameSettings objects of the in-memory store,
+    or the decoded games cached by a record store.  Evicting a game only drops the resident game - a
+    record store keeps the game in persistent storage, the in-memory store keeps the game's compact
+    record (parked), and the game is decoded again when next read.  Only an abandoned game evicted with
+    remove is removed from the in-memory store (and the removal journaled).
+
+    The in-memory store is made durable with a write-ahead journal (see journal.py) - the JournaledStore
+    appends the record of each saved game to the journal and restores the games from the journal when
+    the process starts.  A game saved under its lock is appended to the journal under the lock, and the
+    thread waits for the record to be durable after the lock is released, so the readers of the game
+    (the players' streams, on the event loop when served through ASGI) never wait on the disk.
+
+    The store is selected in settings.py:
+        PLAYCARDS_GAME_STORE       -- 'memory' (default), 'sqlite' or 'keyvalue'
+        PLAYCARDS_KEY_VALUE_CLIENT -- dotted path of the callable creating the key-value client
+                                      (default 'main.stores.LocalKeyValueClient')
+        PLAYCARDS_JOURNAL_DIR      -- the directory of the in-memory store's journal ('' - no journal)
+        PLAYCARDS_JOURNAL_SYNC     -- True to wait for a saved game's record to be durable
+        PLAYCARDS_JOURNAL_SNAPSHOT_BYTES
+                                   -- the size of a journal segment before a snapshot is written
+
+CLASS
+    StaleGame                      -- raised when a game is saved after another process saved it
+    MemoryStore                    -- keeps the games as GameSettings objects in the process
+    JournaledStore                 -- keeps the games in the process, journaling each saved game
+    RecordStore                    -- base class of the stores keeping compact serialized game records
+    SQLiteStore                    -- keeps the game records in the default database
+    KeyValueStore                  -- keeps the game records in a Redis compatible key-value client
+    LocalKeyValueClient            -- in-process stand-in for a Redis client (get, set, delete, keys and
+                                      pipeline)
+    LocalPipeline                  -- the WATCH/MULTI transaction of the LocalKeyValueClient
+
+METHODS
+                        MemoryStore Class
+    __missing__                    -- get a parked game (decoded from its record, resident again)
+    get                            -- get the GameSettings of a game, None when not stored
+    __contains__                   -- returns True when the store holds the game (resident or parked)
+    __delitem__                    -- remove a game (resident or parked)
+    __iter__, __len__              -- iterate over / count the game ids in the store (resident and parked)
+    save                           -- save the changes to a game (nothing to do - games kept by reference)
+    resident_ids                   -- get the game ids of the games resident in the process (not parked)
+    parked_ids                     -- get the game ids of the parked games
+    evict                          -- evict a game from the process (the game is parked, or removed)
+                        JournaledStore Class
+    save                           -- append the record of a game to the journal
+    __delitem__                    -- remove a game and append its removal to the journal
+    hold                           -- hold a game while its lock is held
+    release                        -- release a game held
+    settle                         -- wait until the records saved while holding games are durable (after
+                                      the games' locks are released)
+    records                        -- get the (game_id, record) of every game (the journal's snapshots)
+                        RecordStore Class
+    __getitem__                    -- get the GameSettings of a game (decoded when the record changed)
+    get                            -- get the GameSettings of a game, None when not stored (one read)
+    __setitem__                    -- add (or replace) a game and save its record over the revision read
+    __delitem__                    -- remove a game and its record
+    __contains__                   -- returns True when the store holds the game
+    __iter__, __len__              -- iterate over / count the game ids in the store
+    save                           -- save the changes to a game as a new revision of its record
+    hold                           -- hold a game while its lock is held (read from the store once)
+    release                        -- release a game held
+    resident_ids                   -- get the game ids of the decoded games cached by the process
+    parked_ids                     -- get the game ids of the parked games (none - the records are stored)
+    evict                          -- evict a game from the process (the cached game is dropped, the
+                                      record is kept)
+    load_record                    -- get the (revision, record) of a game (implemented by each store)
+    save_record                    -- save the (revision, record) of a game over the previous revision,
+                                      False when the stored revision is not the previous revision
+                                      (implemented by each store)
+    delete_record                  -- delete the record of a game (implemented by each store)
+    record_ids                     -- get the game ids of all records (implemented by each store)
+
+FUNCTIONS
+    encode_cards                   -- encode a list of cards as a string with one character per card
+    decode_cards                   -- decode a string of cards to a list of the shared Card instances
+    encode_game                    -- encode a game (GameSettings) as a compact record (bytes)
+    decode_game                    -- decode a compact record (bytes) to a game (GameSettings)
+    create_store                   -- create the store selected in settings.py
+"""
+
+import base64
+import json
+import threading
+from collections.abc import MutableMapping
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:
+    # raised by a transaction of the LocalKeyValueClient when a key watched changed before it executed
+    class WatchError(Exception):
+        pass
+
+from . import journal, models
+
+CARD_OFFSET = 35    # card ids are encoded as the characters '#' (35) to 'X' (87) - never escaped in JSON
+
+
+# raised when a game is saved after another process saved a newer revision of it - the change made to the
+#   game read is not saved (the game is read from the store again)
+class StaleGame(RuntimeError):
+    def __init__(self, game_id):
+        super().__init__('The game ' + str(game_id) + ' was changed by another process')
+        self.game_id = game_id
+
+
+# keeps the games as GameSettings objects in the process (the default store) - an evicted game is parked as
+#   its compact record and decoded again when read
+class MemoryStore(dict):
+    persistent = False      # the games are lost when the process exits
+
+    def __init__(self):
+        super().__init__()
+        self._parked = {}                   # the compact record of each parked game
+        self._parking = threading.Lock()    # held while a game is parked or decoded again
+
+    # get a parked game (called for a game not resident) - the game is decoded from its record and is resident
+    #   again.  KeyError when the store does not hold the game
+    def __missing__(self, game_id):
+        with self._parking:
+            game = dict.get(self, game_id)
+            if game is None:
+                game = decode_game(self._parked.pop(game_id))
+                dict.__setitem__(self, game_id, game)
+            return game
+
+    # get the game, default when the store does not hold the game
+    def get(self, game_id, default=None):
+        try:
+            return self[game_id]
+        except KeyError:
+            return default
+
+    # returns True when the store holds the game (resident or parked)
+    def __contains__(self, game_id):
+        return dict.__contains__(self, game_id) or game_id in self._parked
+
+    # remove the game (resident or parked)
+    def __delitem__(self, game_id):
+        if self._parked.pop(game_id, None) is None:
+            dict.__delitem__(self, game_id)
+
+    # iterate over the game ids in the store (resident and parked)
+    def __iter__(self):
+        return iter(list(dict.keys(self)) + list(self._parked))
+
+    # the number of games in the store (resident and parked)
+    def __len__(self):
+        return dict.__len__(self) + len(self._parked)
+
+    # save the changes to a game - nothing to do, the games are kept by reference
+    def save(self, game_id):
+        pass
+
+    # get the game ids of the games resident in the process - the games not parked
+    def resident_ids(self):
+        return list(dict.keys(self))
+
+    # get the game ids of the parked games
+    def parked_ids(self):
+        return list(self._parked)
+
+    # evict a game from the process - the game is parked (kept as its compact record), or removed when remove
+    #   is set (an abandoned game)
+    def evict(self, game_id, remove=False):
+        if remove:
+            if game_id in self:
+                del self[game_id]
+            return
+        game = dict.get(self, game_id)
+        if game is None:
+            return
+        record = encode_game(game)
+        with self._parking:
+            dict.pop(self, game_id, None)
+            self._parked[game_id] = record
+
+
+# encode a list of cards as a string with one character per card (the card id)
+def encode_cards(cards):
+    return ''.join([chr(CARD_OFFSET + card.card_id) for card in cards])
+
+
+# decode a string of cards to a list of the shared Card instances
+def decode_cards(encoded):
+    return [models.CARDS[ord(char) - CARD_OFFSET] for char in encoded]
+
+
+# encode a game as a compact record - the game's settings as a JSON list with each list of cards
+#   encoded with one character per card
+def encode_game(game):
+    board = []
+    for item in game.game_board_items:
+        meld_cards = [models.get_card(meld_card['suit'], meld_card['faceval']) for meld_card in item['meld_cards']]
+        board.append([item['type'], encode_cards(meld_cards),
+                      [meld_card['player'] for meld_card in item['meld_cards']]])
+    record = [
+        game.version, game.wild_card, game.number_of_jokers, game.active_player, game.dealer,
+        game.players, {player: encode_cards(cards) for player, cards in game.player_cards.items()},
+        encode_cards(game.deck), encode_cards(game.discards), board,
+        game.target_score, game.scores, game.hand_scores, game.out_player, game.winner, game.bots,
+        None if game.history is None else base64.b64encode(game.history).decode(), game.history_deck,
+        game.drawn,
+    ]
+    return json.dumps(record, separators=(',', ':')).encode()
+
+
+# decode a compact record to a game (GameSettings) - records saved before the scores were kept hold
+#   only the first 10 fields, records saved before the bots were kept hold only the first 15 fields, records
+#   saved before the hands were recorded (see gamerecord.py) hold only the first 16 fields, and records saved
+#   before the draws were kept hold only the first 18 fields
+def decode_game(record):
+    fields = json.loads(record)
+    (version, wild_card, number_of_jokers, active_player, dealer,
+     players, player_cards, deck, discards, board) = fields[:10]
+    game = models.GameSettings()
+    game.version = version
+    game.wild_card = wild_card
+    game.number_of_jokers = number_of_jokers
+    game.active_player = active_player
+    game.dealer = dealer
+    game.players = players
+    game.player_cards = {player: decode_cards(cards) for player, cards in player_cards.items()}
+    game.deck = decode_cards(deck)
+    game.discards = decode_cards(discards)
+    for meld_type, meld_cards, meld_players in board:
+        game.game_board_items.append({
+            "type": meld_type,
+            "meld_cards": [{"player": player, "suit": card.suit, "faceval": card.faceval}
+                           for player, card in zip(meld_players, decode_cards(meld_cards))],
+        })
+    if len(fields) > 10:
+        game.target_score, game.scores, game.hand_scores, game.out_player, game.winner = fields[10:15]
+        if len(fields) > 15:
+            game.bots = fields[15]
+        if len(fields) > 16:
+            game.history = None if fields[16] is None else bytearray(base64.b64decode(fields[16]))
+            game.history_deck = fields[17]
+        if len(fields) > 18:
+            game.drawn = fields[18]
+    else:
+        game.scores = {player: 0 for player in players}
+    return game
+
+
+# keeps the games as GameSettings objects in the process and appends the record of each saved (or removed)
+#   game to the write-ahead journal - the games are restored from the journal when the store is created
+class JournaledStore(MemoryStore):
+    def __init__(self, game_journal):
+        super().__init__()
+        self.journal = game_journal
+        self._local = threading.local()     # the games held by each thread and its last record not yet durable
+        self.journal.source = self.records
+        for game_id, record in self.journal.restore().items():
+            dict.__setitem__(self, game_id, decode_game(record))
+
+    # append the record of the game to the journal, waiting until it is durable when the journal syncs
+    def save(self, game_id):
+        game = self.get(game_id)
+        if game is None:
+            return
+        self._durable(self.journal.append(game_id, encode_game(game)))
+
+    # remove the game and append its removal (an empty record) to the journal
+    def __delitem__(self, game_id):
+        super().__delitem__(game_id)
+        self._durable(self.journal.append(game_id, b''))
+
+    # wait until the record appended (the journal's sequence) is durable when the journal syncs - a thread
+    #   holding a game's lock waits once it released the lock (see settle), so the lock is never held while
+    #   the journal is written to disk
+    def _durable(self, sequence):
+        if not self.journal.sync:
+            return
+        if getattr(self._local, 'holds', 0):
+            self._local.sequence = max(sequence, getattr(self._local, 'sequence', None) or 0)
+        else:
+            self.journal.wait(sequence)
+
+    # hold a game while its lock is held (see Games.game_lock) - the records saved by the thread are made durable
+    #   when it released the locks of the games it holds
+    def hold(self, game_id):
+        self._local.holds = getattr(self._local, 'holds', 0) + 1
+
+    # release a game held
+    def release(self, game_id):
+        self._local.holds -= 1
+
+    # wait until the records saved by the thread are durable once it holds no game (called after a game's lock
+    #   is released)
+    def settle(self):
+        sequence = getattr(self._local, 'sequence', None)
+        if sequence is not None and not self._local.holds:
+            self._local.sequence = None
+            self.journal.wait(sequence)
+
+    # get the (game_id, record) of every game for a snapshot of the journal.  The games are read without
+    #   their locks - a game changed while it is encoded is saved again after the snapshot's segment was
+    #   started, so its record in the journal replaces the snapshot's record (a game failing to encode is
+    #   skipped for the same reason)
+    def records(self):
+        with self._parking:
+            games = list(self.items())
+            records = list(self._parked.items())
+        for game_id, game in games:
+            try:
+                records.append((game_id, encode_game(game)))
+            except (RuntimeError, KeyError, IndexError):
+                pass
+        return records
+
+
+# base class of the stores keeping a compact serialized record of each game, each store implements
+#   load_record, save_record, delete_record and record_ids
+class RecordStore(MutableMapping):
+    persistent = True       # an evicted game is decoded from its record when next read
+
+    def __init__(self):
+        self._cache = {}    # the (revision, GameSettings) of each game read or written by this process
+        self._holds = {}    # the number of holds on each game held (see hold)
+        self._read = set()  # the games held that were read from the store since they were held
+        self._lock = threading.Lock()
+
+    # get the game - a game held is read from the store once, the record is only decoded when another process
+    #   saved a new revision
+    def _fetch(self, game_id):
+        cached = self._cache.get(game_id)
+        if cached is not None and game_id in self._read:
+            return cached[1]
+        loaded = self.load_record(game_id)
+        if loaded is None:
+            self._cache.pop(game_id, None)
+            return None
+        revision, record = loaded
+        if cached is None or cached[0] != revision:
+            cached = (revision, decode_game(record))
+            self._cache[game_id] = cached
+        if game_id in self._holds:
+            self._read.add(game_id)
+        return cached[1]
+
+    # get the GameSettings of the game
+    def __getitem__(self, game_id):
+        game = self._fetch(game_id)
+        if game is None:
+            raise KeyError(game_id)
+        return game
+
+    # get the GameSettings of the game, default when the store does not hold the game (the store is read once)
+    def get(self, game_id, default=None):
+        game = self._fetch(game_id)
+        return default if game is None else game
+
+    # add (or replace) a game and save its record - the game read from the store is saved over the revision
+    #   read, another game over the revision stored.  Raises StaleGame when another process saved the game
+    #   since it was read
+    def __setitem__(self, game_id, game):
+        with self._lock:
+            cached = self._cache.get(game_id)
+            if cached is not None and cached[1] is game:
+                revision = cached[0]
+            else:
+                loaded = self.load_record(game_id)
+                revision = loaded[0] if loaded else 0
+            if not self.save_record(game_id, revision + 1, encode_game(game)):
+                self._cache.pop(game_id, None)
+                self._read.discard(game_id)
+                raise StaleGame(game_id)
+            self._cache[game_id] = (revision + 1, game)
+
+    # remove a game and its record
+    def __delitem__(self, game_id):
+        if self.load_record(game_id) is None:
+            raise KeyError(game_id)
+        self.delete_record(game_id)
+        self._cache.pop(game_id, None)
+        self._read.discard(game_id)
+
+    # returns True when the store holds the game
+    def __contains__(self, game_id):
+        return self._fetch(game_id) is not None
+
+    # iterate over the game ids in the store
+    def __iter__(self):
+        return iter(self.record_ids())
+
+    # the number of games in the store
+    def __len__(self):
+        return len(self.record_ids())
+
+    # save the changes made to the game as a new revision of its record
+    def save(self, game_id):
+        cached = self._cache.get(game_id)
+        if cached is not None:
+            self[game_id] = cached[1]
+
+    # hold the game while its lock is held (see Games.game_lock) - the game is read from the store once until
+    #   it is released, so the changes made while it is held are saved over the revision read (a game is only
+    #   held by the thread holding its lock)
+    def hold(self, game_id):
+        self._holds[game_id] = self._holds.get(game_id, 0) + 1
+
+    # release the game held - the game is read from the store again once the last hold is released
+    def release(self, game_id):
+        holds = self._holds.pop(game_id) - 1
+        if holds:
+            self._holds[game_id] = holds
+        else:
+            self._read.discard(game_id)
+
+    # get the game ids of the decoded games cached by the process
+    def resident_ids(self):
+        return list(self._cache)
+
+    # get the game ids of the parked games - none, an evicted game is read from its record in the store
+    def parked_ids(self):
+        return []
+
+    # evict a game from the process - the decoded game is dropped, the record is kept (also when remove is set,
+    #   the record is shared by the processes)
+    def evict(self, game_id, remove=False):
+        self._cache.pop(game_id, None)
+        self._read.discard(game_id)
+
+
+# keeps the game records in the database configured as DATABASES['default'] (SQLite)
+class SQLiteStore(RecordStore):
+    table = 'main_game_record'
+
+    def __init__(self, alias='default'):
+        super().__init__()
+        self.alias = alias
+        self._created = False
+
+    # get a cursor for the database, creating the game record table when first used
+    def _cursor(self):
+        cursor = connections[self.alias].cursor()
+        if not self._created:
+            cursor.execute('CREATE TABLE IF NOT EXISTS ' + self.table +
+                           ' (game_id VARCHAR(100) PRIMARY KEY, revision INTEGER NOT NULL, record BLOB NOT NULL)')
+            self._created = True
+        return cursor
+
+    # get the (revision, record) of the game, None when the game is not stored
+    def load_record(self, game_id):
+        with self._cursor() as cursor:
+            cursor.execute('SELECT revision, record FROM ' + self.table + ' WHERE game_id = %s', [game_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    # save the (revision, record) of the game over the previous revision (a new game's first revision is only
+    #   inserted when the game is not stored) - returns False when the stored revision is not the previous
+    #   revision
+    def save_record(self, game_id, revision, record):
+        with self._cursor() as cursor:
+            if revision == 1:
+                cursor.execute('INSERT OR IGNORE INTO ' + self.table + ' (game_id, revision, record) VALUES (%s, %s, %s)',
+                               [game_id, revision, record])
+            else:
+                cursor.execute('UPDATE ' + self.table + ' SET revision = %s, record = %s WHERE game_id = %s AND revision = %s',
+                               [revision, record, game_id, revision - 1])
+            return cursor.rowcount == 1
+
+    # delete the record of the game
+    def delete_record(self, game_id):
+        with self._cursor() as cursor:
+            cursor.execute('DELETE FROM ' + self.table + ' WHERE game_id = %s', [game_id])
+
+    # get the game ids of all the records
+    def record_ids(self):
+        with self._cursor() as cursor:
+            cursor.execute('SELECT game_id FROM ' + self.table)
+            return [row[0] for row in cursor.fetchall()]
+
+
+# keeps the game records in a Redis compatible key-value client - each game is stored under
+#   <prefix><game_id> as the revision (8 bytes) followed by the record
+class KeyValueStore(RecordStore):
+    def __init__(self, client, prefix='playcards:game:'):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    # get the (revision, record) of the game, None when the game is not stored
+    def load_record(self, game_id):
+        value = self.client.get(self.prefix + game_id)
+        if value is None:
+            return None
+        return int.from_bytes(value[:8], 'big'), value[8:]
+
+    # save the (revision, record) of the game over the previous revision - the stored revision is checked and
+    #   the record set in a WATCH/MULTI transaction.  Returns False when the stored revision is not the previous
+    #   revision (or the game was saved while the transaction was made)
+    def save_record(self, game_id, revision, record):
+        key = self.prefix + game_id
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                value = pipe.get(key)
+                if (int.from_bytes(value[:8], 'big') if value is not None else 0) != revision - 1:
+                    return False
+                pipe.multi()
+                pipe.set(key, revision.to_bytes(8, 'big') + record)
+                pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    # delete the record of the game
+    def delete_record(self, game_id):
+        self.client.delete(self.prefix + game_id)
+
+    # get the game ids of all the records
+    def record_ids(self):
+        ids = []
+        for key in self.client.keys(self.prefix + '*'):
+            if isinstance(key, bytes):
+                key = key.decode()
+            ids.append(key[len(self.prefix):])
+        return ids
+
+
+# in-process stand-in for a Redis client supporting the commands used by KeyValueStore
+class LocalKeyValueClient:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = bytes(value)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum([1 for key in keys if self._data.pop(key, None) is not None])
+
+    # keys matching a pattern - only a trailing '*' wildcard is supported
+    def keys(self, pattern='*'):
+        prefix = pattern[:-1] if pattern.endswith('*') else pattern
+        return [key.encode() for key in list(self._data)
+                if key.startswith(prefix) and (pattern.endswith('*') or key == pattern)]
+
+    # a WATCH/MULTI transaction (see LocalPipeline)
+    def pipeline(self):
+        return LocalPipeline(self)
+
+
+# the WATCH/MULTI transaction of the LocalKeyValueClient - the keys watched are read at once, the commands
+#   after multi() are queued and set by execute(), which raises WatchError when a key watched changed
+class LocalPipeline:
+    def __init__(self, client):
+        self.client = client
+        self._watched = {}      # the value of each key watched when it was watched
+        self._commands = []     # the (key, value) set by the transaction
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def watch(self, *keys):
+        for key in keys:
+            self._watched[key] = self.client.get(key)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def multi(self):
+        self._commands = []
+
+    def set(self, key, value):
+        self._commands.append((key, bytes(value)))
+
+    def execute(self):
+        client = self.client
+        commands = self._commands
+        with client._lock:
+            try:
+                if any([client._data.get(key) is not value for key, value in self._watched.items()]):
+                    raise WatchError('Watched variable changed.')
+                for key, value in commands:
+                    client._data[key] = value
+            finally:
+                self.reset()
+        return [True] * len(commands)
+
+    def reset(self):
+        self._watched = {}
+        self._commands = []
+
+
+# create the store selected by PLAYCARDS_GAME_STORE in settings.py
+def create_store():
+    store = getattr(settings, 'PLAYCARDS_GAME_STORE', 'memory')
+    if store == 'memory':
+        journal_dir = getattr(settings, 'PLAYCARDS_JOURNAL_DIR', '')
+        if journal_dir:
+            return JournaledStore(journal.Journal(
+                journal_dir, sync=getattr(settings, 'PLAYCARDS_JOURNAL_SYNC', True),
+                snapshot_bytes=getattr(settings, 'PLAYCARDS_JOURNAL_SNAPSHOT_BYTES', journal.SNAPSHOT_BYTES)))
+        return MemoryStore()
+    if store == 'sqlite':
+        return SQLiteStore()
+    if store == 'keyvalue':
+        client = import_string(getattr(settings, 'PLAYCARDS_KEY_VALUE_CLIENT', 'main.stores.LocalKeyValueClient'))
+        return KeyValueStore(client())
+    raise ValueError('Unknown PLAYCARDS_GAME_STORE: ' + str(store))
@@ -1,3 +1,619 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import unittest
+import zlib
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from main import (benchmarks, bots, compression, hints, journal, loadtest, melds, models, moves, notifier, reaper,
+                  replay, scoring, stores, updates, views, wire)
+
+
+# concurrency stress test - turns are played in many games from many threads while other threads read the
+#   players' updates, no update may hold a half-applied turn and no turn may be lost
+class GameLockStressTest(SimpleTestCase):
+    def test_turns_are_atomic(self):
+        options = {'decks': 2, 'jokers': 6, 'players': 6}
+        for threads in (1, 4, 8):
+            result = benchmarks.stress_turns(threads, 16, 300, options)
+            self.assertEqual(result['inconsistent'], 0)
+            self.assertEqual(result['versions'], result['turns'])
+
+
+# load test - games are created, joined, dealt and played through the HTTP interface of a server started in
+#   the test, every turn must reach the other players' streams
+@override_settings(ALLOWED_HOSTS=['127.0.0.1'])
+class LoadTest(SimpleTestCase):
+    def test_games_through_http(self):
+        report = loadtest.run_load_test({'games': 3, 'players': 3, 'turns': 6, 'decks': 1, 'jokers': 2})
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['turns'], 18)
+        self.assertEqual(report['missed_events'], 0)
+        self.assertEqual(report['latency_ms']['count'], 18 * 2)
+
+
+# the game record of a hand replays to the game - the turns of the bots (drawing from the deck or picking up
+#   from the discard pile) are recorded as they are played
+class ReplayTest(SimpleTestCase):
+    def test_bot_turns_replay(self):
+        games = models.Games()
+        games.add_game('replay', 2, 1)
+        for bot in ('bot1', 'bot2', 'bot3'):
+            games.add_bot('replay', bot)
+        game = games.get_game('replay')
+        game.target_score = 1000000
+        runner = bots.BotRunner(games, notifier.NotificationBus(), workers=0, move_seconds=0.005)
+        rng = random.Random(7)
+        for hand in range(3):
+            games.deal('replay', game.players[hand % 3], rng)
+            turns = 0
+            while runner.play_turn('replay') and turns < 200:
+                turns += 1
+            self.assertEqual(replay.compare(game, replay.replay(game.history)), [])
+
+    def test_take_replays(self):
+        games = models.Games()
+        games.add_game('replay', 0, 1)
+        for player in ('ann', 'bob'):
+            games.add_player('replay', player)
+        game = games.get_game('replay')
+        games.deal('replay', 'bob', random.Random(1))
+        top = game.discards[-1]
+        self.assertEqual(game.take_discards('ann', 1), [top])
+        self.assertEqual(game.discards, [])
+        hand = game.player_cards['ann']
+        games.apply_turn('replay', 'ann', hand[1:], game.discards + hand[:1], [])
+        self.assertEqual(replay.compare(game, replay.replay(game.history)), [])
+
+
+# a bot's turn abandoned because the game changed while the bot decided its plays is played again without
+#   drawing again
+class BotTurnTest(SimpleTestCase):
+    def test_abandoned_turn_draws_once(self):
+        games = models.Games()
+        games.add_game('abandoned', 0, 1)
+        games.add_player('abandoned', 'ann')
+        games.add_bot('abandoned', 'bot1')
+        game = games.get_game('abandoned')
+        games.deal('abandoned', 'ann', random.Random(6))
+        runner = bots.BotRunner(games, notifier.NotificationBus(), workers=0, move_seconds=0.005)
+        decide = runner.decide
+        cards = len(game.deck) + len(game.player_cards['bot1'])
+
+        # another player joins while the bot decides its plays
+        def joined(func, *args):
+            if func is bots.choose_turn:
+                games.add_player('abandoned', 'bob')
+                updates.publish_update(games, 'abandoned')
+            return decide(func, *args) if func is bots.choose_turn else 0
+        runner.decide = joined
+        self.assertTrue(runner.play_turn('abandoned'))
+        self.assertTrue(game.drawn)
+        self.assertEqual(game.active_player, 'bot1')
+        self.assertEqual(len(game.deck) + len(game.player_cards['bot1']), cards)
+        deck = len(game.deck)
+
+        runner.decide = decide
+        self.assertTrue(runner.play_turn('abandoned'))
+        self.assertEqual(len(game.deck), deck)
+        self.assertFalse(game.drawn)
+        self.assertEqual(game.active_player, 'bob')
+        self.assertEqual(replay.compare(game, replay.replay(game.history)), [])
+
+
+# the record stores only save a game over the revision read - a game saved by another process (another store
+#   of the same records) since it was read is not overwritten
+class RecordStoreTest(TestCase):
+    def check_stale_save(self, store, other):
+        games, other_games = models.Games(store), models.Games(other)
+        games.add_game('stale', 2, 1)
+        games.add_player('stale', 'ann')
+        games.save_game('stale')
+        with games.game_lock('stale'):
+            games.set_active_player('stale', 'ann')
+            with other_games.game_lock('stale'):
+                other_games.add_player('stale', 'bob')
+                other_games.save_game('stale')
+            self.assertRaises(stores.StaleGame, games.save_game, 'stale')
+        self.assertEqual(games.get_players('stale'), ['ann', 'bob'])
+        with games.game_lock('stale'):
+            games.set_active_player('stale', 'bob')
+            games.save_game('stale')
+        self.assertEqual(other_games.get_active_player('stale'), 'bob')
+
+    def test_sqlite_stale_save(self):
+        self.check_stale_save(stores.SQLiteStore(), stores.SQLiteStore())
+
+    def test_key_value_stale_save(self):
+        client = stores.LocalKeyValueClient()
+        self.check_stale_save(stores.KeyValueStore(client), stores.KeyValueStore(client))
+
+    def test_held_game_read_once(self):
+        store = stores.KeyValueStore(stores.LocalKeyValueClient())
+        games = models.Games(store)
+        games.add_game('held', 2, 1)
+        loads = []
+        load_record = store.load_record
+        store.load_record = lambda game_id: loads.append(game_id) or load_record(game_id)
+        self.assertIsNone(games.get_game('missing'))
+        self.assertEqual(len(loads), 1)
+        with games.game_lock('held'):
+            for ndx in range(3):
+                games.get_players('held')
+                games.get_deck('held')
+        self.assertEqual(len(loads), 2)
+
+
+# the journaled store appends a game saved under its lock to the journal, and waits for the record to be
+#   durable once the lock is released
+class JournaledStoreTest(SimpleTestCase):
+    def test_durable_after_lock_released(self):
+        with tempfile.TemporaryDirectory() as directory:
+            game_journal = journal.Journal(directory, sync=True)
+            games = models.Games(stores.JournaledStore(game_journal))
+            waits = []
+            wait = game_journal.wait
+            game_journal.wait = lambda sequence: waits.append(games.locks[hash('durable') % models.LOCK_STRIPES]
+                                                              ._is_owned()) or wait(sequence)
+            games.add_game('durable', 2, 1)
+            with games.game_lock('durable'):
+                games.add_player('durable', 'ann')
+                games.save_game('durable')
+                with games.game_lock('durable'):
+                    games.save_game('durable')
+                self.assertEqual(waits, [])
+            self.assertEqual(waits, [False])
+            self.assertEqual(game_journal._committed, game_journal._appended)
+            game_journal.close()
+
+
+# the reaper only drops the resident games over the cap (and the idle games) - the games are parked and read
+#   again, only the abandoned games are removed
+class ReaperTest(SimpleTestCase):
+    def test_capacity_eviction_keeps_games(self):
+        with tempfile.TemporaryDirectory() as directory:
+            game_journal = journal.Journal(directory, sync=False)
+            games = models.Games(stores.JournaledStore(game_journal))
+            for game_id in ('g1', 'g2', 'g3'):
+                games.add_game(game_id, 2, 1)
+                games.add_player(game_id, 'ann')
+                games.save_game(game_id)
+            game_reaper = reaper.Reaper(games, notifier.NotificationBus(), interval=0, idle_seconds=100,
+                                        abandoned_seconds=1000, max_games=1)
+            evicted = game_reaper.sweep(now=0)
+            self.assertEqual(sorted([reason for game_id, reason in evicted]), ['capacity', 'capacity'])
+            self.assertEqual(len(games.games.resident_ids()), 1)
+            self.assertEqual(len(games.games), 3)
+            parked = games.games.parked_ids()[0]
+            self.assertEqual(games.get_players(parked), ['ann'])
+            self.assertIn(parked, games.games.resident_ids())
+            evicted = game_reaper.sweep(now=10)
+            self.assertEqual(len(evicted), 1)
+            self.assertNotEqual(evicted[0][0], parked)
+
+            # the abandoned games are removed (and their removal journaled)
+            evicted = game_reaper.sweep(now=2000)
+            self.assertEqual([reason for game_id, reason in evicted], ['abandoned'] * 3)
+            self.assertEqual(len(games.games), 0)
+            game_journal.close()
+            self.assertEqual(journal.Journal(directory).restore(), {})
+
+
+# the turns posted to the views - only the active player draws (once a turn) and plays a turn, the cards are only
+#   dealt by the player whose deal it is once the hand is over, and a turn posted as the whole hand, discard pile
+#   and game board must conserve the cards of the player's hand and the cards picked up, played and discarded
+class TurnViewsTest(SimpleTestCase):
+    def setUp(self):
+        views.games.add_game('conserve', 0, 1)
+        for player in ('ann', 'bob'):
+            views.games.add_player('conserve', player)
+        views.games.deal('conserve', 'bob', random.Random(2))
+        self.game = views.games.get_game('conserve')
+
+    def tearDown(self):
+        views.games.remove_game('conserve')
+
+    def post_turn(self, hand, discards):
+        cards = lambda cards: json.dumps([{"suit": card.suit, "faceval": card.faceval} for card in cards])
+        return self.client.post('/game-page/conserve/ann/turn_complete_post/', {
+            'updated_players_hand': cards(hand), 'discards': cards(discards), 'game_board': '[]'})
+
+    def test_cards_are_conserved(self):
+        game = self.game
+        hand = list(game.player_cards['ann'])
+        self.assertRaises(moves.InvalidMove, moves.check_turn, game, 'ann', hand[1:], game.discards + hand[:1], [])
+        game.drawn = True
+        self.assertTrue(moves.check_turn(game, 'ann', hand[1:], game.discards + hand[:1], []))
+        self.assertFalse(moves.check_turn(game, 'ann', hand, game.discards, []))
+        self.assertRaises(moves.InvalidMove, moves.check_turn, game, 'ann', hand, game.discards + hand[:1], [])
+        self.assertRaises(moves.InvalidMove, moves.check_turn, game, 'ann', hand[2:], game.discards + hand[:2], [])
+
+    def test_picked_up_card_is_played(self):
+        game = self.game
+        kings = [models.get_card(suit, 'K') for suit in ('spades', 'hearts', 'clubs')]
+        seven = models.get_card('hearts', '7')
+        game.wild_card = '2'
+        game.discards = kings[2:]
+        game.player_cards['ann'] = kings[:2] + [seven]
+        board = [{"type": "Book", "meld_cards": [{"player": "ann", "suit": card.suit, "faceval": "K"}
+                                                 for card in kings]}]
+        self.assertRaises(moves.InvalidMove, moves.check_turn, game, 'ann', kings, [seven], [])
+        self.assertTrue(moves.check_turn(game, 'ann', [], [seven], board))
+        game.drawn = True
+        self.assertRaises(moves.InvalidMove, moves.check_turn, game, 'ann', [], [seven], board)
+
+    def test_conjured_card_is_rejected(self):
+        game = self.game
+        self.assertEqual(self.client.post('/game-page/conserve/ann/draw_card/').status_code, 200)
+        hand = list(game.player_cards['ann'])
+        extra = game.deck[0]
+        self.assertEqual(self.post_turn(hand[1:] + [extra], game.discards + hand[:1]).status_code, 400)
+        self.assertEqual(game.player_cards['ann'], hand)
+        self.assertEqual(self.post_turn(hand[1:], game.discards + hand[:1]).status_code, 200)
+        self.assertEqual(game.active_player, 'bob')
+
+    def test_only_the_active_player_draws_once(self):
+        version = self.game.version
+        self.assertEqual(self.client.post('/game-page/conserve/bob/draw_card/').status_code, 403)
+        self.assertEqual(self.client.post('/game-page/conserve/ann/draw_card/').status_code, 200)
+        self.assertEqual(self.game.version, version + 1)
+        self.assertEqual(self.client.post('/game-page/conserve/ann/draw_card/').status_code, 409)
+        hand = list(self.game.player_cards['ann'])
+        self.assertEqual(self.client.post('/game-page/conserve/bob/turn_complete_post/', {
+            'updated_players_hand': '[]', 'discards': '[]', 'game_board': '[]'}).status_code, 403)
+        self.assertEqual(self.post_turn(hand[1:], self.game.discards + hand[:1]).status_code, 200)
+        self.assertFalse(self.game.drawn)
+
+    def test_deal_by_the_dealer_once_the_hand_is_over(self):
+        self.assertEqual(self.client.post('/deal/conserve/ann').status_code, 409)
+        self.game.deck = []
+        self.assertEqual(self.client.post('/deal/conserve/bob').status_code, 403)
+        self.assertEqual(self.client.post('/deal/conserve/ann').status_code, 200)
+        self.assertEqual(self.game.dealer, 'ann')
+
+    def test_exit_removes_the_game(self):
+        self.client.get('/exit/conserve/ann')
+        self.assertIsNotNone(views.games.get_game('conserve'))
+        self.client.get('/exit/conserve/bob')
+        self.assertIsNone(views.games.get_game('conserve'))
+        self.assertNotIn('conserve', views.games.games)
+        response = self.client.post('/create/', {'game_id': 'conserve', 'user_name': 'cal', 'number_of_decks': 1})
+        self.assertRedirects(response, '/game-page/conserve/cal/', fetch_redirect_response=False)
+
+
+# a turn applied as its moves - checked before the game is changed
+class MovesTest(SimpleTestCase):
+    def setUp(self):
+        card = models.get_card
+        game = models.GameSettings()
+        game.players = ['ann', 'bob']
+        game.player_cards = {'ann': [card('spades', 'K'), card('hearts', 'K'), card('hearts', '7')], 'bob': []}
+        game.discards = [card('clubs', '5'), card('clubs', 'K')]
+        game.deck = [card('diamonds', '9'), card('diamonds', '3')]
+        game.active_player = 'ann'
+        game.dealer = 'bob'
+        game.wild_card = '2'
+        self.game = game
+        self.king = card('clubs', 'K')
+        self.seven = card('hearts', '7')
+
+    def apply(self, turn, player='ann'):
+        return moves.apply_moves(self.game, player, moves.parse_moves(json.dumps(turn)))
+
+    def test_take_and_play(self):
+        kings = [models.get_card('spades', 'K').card_id, models.get_card('hearts', 'K').card_id, self.king.card_id]
+        discarded, drawn = self.apply([['take', 1], ['meld', 'Book', kings], ['discard', self.seven.card_id]])
+        self.assertTrue(discarded)
+        self.assertEqual(drawn, [])
+        self.assertEqual(self.game.discards, [models.get_card('clubs', '5'), self.seven])
+        self.assertEqual(self.game.player_cards['ann'], [])
+        self.assertEqual(self.game.active_player, 'bob')
+
+    def test_draw_and_discard(self):
+        discarded, drawn = self.apply([['draw'], ['discard', self.seven.card_id]])
+        self.assertEqual(drawn, [models.get_card('diamonds', '3')])
+        self.assertEqual(len(self.game.deck), 1)
+
+    def test_invalid_turns_leave_the_game(self):
+        kings = [models.get_card('spades', 'K').card_id, models.get_card('hearts', 'K').card_id, self.king.card_id]
+        for player, turn in [
+                ('bob', [['draw']]),
+                ('ann', [['discard', self.seven.card_id]]),
+                ('ann', [['draw'], ['draw'], ['discard', self.seven.card_id]]),
+                ('ann', [['draw'], ['take', 1], ['discard', self.seven.card_id]]),
+                ('ann', [['take', 1], ['discard', self.king.card_id]]),
+                ('ann', [['take', 2], ['meld', 'Book', kings], ['discard', self.seven.card_id]]),
+                ('ann', [['take', 3]]),
+                ('ann', [['draw'], ['discard', self.king.card_id]])]:
+            self.assertRaises(moves.InvalidMove, self.apply, turn, player)
+        self.assertEqual(len(self.game.deck), 2)
+        self.assertEqual(len(self.game.discards), 2)
+        self.assertEqual(len(self.game.player_cards['ann']), 3)
+
+    def test_no_draw_after_drawing(self):
+        self.game.drawn = True
+        self.assertRaises(moves.InvalidMove, self.apply, [['draw'], ['discard', self.seven.card_id]])
+        self.apply([['discard', self.seven.card_id]])
+        self.assertFalse(self.game.drawn)
+
+
+# the stores - a game saved to a record store reads back as the same game
+class StoreRoundTripTest(TestCase):
+    def dealt_game(self, store):
+        games = models.Games(store)
+        games.add_game('round', 0, 1)
+        for player in ('ann', 'bob'):
+            games.add_player('round', player)
+        games.deal('round', 'bob', random.Random(5))
+        game = games.get_game('round')
+        game.game_board_items.append({"type": "Book", "meld_cards": [
+            {"player": "ann", "suit": suit, "faceval": "K"} for suit in ('spades', 'hearts', 'clubs')]})
+        game.drawn = True
+        games.save_game('round')
+        return game
+
+    def test_encode_game(self):
+        game = self.dealt_game(stores.MemoryStore())
+        self.assertEqual(vars(stores.decode_game(stores.encode_game(game))), vars(game))
+
+    def test_record_stores(self):
+        client = stores.LocalKeyValueClient()
+        for store, other in ((stores.SQLiteStore(), stores.SQLiteStore()),
+                             (stores.KeyValueStore(client), stores.KeyValueStore(client))):
+            game = self.dealt_game(store)
+            self.assertEqual(vars(models.Games(other).get_game('round')), vars(game))
+
+
+# melds - runs with aces low and high and wild cards, all-wild melds, and melds extended at either end of the
+#   game board
+class MeldsTest(SimpleTestCase):
+    def ids(self, *cards):
+        return [models.get_card(suit, faceval).card_id for suit, faceval in cards]
+
+    def board_item(self, meld_type, *cards):
+        return {"type": meld_type, "meld_cards": [{"player": "ann", "suit": suit, "faceval": faceval}
+                                                   for suit, faceval in cards]}
+
+    def test_runs(self):
+        joker = ('joker', '?')
+        for cards in ([('hearts', 'A'), ('hearts', '2'), ('hearts', '3')],
+                      [('hearts', 'Q'), ('hearts', 'K'), ('hearts', 'A')],
+                      [('hearts', 'A'), ('hearts', 'K'), ('hearts', 'Q')],
+                      [('hearts', 'A'), ('spades', '7'), ('hearts', '3')],
+                      [('hearts', 'Q'), joker, ('hearts', 'A')],
+                      [joker, ('hearts', '2'), ('hearts', '3')]):
+            melds.check_meld('Run', self.ids(*cards), '7')
+        for cards in ([('hearts', 'K'), ('hearts', 'A'), ('hearts', '2')],
+                      [('hearts', '4'), ('spades', '5'), ('hearts', '6')],
+                      [('hearts', '4'), ('hearts', '6'), ('hearts', '5')],
+                      [joker, ('hearts', 'A'), ('hearts', '2'), ('hearts', '3')],
+                      [('hearts', 'Q'), ('hearts', 'K'), ('hearts', 'A'), joker]):
+            self.assertRaises(melds.InvalidMeld, melds.check_meld, 'Run', self.ids(*cards), '7')
+
+    def test_books_and_all_wild_melds(self):
+        wild = [('joker', '?'), ('spades', '7'), ('clubs', '7')]
+        melds.check_meld('Book', self.ids(*wild), '7')
+        melds.check_meld('Run', self.ids(*wild), '7')
+        melds.check_meld('Book', self.ids(('hearts', 'A'), ('spades', 'A'), ('joker', '?')), '7')
+        melds.check_meld('Book', self.ids(('spades', '7'), ('clubs', '5'), ('joker', '?')), '5')
+        self.assertRaises(melds.InvalidMeld, melds.check_meld, 'Book',
+                          self.ids(('spades', '7'), ('clubs', '5'), ('joker', '?')), '')
+        self.assertRaises(melds.InvalidMeld, melds.check_meld, 'Book',
+                          self.ids(('hearts', '5'), ('spades', '6'), ('joker', '?')), '7')
+        self.assertRaises(melds.InvalidMeld, melds.check_meld, 'Book', self.ids(('hearts', '5'), ('spades', '5')), '7')
+        self.assertRaises(melds.InvalidMeld, melds.check_meld, 'Set', self.ids(*wild), '7')
+
+    def test_board_extended_at_either_end(self):
+        old = [self.board_item('Run', ('hearts', '4'), ('hearts', '5'), ('hearts', '6'))]
+        new = [self.board_item('Run', ('hearts', '3'), ('hearts', '4'), ('hearts', '5'), ('hearts', '6'),
+                               ('spades', '7')),
+               self.board_item('Book', ('clubs', 'K'), ('spades', 'K'), ('hearts', 'K'))]
+        melds.check_board(old, new, '7')
+        for board in ([self.board_item('Run', ('hearts', '4'), ('spades', '7'), ('hearts', '5'), ('hearts', '6'))],
+                      [self.board_item('Book', ('hearts', '4'), ('hearts', '5'), ('hearts', '6'))],
+                      [self.board_item('Run', ('hearts', '4'), ('hearts', '5'), ('hearts', '6'), ('hearts', '8'))],
+                      []):
+            self.assertRaises(melds.InvalidMeld, melds.check_board, old, board, '7')
+
+    def test_board_cards_keep_their_player(self):
+        old = [self.board_item('Run', ('hearts', '4'), ('hearts', '5'), ('hearts', '6'))]
+        new = [dict(old[0], meld_cards=[{"player": "bob", "suit": "hearts", "faceval": "3"}] + old[0]['meld_cards']),
+               {"type": "Book", "meld_cards": [{"player": "bob", "suit": suit, "faceval": "K"}
+                                               for suit in ('clubs', 'spades', 'hearts')]}]
+        melds.check_board(old, new, '7', 'bob')
+        self.assertRaises(melds.InvalidMeld, melds.check_board, old, new, '7', 'ann')
+        taken = [dict(old[0], meld_cards=[dict(meld_card, player='bob') for meld_card in new[0]['meld_cards']])]
+        self.assertRaises(melds.InvalidMeld, melds.check_board, old, taken, '7', 'bob')
+
+
+# scoring - a player going out without discarding (Blitz) ends the hand at once, a player going out by
+#   discarding ends it once the turn comes around to them again
+class ScoringTest(SimpleTestCase):
+    def setUp(self):
+        card = models.get_card
+        game = models.GameSettings()
+        game.players = ['ann', 'bob']
+        game.scores = {'ann': 0, 'bob': 0}
+        game.dealer = 'bob'
+        game.active_player = 'bob'
+        game.wild_card = '2'
+        game.game_board_items = [{"type": "Book", "meld_cards": [
+            {"player": "ann", "suit": suit, "faceval": "K"} for suit in ('spades', 'hearts', 'clubs')]}]
+        game.player_cards = {'ann': [], 'bob': [models.CARDS[models.JOKER_ID], card('hearts', '2'),
+                                                card('clubs', '5')]}
+        self.game = game
+
+    def test_card_points(self):
+        self.assertEqual(scoring.score_table(self.game), {'ann': 30, 'bob': -605})
+        self.assertEqual(scoring.card_points(models.get_card('spades', 'A'), '2'), 100)
+        self.assertEqual(scoring.card_points(models.get_card('spades', '2'), ''), 5)
+
+    def test_blitz(self):
+        self.assertEqual(scoring.complete_turn(self.game, 'ann', False), {'ann': 30, 'bob': -605})
+        self.assertEqual(self.game.scores, {'ann': 30, 'bob': -605})
+        self.assertIsNone(scoring.complete_turn(self.game, 'bob', True))
+
+    def test_last_turn(self):
+        self.assertIsNone(scoring.complete_turn(self.game, 'ann', True))
+        self.assertEqual(self.game.out_player, 'ann')
+        self.assertEqual(self.game.hand_scores, {})
+        self.game.active_player = 'ann'
+        self.game.target_score = 20
+        self.assertEqual(scoring.complete_turn(self.game, 'bob', True), {'ann': 30, 'bob': -605})
+        self.assertEqual(self.game.out_player, '')
+        self.assertEqual(self.game.winner, 'ann')
+
+
+# hints - the new melds and additions of a hand are legal plays
+class HintsTest(SimpleTestCase):
+    def test_plays(self):
+        card = models.get_card
+        hand = [card('hearts', 'Q'), card('hearts', 'K'), card('hearts', 'A'), card('spades', '5'),
+                card('clubs', '5'), card('diamonds', '2')]
+        board = [{"type": "Run", "meld_cards": [{"player": "bob", "suit": "hearts", "faceval": faceval}
+                                                for faceval in ('J', '10', '9')]}]
+        plays = hints.find_plays(hand, '2', board)
+        found = [(play.meld_type, play.index, play.position, [(c.suit, c.faceval) for c in play.cards])
+                 for play in plays]
+        self.assertIn(('Run', None, None, [('hearts', 'Q'), ('hearts', 'K'), ('hearts', 'A')]), found)
+        self.assertIn(('Book', None, None, [('spades', '5'), ('clubs', '5'), ('diamonds', '2')]), found)
+        self.assertIn(('Run', 0, 'Before', [('hearts', 'Q')]), found)
+        self.assertIn(('Run', 0, 'After', [('diamonds', '2')]), found)
+        self.assertNotIn(('Run', 0, 'After', [('hearts', 'Q')]), found)
+        for play in plays:
+            cards = melds.card_ids(play.cards)
+            if play.index is not None:
+                old = melds.card_ids(board[play.index]['meld_cards'])
+                cards = cards + old if play.position == 'Before' else old + cards
+            melds.check_meld(play.meld_type, cards, '2')
+        self.assertEqual(hints.play_dicts(plays[:1])[0]['cards'][0], {"suit": "spades", "faceval": "5"})
+        self.assertEqual(hints.find_plays([card('hearts', 'Q')], '2', []), [])
+
+
+# the journal - the records are restored after a crash, a record torn while it was written is dropped
+class JournalTest(SimpleTestCase):
+    def test_crash_restore(self):
+        with tempfile.TemporaryDirectory() as directory:
+            game_journal = journal.Journal(directory, sync=True)
+            self.assertEqual(game_journal.restore(), {})
+            for game_id, record in (('a', b'1'), ('b', b'2'), ('c', b'3'), ('a', b'4'), ('c', b''), ('d', b'5')):
+                game_journal.append(game_id, record)
+            game_journal.flush()
+            game_journal.close()
+            path = game_journal.path('journal', 1)
+            os.truncate(path, os.path.getsize(path) - 1)
+            with self.assertLogs(journal.logger, 'WARNING'):
+                self.assertEqual(journal.Journal(directory).restore(), {'a': b'4', 'b': b'2'})
+
+    def test_store_restore(self):
+        with tempfile.TemporaryDirectory() as directory:
+            game_journal = journal.Journal(directory, sync=True)
+            games = models.Games(stores.JournaledStore(game_journal))
+            games.add_game('saved', 0, 1)
+            for player in ('ann', 'bob'):
+                games.add_player('saved', player)
+            games.deal('saved', 'bob', random.Random(4))
+            games.save_game('saved')
+            game_journal.close()
+            restored = models.Games(stores.JournaledStore(journal.Journal(directory)))
+            self.assertEqual(vars(restored.get_game('saved')), vars(games.get_game('saved')))
+            restored.games.journal.close()
+
+
+# a human turn posted as its moves replays with the game record
+class HumanReplayTest(SimpleTestCase):
+    def test_moves_replay(self):
+        games = models.Games()
+        games.add_game('human', 0, 1)
+        for player in ('ann', 'bob'):
+            games.add_player('human', player)
+        game = games.get_game('human')
+        games.deal('human', 'bob', random.Random(3))
+        for player in ('ann', 'bob'):
+            turn = [('draw',), ('discard', game.player_cards[player][0].card_id)]
+            discarded, drawn = moves.apply_moves(game, player, turn)
+            scoring.complete_turn(game, player, discarded)
+        self.assertEqual(game.active_player, 'ann')
+        self.assertEqual(replay.compare(game, replay.replay(game.history)), [])
+
+
+# the wire formats - the compact and msgpack updates and turns hold the cards of the JSON format
+class WireTest(SimpleTestCase):
+    def setUp(self):
+        self.hand = [models.get_card('hearts', 'Q'), models.CARDS[models.JOKER_ID]]
+        self.discards = [models.get_card('clubs', '5')]
+        self.board = [{"type": "Book", "meld_cards": [{"player": player, "suit": suit, "faceval": "K"}
+                                                      for player, suit in (('ann', 'spades'), ('ann', 'hearts'),
+                                                                           ('bob', 'clubs'))]}]
+
+    def test_compact_update(self):
+        data = {"type": "update_game", "player_cards": wire.card_list(self.hand),
+                "discards": wire.card_list(self.discards), "gameboard": self.board}
+        self.assertEqual(wire.expand_data(json.loads(json.dumps(wire.compact_data(data)))), data)
+        shared = wire.encode_shared({"discards": data['discards'], "gameboard": self.board}, 'compact')
+        self.assertEqual(wire.decode_event(wire.event_data('update_game', self.hand, shared, 'compact')), data)
+        self.assertRaises(ValueError, wire.expand_data, {"player_cards": "not base64!"})
+
+    def test_compact_turn(self):
+        request = RequestFactory().post('/', wire.encode_turn(self.hand, self.discards, self.board, 'compact'))
+        self.assertEqual(wire.turn_format(request), 'compact')
+        self.assertEqual(wire.decode_turn(request, 'compact'), (self.hand, self.discards, self.board))
+
+    def test_negotiate(self):
+        self.assertEqual(wire.negotiate('compact'), 'compact')
+        self.assertEqual(wire.negotiate('xml'), 'json')
+        self.assertEqual(wire.negotiate('msgpack'), 'msgpack' if wire.msgpack is not None else 'json')
+
+    @unittest.skipUnless(wire.msgpack, 'msgpack is not installed')
+    def test_msgpack(self):
+        data = {"type": "update_game", "player_cards": wire.card_list(self.hand),
+                "discards": wire.card_list(self.discards), "gameboard": self.board}
+        shared = wire.encode_shared({"discards": data['discards'], "gameboard": self.board}, 'msgpack')
+        self.assertEqual(wire.decode_event(wire.event_data('update_game', self.hand, shared, 'msgpack')), data)
+        body = wire.encode_turn(self.hand, self.discards, self.board, 'msgpack')
+        request = RequestFactory().post('/', body, content_type='application/msgpack')
+        self.assertEqual(wire.turn_format(request), 'msgpack')
+        self.assertEqual(wire.decode_turn(request, 'msgpack'), (self.hand, self.discards, self.board))
+
+
+# the compressed streams - each event is flushed so it can be decompressed as soon as it is received
+class CompressionTest(SimpleTestCase):
+    def test_negotiate(self):
+        self.assertEqual(compression.negotiate('gzip, deflate', 6), 'gzip')
+        self.assertEqual(compression.negotiate('gzip;q=0, deflate', 6), 'deflate')
+        self.assertEqual(compression.negotiate('*', 6), 'gzip')
+        self.assertIsNone(compression.negotiate('br', 6))
+        self.assertIsNone(compression.negotiate('gzip', 0))
+
+    def test_events_are_flushed(self):
+        closed = []
+
+        def events():
+            try:
+                for ndx in range(3):
+                    yield 'data: {"type": "update_delta", "version": %d}\n\n' % ndx
+            finally:
+                closed.append(True)
+
+        for encoding, wbits in compression.ENCODINGS:
+            decompressor = zlib.decompressobj(15 + wbits)
+            stream = compression.compress_stream(events(), compression.StreamCompressor(encoding, 6, 15, 8))
+            self.assertEqual(decompressor.decompress(next(stream)).decode(),
+                             'data: {"type": "update_delta", "version": 0}\n\n')
+            self.assertEqual(decompressor.decompress(next(stream)).decode(),
+                             'data: {"type": "update_delta", "version": 1}\n\n')
+            stream.close()
+        self.assertEqual(closed, [True, True])
+
+    def test_metrics_disabled(self):
+        compressor = compression.StreamCompressor('gzip', 6, 15, 8)
+        with mock.patch.object(compression.metrics, 'enabled', False), \
+                mock.patch.object(compression.time, 'perf_counter') as perf_counter, \
+                mock.patch.object(compression.SSE_RAW_BYTES, 'inc') as inc:
+            compressor.compress('data: {}\n\n')
+        perf_counter.assert_not_called()
+        inc.assert_not_called()
+        self.assertEqual(compressor.raw_bytes, 10)
@@ -0,0 +1,346 @@
+"""
+NAME
+    updates.py
+
+DESCRIPTION
+    Builds the game updates sent to the players through server sent events (SSE).  The part of the
+    'update_game' data shared by every player in a game (deck size, discard pile, game board, players,
+    card counts, dealer, active player, wild card, scores) is serialized once each time the game's version
+    is bumped and cached as a snapshot.  Each player's stream only serializes the player's own cards
+    and splices them into the cached snapshot, so sending a turn to N players costs one serialization
+    of the shared data plus N small hands.
+
+    When the shared data is published the difference from the previously published version is also
+    serialized.  A player that already has the previous version is sent an 'update_delta' event:
+        version, base_version          -- the version of the update and the version it applies to
+        player_cards                   -- the player's cards (only in the latest update sent)
+        discards                       -- [keep_head, keep_tail, cards] - keep the first keep_head and
+                                          the last keep_tail cards of the list and insert cards between
+        melds_added                    -- game board items added to the end of the game board
+        melds_extended                 -- [index, position, cards] - cards inserted at position of the
+                                          meld cards of the game board item at index
+        deck_size, players, card_counts, dealer, active_player, wild_card, scores, hand_scores,
+        target_score, winner           -- included (with the new value) only when changed
+    The scores are listed in the order of the players: scores holds each player's running total and
+    hand_scores each player's score for the hand (null until the hand is scored, see scoring.py).
+    Each published update is appended to the game's event log (a bounded, versioned log).  Every
+    player's stream keeps its own cursor (the version last sent to the player), so a player that
+    reconnects with the version last received (the SSE Last-Event-ID) is sent the deltas it missed.
+    A full 'update_game' event is sent when the log no longer holds the updates the player missed,
+    or when the change cannot be sent as a delta (ie. a new deal).  Entries are trimmed from the log
+    once every cursor has passed them.
+
+    A player's stream can ask for a compact wire format (see wire.py) - the shared data and the deltas
+    are then encoded in that format once, when the first player asks for it, and cached with the
+    snapshot and the log entry (encoded).
+
+    When the games are shared by several worker processes (see stores.py) an update published by
+    another worker is found when the game's version no longer matches the cached snapshot - the
+    snapshot is created again and appended to the game's event log, so the players connected to
+    this worker are still sent deltas.
+
+CLASS
+    Snapshot                       -- the shared game data for a version of a game, serialized in full
+                                      and as a delta from the previously published version
+    LogEntry                       -- an update in a game's event log (version, base version, delta)
+    EventLog                       -- the bounded, versioned log of the updates published for a game
+
+METHODS
+                        EventLog Class
+    __init__                       -- initializes an empty event log
+    append                         -- append an update to the log, trimming the entries all cursors passed
+    since                          -- get the unbroken chain of deltas after a version
+    advance                        -- move a subscriber's cursor to the version last sent
+    remove                         -- remove a subscriber's cursor
+
+FUNCTIONS
+    card_list                      -- convert a list of Card objects to a list of dictionaries
+    shared_game_data               -- create the game data shared by all players in the game
+    list_splice                    -- create the [keep_head, keep_tail, cards] change between two lists
+    shared_delta                   -- create the delta between two versions of the shared game data
+    create_snapshot                -- create the snapshot of the game's current shared data
+    publish_update                 -- bump the game's version, cache the serialized shared data and
+                                      append the update to the game's event log
+    get_snapshot                   -- get the cached snapshot of a game (created and appended to the
+                                      game's event log when missing or stale)
+    encoded                        -- get the shared data or delta of an update encoded in a wire format
+    full_event                     -- the data of a full update for a player (the snapshot and the player's cards)
+    pending_updates                -- create the JSON formatted updates (deltas or full) for a player
+    full_update                    -- get the full update of a game for a player (the game's state, see
+                                      views.state_view) without moving the player's cursor
+    remove_subscriber              -- remove a player's cursor from the game's event log
+    discard_game                   -- remove the cached snapshot and event log of a game
+
+DATA
+    EVENT_LOG_SIZE                 -- the maximum number of updates kept in a game's event log
+    snapshots                      -- the cached Snapshot of each game accessed by game_id
+    event_logs                     -- the EventLog of each game accessed by game_id
+"""
+
+import json
+import threading
+from collections import namedtuple
+
+from . import wire
+
+EVENT_LOG_SIZE = 64     # the maximum number of updates kept in a game's event log
+
+# the shared game data for a version of a game, serialized in full and as a delta from the
+#   previously published version (delta_json is None when no delta is available), and the shared
+#   data encoded in each compact wire format asked for (see wire.py)
+Snapshot = namedtuple('Snapshot', ['version', 'shared', 'shared_json', 'base_version', 'delta_json', 'encoded'])
+
+# an update in a game's event log - the delta (JSON) from base_version to version of the game's
+#   shared data (delta_json is None when the update can only be sent in full), and the delta encoded
+#   in each compact wire format asked for
+LogEntry = namedtuple('LogEntry', ['version', 'base_version', 'delta_json', 'encoded'])
+
+snapshots = {}    # the cached Snapshot of each game accessed by game_id
+event_logs = {}   # the EventLog of each game accessed by game_id
+
+
+# convert a list of Card objects to a list of dictionaries (suit and face value)
+def card_list(cards):
+    return [{"suit": card.suit, "faceval": card.faceval} for card in cards]
+
+
+# create the game data shared by all players in the game including:
+#   number of cards in the deck, list of players, dealer, active player, discard pile, game board contents,
+#   count of each player's cards, wild card, each player's running total and hand score, target score, winner
+def shared_game_data(games, game_id):
+    players = games.get_players(game_id)
+    game_board_items = []
+    for item in games.get_game_board_items(game_id):
+        meld_cards = []
+        for meld_card in item['meld_cards']:
+            meld_cards.append({"player": meld_card['player'], "suit": meld_card['suit'],
+                               "faceval": meld_card['faceval']})
+        game_board_items.append({"type": item['type'], "meld_cards": meld_cards})
+    card_counts = [len(games.get_player_cards(game_id, player)) for player in players]
+    scores = games.get_scores(game_id)
+    hand_scores = games.get_hand_scores(game_id)
+    return {
+        'version': games.get_version(game_id),
+        'deck_size': len(games.get_deck(game_id)),
+        'players': list(players),
+        'dealer': games.get_dealer(game_id),
+        'active_player': games.get_active_player(game_id),
+        'discards': card_list(games.get_discards(game_id)),
+        'gameboard': game_board_items,
+        'card_counts': card_counts,
+        'wild_card': games.get_wild_card(game_id),
+        'scores': [scores.get(player, 0) for player in players],
+        'hand_scores': [hand_scores.get(player) for player in players] if hand_scores else None,
+        'target_score': games.get_target_score(game_id),
+        'winner': games.get_winner(game_id),
+    }
+
+
+# create the [keep_head, keep_tail, cards] change that converts the old list into the new list
+def list_splice(old, new):
+    limit = min(len(old), len(new))
+    head = 0
+    while head < limit and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    return [head, tail, new[head:len(new) - tail]]
+
+
+# create the delta between two versions of the shared game data, returns None when the
+#   change can not be sent as a delta (game board items removed or replaced)
+def shared_delta(old, new):
+    delta = {'version': new['version'], 'base_version': old['version']}
+    for key in ('deck_size', 'players', 'card_counts', 'dealer', 'active_player', 'wild_card',
+                'scores', 'hand_scores', 'target_score', 'winner'):
+        if old[key] != new[key]:
+            delta[key] = new[key]
+    if old['discards'] != new['discards']:
+        delta['discards'] = list_splice(old['discards'], new['discards'])
+
+    # game board items can only be added to the end of the game board or extended
+    old_board = old['gameboard']
+    new_board = new['gameboard']
+    if len(new_board) < len(old_board):
+        return None
+    melds_extended = []
+    for index in range(len(old_board)):
+        old_item = old_board[index]
+        new_item = new_board[index]
+        if old_item != new_item:
+            if old_item['type'] != new_item['type']:
+                return None
+            head, tail, cards = list_splice(old_item['meld_cards'], new_item['meld_cards'])
+            if head + tail != len(old_item['meld_cards']):
+                return None
+            melds_extended.append([index, head, cards])
+    if melds_extended:
+        delta['melds_extended'] = melds_extended
+    if len(new_board) > len(old_board):
+        delta['melds_added'] = new_board[len(old_board):]
+    return delta
+
+
+# create the snapshot of the game's current shared data, including the delta from the previous snapshot
+def create_snapshot(games, game_id, previous):
+    shared = shared_game_data(games, game_id)
+    base_version = None
+    delta_json = None
+    if previous is not None:
+        delta = shared_delta(previous.shared, shared)
+        if delta is not None:
+            base_version = previous.version
+            delta_json = json.dumps(delta)
+    return Snapshot(shared['version'], shared, json.dumps(shared), base_version, delta_json, {})
+
+
+# bounded, versioned log of the updates published for a game.  Writers replace the tuple of entries
+#   under a lock while readers (the players' streams) only read the current tuple and move their own
+#   cursor, so reading the log never takes a lock
+class EventLog:
+    # initialize an empty event log keeping at most max_entries updates
+    def __init__(self, max_entries=EVENT_LOG_SIZE):
+        self.max_entries = max_entries
+        self.entries = ()           # the LogEntry of each update (oldest first)
+        self.cursors = {}           # the version last sent to each subscriber (player)
+        self._lock = threading.Lock()
+
+    # append an update to the log - entries that all the subscribers' cursors have passed are trimmed
+    def append(self, entry):
+        with self._lock:
+            entries = self.entries + (entry,)
+            cursors = list(self.cursors.values())
+            if cursors:
+                oldest = min(cursors)
+                entries = tuple([log_entry for log_entry in entries if log_entry.version > oldest])
+            self.entries = entries[-self.max_entries:]
+
+    # get the entries after version, returns None when the log does not hold an unbroken chain of
+    #   deltas starting at version (the entries were trimmed or an update can only be sent in full)
+    def since(self, version):
+        entries = self.entries
+        ndx = len(entries)
+        while ndx > 0 and entries[ndx - 1].version > version:
+            ndx -= 1
+        base_version = version
+        for entry in entries[ndx:]:
+            if entry.base_version != base_version or entry.delta_json is None:
+                return None
+            base_version = entry.version
+        return entries[ndx:]
+
+    # move the subscriber's cursor to the version last sent to the subscriber
+    def advance(self, subscriber, version):
+        self.cursors[subscriber] = version
+
+    # remove the subscriber's cursor (the player left the game)
+    def remove(self, subscriber):
+        self.cursors.pop(subscriber, None)
+
+
+# bump the game's version, serialize the shared game data once for all the players, and append the
+#   update to the game's event log
+def publish_update(games, game_id):
+    games.bump_version(game_id)
+    return get_snapshot(games, game_id)
+
+
+# get the cached snapshot of the game, the snapshot is created when missing or stale (the game was
+#   updated by this or another worker process) and the update is appended to the game's event log.  The
+#   snapshot is created while holding the game's lock so it never holds a half-applied change
+def get_snapshot(games, game_id):
+    snapshot = snapshots.get(game_id)
+    if snapshot is not None and snapshot.version == games.get_version(game_id):
+        return snapshot
+    with games.game_lock(game_id):
+        snapshot = snapshots.get(game_id)
+        if snapshot is None or snapshot.version != games.get_version(game_id):
+            snapshot = create_snapshot(games, game_id, snapshot)
+            snapshots[game_id] = snapshot
+            event_logs.setdefault(game_id, EventLog()).append(
+                LogEntry(snapshot.version, snapshot.base_version, snapshot.delta_json, {}))
+    return snapshot
+
+
+# get the shared data of a snapshot, or the delta of a log entry, encoded in a compact wire format - encoded
+#   once for all the players when first asked for (see wire.encode_shared)
+def encoded(update, wire_format):
+    data = update.encoded.get(wire_format)
+    if data is None:
+        if isinstance(update, Snapshot):
+            data = wire.encode_shared(update.shared, wire_format)
+        else:
+            data = wire.encode_shared(json.loads(update.delta_json), wire_format)
+        update.encoded[wire_format] = data
+    return data
+
+
+# the data of a full 'update_game' for a player - the snapshot's shared data with the player's cards (Card
+#   objects) spliced in, in the wire format
+def full_event(snapshot, cards, wire_format):
+    if wire_format != 'json':
+        return wire.event_data('update_game', cards, encoded(snapshot, wire_format), wire_format)
+    return '{"type": "update_game", "player_cards": ' + json.dumps(card_list(cards)) + ', ' + \
+        snapshot.shared_json[1:]
+
+
+# create the JSON formatted updates for a player that last received last_version of the game - the
+#   deltas in the game's event log after last_version, or a full update when the log can not bring the
+#   player up to date.  Only the player's cards are serialized (added to the last update), the shared
+#   game data is spliced in from the log and the snapshot.  The snapshot and the player's cards are read
+#   while holding the game's lock, so the player's cards always match the snapshot.  The updates are
+#   created in the compact wire format asked for (see wire.py) unless it is 'json'.  Returns the version
+#   sent to the player and a list of (version, data) for each update (empty when the player is up to date)
+def pending_updates(games, game_id, user_name, last_version=None, wire_format='json'):
+    with games.game_lock(game_id):
+        snapshot = get_snapshot(games, game_id)
+        if last_version == snapshot.version:
+            return last_version, []
+        cards = list(games.get_player_cards(game_id, user_name))
+    event_log = event_logs.get(game_id)
+    entries = None
+    if event_log is not None and last_version is not None:
+        entries = event_log.since(last_version)
+    delta = entries and entries[-1].version == snapshot.version
+    if not delta:
+        pending = [(snapshot.version, full_event(snapshot, cards, wire_format))]
+    elif wire_format != 'json':
+        pending = [(entry.version, wire.event_data('update_delta', cards if entry is entries[-1] else None,
+                                                   encoded(entry, wire_format), wire_format))
+                   for entry in entries]
+    else:
+        player_cards = json.dumps(card_list(cards))
+        pending = [(entry.version, '{"type": "update_delta", ' + entry.delta_json[1:]) for entry in entries[:-1]]
+        pending.append((snapshot.version, '{"type": "update_delta", "player_cards": ' + player_cards + ', ' +
+                        entries[-1].delta_json[1:]))
+    if event_log is not None:
+        event_log.advance(user_name, snapshot.version)
+    return snapshot.version, pending
+
+
+# get the full update of the game for the player (the game's state when the player's page is loaded, see
+#   views.state_view) in the wire format - the player's cursor in the game's event log is not moved, the
+#   player's stream brings the player up to date from the version returned.  Returns the version and the data
+#   of the update, None when the game or the player is not found
+def full_update(games, game_id, user_name, wire_format='json'):
+    with games.game_lock(game_id):
+        game = games.get_game(game_id)
+        if game is None or user_name not in game.get_players():
+            return None
+        snapshot = get_snapshot(games, game_id)
+        cards = list(games.get_player_cards(game_id, user_name))
+    return snapshot.version, full_event(snapshot, cards, wire_format)
+
+
+# remove the player's cursor from the game's event log (when the player leaves the game)
+def remove_subscriber(game_id, user_name):
+    event_log = event_logs.get(game_id)
+    if event_log is not None:
+        event_log.remove(user_name)
+
+
+# remove the cached snapshot and event log of the game (when the game is removed)
+def discard_game(game_id):
+    snapshots.pop(game_id, None)
+    event_logs.pop(game_id, None)
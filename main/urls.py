@@ -18,8 +18,19 @@ ACCEPTABLEURLs:
     /exit/<game_id>/<user>/                          -- exit the selected game for the selected user
     /game-page/<game_id>/<user>/                     -- display the game board view for the selected user in
                                                         the specified game
+    /game-page/<game_id>/<user>/state/               -- the game for the selected user in the specified game (the
+                                                        page loads it, the stream keeps it up to date)
     /game-page/<game_id>/<user>/turn_complete_post/  -- updates the game board on the server and sends the
                                                         updates to each player in the specified game
+    /game-page/<game_id>/<user>/turn_moves/          -- applies the moves of the selected user's turn (see
+                                                        moves.py) and sends the updates to each player
+    /game-page/<game_id>/<user>/draw_card/           -- draws the top card of the draw pile for the selected user
+                                                        in the specified game
+    /game-page/<game_id>/<user>/hints/               -- the legal plays for the selected user's hand in the
+                                                        specified game
+    /game-page/<game_id>/<user>/add_bot/             -- seats a bot player (computer opponent) in the specified
+                                                        game
+    /metrics/                                        -- the server's metrics in the Prometheus text format
 """
 from django.contrib import admin
 from django.urls import path
@@ -35,5 +46,11 @@ urlpatterns = [
     path('deal/<game_id>/<user_name>', views.deal, name="deal"),
     path('exit/<game_id>/<user_name>', views.exit, name="exit"),
     path('game-page/<game_id>/<user_name>/', views.gamepage, name="game-page"),
+    path('game-page/<game_id>/<user_name>/state/', views.state_view, name="game-state"),
     path('game-page/<game_id>/<user_name>/turn_complete_post/', views.turncompletepost, name="turn-complete-post"),
+    path('game-page/<game_id>/<user_name>/turn_moves/', views.turnmovespost, name="turn-moves"),
+    path('game-page/<game_id>/<user_name>/draw_card/', views.draw, name="draw-card"),
+    path('game-page/<game_id>/<user_name>/hints/', views.hints_view, name="hints"),
+    path('game-page/<game_id>/<user_name>/add_bot/', views.add_bot, name="add-bot"),
+    path('metrics/', views.metrics_view, name="metrics"),
 ]
\ No newline at end of file
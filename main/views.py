@@ -6,10 +6,25 @@ DESCRIPTION
     Controls the views displayed to the user, and controls game play objects displayed to players
 
 FUNCTIONS
-    stream         /stream/<game_id>/<user>/ - received from each player to establish connection with the player
+    not_players_turn               -- rejects a turn (or a draw) when it is not the player's turn (403), or no
+                                      hand is being played (409)
+    rejects_stale                  -- (decorator) rejects a change to a game (409) when another process saved
+                                      the game since it was read (see stores.StaleGame)
+    game_update_events             -- creates the game updates (SSE formatted, the event id is the game
+                                      version) sent to a player: the deltas the player is missing from
+                                      the game's event log, or a full update from the game's snapshot
+    async_game_update_events       -- creates the game updates for a stream waiting in the event loop
+    stream         /stream/<game_id>/<user>/?version=<version>&format=<format> (or Last-Event-ID: <version>) - received from each player to establish connection with the player
                                    -- used to setup and use the server sent events (SSE)
                                       protocol with the players in the game.  Game data is streamed to
-                                      players through a HTTP streamed response
+                                      players through a HTTP streamed response.  When served through
+                                      ASGI (playcards/asgi.py) the stream is an async generator so a
+                                      waiting player does not hold a worker thread.  A stream without
+                                      updates sends a keepalive comment so the stream of a disconnected
+                                      player is closed, and a stream superseded by the player's new
+                                      stream (a page refresh) exits at once.  The updates are sent in
+                                      the wire format asked for (JSON by default, see wire.py), and
+                                      compressed when enabled and accepted (see compression.py)
     homepage       '' (default) - view
                                    -- provides the starting point for the user.  This function creates
                                       the initial view to the user providing the option to create or
@@ -18,51 +33,156 @@ FUNCTIONS
                                    -- provides a view that dialogs with the user to create a new game.
     gamepage       /game-page/<game_id>/<user>/ - view
                                    -- generates the game board after a successful creation of a game, or
-                                      after successfully joining a game in progress
+                                      after successfully joining a game in progress.  The page is the
+                                      shell of the game board (cached by the browser for
+                                      PLAYCARDS_PAGE_CACHE_SECONDS) - the game is loaded from state_view
+                                      and kept up to date by the player's stream
+    state_view     /game-page/<game_id>/<user>/state/?format=<format> - receives ajax request from player for the game
+                                   -- returns the game for the player as the full update sent on the
+                                      player's stream ('update_game', in the wire format asked for) -
+                                      loaded when the page is opened and when the player's turn is
+                                      complete or started over, so the page is not rendered again
     join           /join/ - view
                                    -- provides a view that dialogs with the user to join a game in progress.
     deal           /deal/<game_id>/<user> - causes server side event to update each player's game board
                                    -- modifies the game board in response to a deal request by randomly
-                                      shuffling the deck of cards and dealing cards to each player
+                                      shuffling the deck of cards and dealing cards to each player.  A
+                                      deal posted by the page (ajax) is sent to every player's stream,
+                                      the dealer's included, and answered with the version dealt
+    parse_turn                     -- parses the player's hand, the discard pile and the game board posted
+                                      when the player's turn is complete (used by turncompletepost)
     turncompletepost  /game-page/<game_id>/<user>/turn_complete_post - receives ajax request from player to update game
                                    -- updates the game board for all players after a player's turn is
                                       complete.  During a player's turn the game contents for the active
                                       player is performed in java script.  Only after the turn is complete
                                       are all the player's boards updated.
+                                      The melds on the posted game board are checked
+                                      (see melds.py) and the turn is rejected (400) when a meld is invalid,
+                                      when the player neither drew nor picked up from the discard pile (or
+                                      did both), when the last card picked up is not played, or when the
+                                      cards posted are not the cards of the player's hand and the cards
+                                      picked up, played and discarded (see moves.check_turn).
+                                      When the turn ends the hand, the hand is scored (see scoring.py).
+                                      The turn is posted in JSON or in a compact wire format (see
+                                      wire.py), a turn that can not be decoded is rejected (400).
+    turnmovespost  /game-page/<game_id>/<user>/turn_moves/ - receives ajax request from player with the moves of the turn
+                                   -- applies the turn as the ordered list of the moves made (draws, pick
+                                      ups, new melds, additions and the discard, see moves.py) instead of
+                                      the whole hand, discard pile and game board, and updates the game
+                                      board for all players.  A move that can not be made, or an invalid
+                                      meld, rejects the whole turn (400).  Returns the cards drawn
+    draw           /game-page/<game_id>/<user>/draw_card - receives ajax request from player to draw a card
+                                   -- removes the top card from the draw pile, adds it to the player's
+                                      hand, and returns only the drawn card (the deck is never sent to
+                                      the players, only the number of cards remaining).  The other
+                                      players are sent the new deck size and card count
+    add_bot        /game-page/<game_id>/<user>/add_bot - receives ajax request from player to add a bot player
+                                   -- seats a bot (computer opponent, see bots.py) in the game.  The bots'
+                                      turns are played by the server whenever a bot is the active player
+    hints_view     /game-page/<game_id>/<user>/hints - receives ajax request from player for the plays available
+                                   -- returns the legal new melds and additions to the game board melds
+                                      (see hints.py) for the player's hand and game board being viewed
+                                      (the hand and game board on the server when not sent)
+    metrics_view   /metrics/ - the server's metrics in the Prometheus text format (see metrics.py)
+                                   -- request latency of create, join, deal and turn complete, the streams
+                                      woken by each update, the bytes of each SSE event, and the active
+                                      games, subscribers and queued updates (404 when disabled)
     show_cards     /show-cards/<game_id>/ - view displaying selected contents of game play (used for testing)
                                    -- displays the contents of the selected game
     exit           /exit/<game_id>/<user>
                                    -- exits a player from the selected game
 
 DATA
-    games                          -- contains any active game data (settings, players, cards, ...)
-    update_available               -- a threading.Event() is created for each player, and the set(), clear(),
-                                      and wait() methods are used to control game board updates to each
-                                      player.  A set() is used to indicate an update available for a player.
-                                      A clear() is used to indicate the update for the player is complete.
-                                      And the wait() is used asynchronously to wait for updates.
-    update_type_list               -- contains a list of updates to the game board.  This list is initially
-                                      created when a game is created.  And items are appended to the list
-                                      when user's are added to the game, when cards are dealt, and when a
-                                      player completes their turn.  When an item from the update list has
-                                      been updated to all players it is removed from the list.
+    games                          -- contains any active game data (settings, players, cards, ...).  Each
+                                      change to a game (join, deal, turn, draw, exit) is applied and
+                                      published while holding the game's lock (games.game_lock), so the
+                                      players' streams never read a half-applied change
+    bus                            -- the notification bus (see notifier.py) holding an UpdateNotifier() for
+                                      each player connected to this process.  The views publish each game
+                                      update on the bus, which set()s the notifier of the game's players in
+                                      every worker process to indicate an update is available.  A clear() is
+                                      used to indicate the update for the player is complete.  And the wait()
+                                      is used asynchronously to wait for updates.
+    bot_runner                     -- plays the turns of the bot players (see bots.py) off the request threads,
+                                      scheduled after each change that can make a bot the active player
+    game_reaper                    -- evicts the idle and abandoned games from the process, closes their
+                                      streams and caps the games resident in the process (see reaper.py),
+                                      started when the app is ready (see apps.py)
+    KEEPALIVE_EVENT                -- the SSE comment sent to a stream without updates for
+                                      PLAYCARDS_STREAM_KEEPALIVE_SECONDS
+    updates.event_logs             -- contains the log of updates published for each game (see updates.py).
+                                      An update is appended to the game's log when users are added to
+                                      the game, when cards are dealt, and when a player completes their
+                                      turn.  Each player's stream keeps its own cursor in the log, and an
+                                      update is removed from the log once every cursor has passed it.
+    logger                         -- the logger of the views - the per-turn details are logged at debug
+                                      level for a sample of the turns (see metrics.sampled)
 
 """
 
 from django.shortcuts import render, redirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import never_cache
 
-from . import models
+from . import bots, compression, hints, melds, metrics, models, moves, reaper, scoring, stores, updates, wire
 from .forms import GameSettingsForm, GameJoinForm
+from . import notifier as notification
 
+import asyncio
+import base64
+import functools
 import json
-import threading
-import itertools
-
-BLITZ_DEAL_VALUE_TEN = ['J', 'Q', 'K', 'A', '?']
-
-update_available = {}    # used to perform updates for each player in each game as an asynchronous threading.Event()
-update_type_list = {}    # used to maintain a list of updates being performed
+import logging
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_EVENT = ': keepalive\n\n'      # SSE comment sent to a stream without updates (ignored by the browser)
+stream_keepalive = getattr(settings, 'PLAYCARDS_STREAM_KEEPALIVE_SECONDS', 30) or None
+page_wire_format = wire.negotiate(getattr(settings, 'PLAYCARDS_WIRE_FORMAT', 'json'))
+page_cache_seconds = getattr(settings, 'PLAYCARDS_PAGE_CACHE_SECONDS', 3600)
+
+bus = notification.create_bus()    # wakes the streams of the players in each game when an update is published
+
+
+# create the update events (SSE formatted data, the version of each update is the event id) to send
+#   to a player that last received last_version of the game in the wire format (see wire.py), returns
+#   the version sent to the player and the events (None when there is nothing to send or an exception
+#   occurs)
+def game_update_events(game_id, user_name, last_version, wire_format='json'):
+    try:
+        # the updates are the deltas from the game's event log, or the game's shared data when the
+        #   player can not be brought up to date with deltas (serialized once per update for all
+        #   players - see updates.py) with the player's cards spliced in
+        version, pending = updates.pending_updates(games, game_id, user_name, last_version, wire_format)
+
+    # log the exception, the stream waits for the next update
+    except Exception:
+        logger.exception("stream update failed for game_id: %s user: %s version: %s", game_id, user_name,
+                         last_version)
+        return last_version, None
+
+    if not pending:
+        return version, None
+    events = ['id: ' + str(update_version) + '\ndata: ' + data_json_string + '\n\n'
+              for update_version, data_json_string in pending]
+    if metrics.enabled:
+        metrics.SSE_EVENTS.inc(len(events))
+        for event in events:
+            metrics.SSE_EVENT_BYTES.observe(len(event.encode()))
+    return version, ''.join(events)
+
+
+# create the update events for a stream waiting in the event loop - when the games are not kept in
+#   memory reading a game blocks on the store, so the events are created in a worker thread
+async def async_game_update_events(game_id, user_name, last_version, wire_format='json'):
+    if games.is_in_memory():
+        return game_update_events(game_id, user_name, last_version, wire_format)
+    return await sync_to_async(game_update_events, thread_sensitive=False)(game_id, user_name, last_version,
+                                                                           wire_format)
 
 
 # create connection with players in the game through Server Sent Events (SSE)
@@ -71,96 +191,171 @@ def stream(request, game_id, user_name):
     # update and store a stream_id for the player creating the connection
     #   (when a refresh occurs on user's screen a new '/stream/' request occurs -
     #    this allows only the active stream_id to be processed)
-    if game_id in update_available.keys():
-        if user_name in update_available[game_id].keys():
-            if hasattr(update_available[game_id][user_name], 'stream_id'):
-                update_available[game_id][user_name].stream_id += 1
-            else:
-                update_available[game_id][user_name].stream_id = 1
+    notifier = bus.subscribe(game_id, user_name)
+    notifier.stream_id += 1
+    if notifier.streams:
+        notifier.set()      # wake the superseded stream so it exits now rather than at the next update
+
+    # the version of the game the player has - the id of the last event received when the browser
+    #   reconnects (Last-Event-ID), otherwise the version of the game when the page was loaded
+    try:
+        player_version = int(request.META.get('HTTP_LAST_EVENT_ID') or request.GET['version'])
+    except (KeyError, ValueError):
+        player_version = None
+
+    # the wire format asked for by the player (JSON unless a compact format is asked for and available)
+    wire_format = wire.negotiate(request.GET.get('format', 'json'))
 
     # create the HttpStreamingResponse connection with the player to perform game updates
+    #   (WSGI - a worker thread is blocked waiting for updates for the life of the connection)
     def event_stream():
 
-        stream_id = int(update_available[game_id][user_name].stream_id)
-        while True:
-            # wait until an update is requested - a separate stream will be attached to each player
-            update_available[game_id][user_name].wait()
-
-            # check to see if stream_id is the correct one, otherwise break out of the loop -
-            #   this will ensure old event streams are cleaned up; if a player refreshes their
-            #   screen they invoke a new event_stream, so this will exit the stream for the
-            #   stream that no longer is active
-            if stream_id != update_available[game_id][user_name].stream_id:
-                update_available[game_id][user_name].clear()
-                print("(event_stream) This may cause ConnectionAbortedError - maybe fixed in Python 3.8+")
-                break  # exit the for loop - this is the old event stream
-
-            # create the updated game data object to send to the player including:
-            #   game update type, player's cards, game deck, list of players, dealer, active player,
-            #   discard pile, game board contents, count of each player's cards, wild card
-            card_counts = []
-            players = games.get_players(game_id)
-            deck_cards = []
-            for card in games.get_deck(game_id):
-                new_card = {"suit": card.suit, "faceval": card.faceval}
-                deck_cards.append(new_card)
-            discards = []
-            for card in games.get_discards(game_id):
-                new_card = {"suit": card.suit, "faceval": card.faceval}
-                discards.append(new_card)
-            player_cards = []
-            for card in games.get_player_cards(game_id, user_name):
-                new_card = {'suit': card.suit, 'faceval': card.faceval}
-                player_cards.append(new_card)
-            game_board_items = []
-            for item in games.get_game_board_items(game_id):
-                meld_cards = []
-                for meld_card in item['meld_cards']:
-                    new_meld_card = {"player":meld_card['player'], "suit":meld_card['suit'], "faceval":meld_card['faceval']}
-                    meld_cards.append(new_meld_card)
-                game_board_items.append({"type": item['type'], "meld_cards":meld_cards})
-            for pndx in range(len(players)):
-                card_counts.append(len(games.get_player_cards(game_id, players[pndx])))
-            try:
-                if update_type_list[game_id][0]['type'] == 'update_game':
-                    update_type_list[game_id][0]['players_updated'] += 1
-                    data_obj = {
-                        'type': 'update_game',
-                        'player_cards': player_cards,
-                        'deck_cards' : deck_cards,
-                        'players': players,
-                        'dealer': games.get_dealer(game_id),
-                        'active_player': games.get_active_player(game_id),
-                        'discards' : discards,
-                        'gameboard' : game_board_items,
-                        'card_counts': card_counts,
-                        'wild_card': games.get_wild_card(game_id),
-                    }
-                else:
-                    data_obj = {'type': 'unknown', }
-                    print("(event_stream) unknown DATA OBJECT")
-
-                # remove the update from list of updates when all players have received the update
-                if update_type_list[game_id][0]['players_updated'] >= update_type_list[game_id][0]['player_count']:
-                    update_type_list[game_id].pop(0)
-
-                # convert the data to JSON format and yield (send) the data to the player
-                data_json_string = json.dumps(data_obj)
-                yield 'data: '+data_json_string+'\n\n'
-
-            # print message to console if exception occurs (used during testing)
-            except:
-                print("(event_stream)****************Exception occurred in Stream event")
-                print("(event_stream)for id:" + str(stream_id) + " game_id:" + game_id + " and user:" + user_name)
-                print("(event_stream)update_type_list[game_id] = " + str(update_type_list[game_id]))
-
-            # clear update_available for the player to wait for future updates
-            update_available[game_id][user_name].clear()
-
-    return StreamingHttpResponse(event_stream(), content_type='text/event-stream')
-
-
-games = models.Games()  # games contains the game model: settings and game contents for each game being played
+        stream_id = notifier.stream_id
+        notifier.stream_opened()
+        try:
+            # bring the player up to date when the player's version is out of date
+            last_version = player_version
+            if last_version is not None:
+                last_version, events = game_update_events(game_id, user_name, last_version, wire_format)
+                if events:
+                    yield events
+            while True:
+                # wait until an update is requested - a separate stream will be attached to each player
+                updated = notifier.wait_blocking(stream_keepalive)
+
+                # check to see if stream_id is the correct one, otherwise break out of the loop -
+                #   this will ensure old event streams are cleaned up; if a player refreshes their
+                #   screen they invoke a new event_stream, so this will exit the stream for the
+                #   stream that no longer is active
+                if stream_id != notifier.stream_id:
+                    break  # exit the for loop - this is the old event stream
+
+                # no update before the keepalive time - writing a comment closes the stream when the
+                #   player disconnected
+                if not updated:
+                    yield KEEPALIVE_EVENT
+                    continue
+
+                # clear the notifier for the player to wait for future updates (updates published
+                #   after this point wake the stream again)
+                notifier.clear()
+
+                last_version, events = game_update_events(game_id, user_name, last_version, wire_format)
+                if events:
+                    yield events
+        finally:
+            notifier.stream_closed()
+
+    # create the asynchronous HttpStreamingResponse connection with the player to perform game updates
+    #   (ASGI - waiting for updates is done in the server's event loop, no thread is held by the player)
+    async def async_event_stream():
+
+        stream_id = notifier.stream_id
+        notifier.stream_opened()
+        try:
+            # bring the player up to date when the player's version is out of date
+            last_version = player_version
+            if last_version is not None:
+                last_version, events = await async_game_update_events(game_id, user_name, last_version, wire_format)
+                if events:
+                    yield events
+            while True:
+                # wait until an update is requested without blocking the event loop
+                try:
+                    await asyncio.wait_for(notifier.wait(), stream_keepalive)
+                    updated = True
+                except asyncio.TimeoutError:
+                    updated = False
+
+                # exit the stream when it is no longer the player's active stream (see event_stream)
+                if stream_id != notifier.stream_id:
+                    break
+
+                # keep the connection alive (see event_stream)
+                if not updated:
+                    yield KEEPALIVE_EVENT
+                    continue
+                notifier.clear()
+
+                last_version, events = await async_game_update_events(game_id, user_name, last_version, wire_format)
+                if events:
+                    yield events
+        finally:
+            notifier.stream_closed()
+
+    # compress the stream (each event is flushed) when enabled and accepted by the browser (see compression.py)
+    encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+    if isinstance(request, ASGIRequest):
+        events = async_event_stream()
+        if encoding:
+            events = compression.async_compress_stream(events, compression.StreamCompressor(encoding))
+    else:
+        events = event_stream()
+        if encoding:
+            events = compression.compress_stream(events, compression.StreamCompressor(encoding))
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if compression.level:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+games = models.Games(stores.create_store())  # games contains the game model: settings and game contents
+                                             #   for each game being played (kept in the store selected in
+                                             #   settings.py, see stores.py)
+bot_runner = bots.BotRunner(games, bus)      # plays the bots' turns (see bots.py)
+game_reaper = reaper.Reaper(games, bus)      # evicts the idle games and closes their streams (see reaper.py),
+                                             #   started when the app is ready (see apps.py)
+
+
+# the gauges of the metrics endpoint, read when the metrics are rendered (see metrics.py)
+metrics.Gauge('playcards_active_games', 'Games in the store.', lambda: len(games.games))
+metrics.Gauge('playcards_subscribers', "Players' streams connected to this process.",
+              lambda: sum([len(players) for players in list(bus.notifiers.values())]))
+metrics.Gauge('playcards_queued_updates', "Updates held in the games' event logs.",
+              lambda: sum([len(event_log.entries) for event_log in list(updates.event_logs.values())]))
+metrics.Gauge('playcards_queued_updates_max', "Most updates held in a single game's event log.",
+              lambda: max([len(event_log.entries) for event_log in list(updates.event_logs.values())] or [0]))
+
+
+# (decorator) reject a change to a game (409) when another process saved the game since the view read it (see
+#   stores.StaleGame) - the updates published by the change are dropped, the players' streams are sent the
+#   game saved
+def rejects_stale(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except stores.StaleGame as error:
+            updates.discard_game(error.game_id)
+            return HttpResponse(
+                json.dumps({"error": "The game was changed by another player, try again"}),
+                content_type="application/json", status=409
+            )
+    return wrapper
+
+
+# check that it is the player's turn in the game - returns the response rejecting the request (404 when the player
+#   is not in the game, 409 when no hand is being played, 403 when another player is active), None when it is the
+#   player's turn
+def not_players_turn(game, user_name):
+    if game is None or user_name not in game.get_players():
+        return HttpResponseNotFound(
+            json.dumps({"error": "Player not found!"}),
+            content_type="application/json"
+        )
+    if not game.is_playing():
+        return HttpResponse(
+            json.dumps({"error": "No hand is being played"}),
+            content_type="application/json", status=409
+        )
+    if game.get_active_player() != user_name:
+        return HttpResponse(
+            json.dumps({"error": "It is " + game.get_active_player() + "'s turn"}),
+            content_type="application/json", status=403
+        )
+    return None
 
 
 # '/' homepage is the default view when beginning
@@ -170,6 +365,8 @@ def homepage(request):
 
 
 # '/create/' create view performs a dialog with the user to create a game
+@metrics.timed
+@rejects_stale
 def create(request):
 
     # POST - verify the user request is valid.  If valid redirect to the game-page view
@@ -184,12 +381,14 @@ def create(request):
                 return render(request,'homepage.html',context={'status_msg':status_msg})
             number_of_jokers = form.cleaned_data['number_of_jokers']
             number_of_decks = form.cleaned_data['number_of_decks']
-            games.add_game(game_id, number_of_jokers, number_of_decks)
-            games.add_player(game_id, user_name)
-            games.set_active_player(game_id, user_name)
-            update_available[game_id] = {}
-            update_type_list[game_id] = []
-            update_available[game_id][user_name] = threading.Event()
+            target_score = form.cleaned_data.get('target_score') or models.TARGET_SCORE
+            with games.game_lock(game_id):
+                games.add_game(game_id, number_of_jokers, number_of_decks)
+                games.set_target_score(game_id, target_score)
+                games.add_player(game_id, user_name)
+                games.set_active_player(game_id, user_name)
+                updates.publish_update(games, game_id)
+                games.save_game(game_id)
             return redirect('game-page', game_id, user_name)
         else:
             return render(request, 'creategamesettings.html', {'form':form})
@@ -202,36 +401,42 @@ def create(request):
 
 # '/game-page/<game_id>/<user>/' game view displaying players, game board, and game play interface
 def gamepage(request, game_id, user_name):
-    # get the game information and display the following to the game board:
-    #   game id, user name, dealer, player's cards, discard pile, wild card, the remaining cards in the deck,
-    #   the list of players and the number of cards each player has, active player, game board contents
-    cards = []
-    for card in games.get_deck(game_id):
-        new_card = {"suit": card.suit, "faceval": card.faceval}
-        cards.append(new_card)
-    deck_json = json.dumps(cards)
-    wild_card = games.get_wild_card(game_id)
-    user_cards = games.get_player_cards(game_id, user_name)
-    discards = games.get_discards(game_id)
-    players = games.get_players(game_id)
-    players_and_counts = []
-    for player in players:
-        player_and_count = {
-            'name': player,
-            'card_count': len(games.get_player_cards(game_id, player)),
-        }
-        players_and_counts.append(player_and_count)
-    active_player = games.get_active_player(game_id)
-    dealer = games.get_dealer(game_id)
-    game_board_items = games.get_game_board_items(game_id)
-    return render(request=request, template_name="gamepage.html",
-                  context={'user_name': user_name, 'game_id': game_id, 'dealer': dealer, 'user_cards': user_cards,
-                           'discards': discards, 'wild_card': wild_card, 'card_deck': deck_json,
-                           'players_and_counts': players_and_counts, 'active_player': active_player,
-                           'game_board_items': game_board_items})
+    # the page is the shell of the game board - the game id, user name and wire format.  The game (dealer,
+    #   player's cards, discard pile, wild card, the number of cards remaining in the deck, the players and
+    #   the number of cards each player has, active player, game board contents, scores) is loaded by the
+    #   page from the state view and kept up to date by the player's stream, so the page is the same for the
+    #   life of the game and is cached by the browser
+    game = games.get_game(game_id)
+    if game is None or user_name not in game.get_players():
+        return HttpResponseNotFound("Player not found!")
+    response = render(request=request, template_name="gamepage.html",
+                      context={'user_name': user_name, 'game_id': game_id, 'wire_format': page_wire_format})
+    if page_cache_seconds:
+        patch_cache_control(response, private=True, max_age=page_cache_seconds)
+    return response
+
+
+# '/game-page/<game_id>/<user>/state/?format=<format>' the game for the player - the full update sent on the
+#   player's stream ('update_game', see updates.full_update) in the wire format asked for (see wire.py), never
+#   cached.  The page shows it and its stream sends the updates after its version
+@never_cache
+def state_view(request, game_id, user_name):
+    wire_format = wire.negotiate(request.GET.get('format', 'json'))
+    update = updates.full_update(games, game_id, user_name, wire_format)
+    if update is None:
+        return HttpResponseNotFound(
+            json.dumps({"error": "Player not found!"}),
+            content_type="application/json"
+        )
+    version, data = update
+    if wire_format == 'msgpack':
+        return HttpResponse(base64.b64decode(data), content_type=wire.MSGPACK_TYPES[0])
+    return HttpResponse(data, content_type="application/json")
 
 
 # '/join/' join view performs a dialog with the user to join an existing game
+@metrics.timed
+@rejects_stale
 def join(request):
 
     # POST - verify the user request is valid.  If valid redirect to the game-page view
@@ -241,13 +446,11 @@ def join(request):
         if form.is_valid():
             user_name = form.cleaned_data['user_name']
             game_id = form.cleaned_data['game_id']
-            games.add_player(game_id, user_name)
-            player_count = len(games.get_players(game_id))
-            update_type_list[game_id].append({'type':'update_game', 'player_count': player_count, 'players_updated': 1})
-            update_available[game_id][user_name] = threading.Event()
-            for player in games.get_players(game_id):
-                if player != user_name:
-                    update_available[game_id][player].set()
+            with games.game_lock(game_id):
+                games.add_player(game_id, user_name)
+                updates.publish_update(games, game_id)
+                games.save_game(game_id)
+            metrics.UPDATE_FANOUT.observe(bus.publish(game_id, exclude=user_name))
 
             return redirect('game-page', game_id, user_name)
         else:
@@ -262,125 +465,122 @@ def join(request):
 # '/deal/<game_id>/<user>/' the deal action randomizes the cards in the card deck and
 #   updates the view for player selecting to deal, the other player's views are then
 #   updated asynchronously through server sent events
+@metrics.timed
+@rejects_stale
 def deal(request, game_id, user_name):
-    # Set the dealer name
-    games.set_dealer(game_id, user_name)
+    # return all cards to the deck, shuffle the cards and deal cards Blitz style (the first card dealt
+    #   determines how many cards the player is dealt, the dealer's first card is the wild card) and
+    #   set the active player to the player after the dealer.  The cards are dealt once the hand is over
+    #   (scored, or the draw pile is empty) by the player whose deal it is (see GameSettings.next_dealer)
+    with games.game_lock(game_id):
+        game = games.get_game(game_id)
+        if game is None or user_name not in game.get_players():
+            return HttpResponseNotFound(
+                json.dumps({"error": "Player not found!"}),
+                content_type="application/json"
+            )
+        if game.is_playing() and game.deck:
+            return HttpResponse(
+                json.dumps({"error": "The hand is being played"}),
+                content_type="application/json", status=409
+            )
+        if game.next_dealer() != user_name:
+            return HttpResponse(
+                json.dumps({"error": "It is " + game.next_dealer() + "'s deal"}),
+                content_type="application/json", status=403
+            )
+        games.deal(game_id, user_name)
+
+        # update all users
+        updates.publish_update(games, game_id)
+        games.save_game(game_id)
+        version = games.get_version(game_id)
+
+    # POST - the deal requested by the page (ajax): the dealer's page is updated by the dealer's stream too
+    if request.method == 'POST':
+        metrics.UPDATE_FANOUT.observe(bus.publish(game_id))
+        bot_runner.schedule(game_id)
+        return HttpResponse(
+            json.dumps({"version": version}),
+            content_type="application/json"
+        )
 
-    # Set the active player to player after dealer
-    players = games.get_players(game_id)
-    pndx = 0
-    for player in games.get_players(game_id):
-        pndx += 1
-        if player == user_name:
-            break
-    if pndx >= len(players):
-        pndx = 0
-    games.set_active_player(game_id, players[pndx])
-
-    # return all players cards to the deck
-    for player in games.get_players(game_id):
-        for card in games.get_player_cards(game_id, player):
-            games.append_card(game_id, card.suit, card.faceval)
-        games.del_player_cards(game_id, player)
-
-    # shuffle the cards
-    games.shuffle(game_id)
-
-    # clear the game board
-    games.del_game_board_items(game_id)
-
-    # deal cards Blitz style (the first card dealt determines how many cards the player is dealt
-    games.set_wild_card(game_id, "")
-    for player in games.get_players(game_id):
-        next_card = games.pop_top_card(game_id)
-        if next_card.faceval in BLITZ_DEAL_VALUE_TEN:  # 10 cards will be dealt for non-numbered cards
-            cards_to_deal = 10 - 1
-        else:
-            cards_to_deal = int(next_card.faceval) - 1  # the numerical value determines the # of cards to deal
-
-        # set the wild card to the dealer's first card (Blitz rules)
-        if player == user_name:
-            if games.get_wild_card(game_id) == "":
-                games.set_wild_card(game_id, next_card.faceval)
-
-        # add cards to the player's hand based on the first card they were dealt
-        games.add_player_cards(game_id, player, next_card)
-        for i in itertools.repeat(None, cards_to_deal):
-            next_card = games.pop_top_card(game_id)
-            games.add_player_cards(game_id, player, next_card)
-
-    # clear discard pile and place next card on discard pile
-    games.del_discards(game_id)
-    next_card = games.pop_top_card(game_id)
-    games.add_discards(game_id, next_card)
-
-    # update all users
-    player_count = len(games.get_players(game_id))
-    update_type_list[game_id].append({'type': 'update_game', 'player_count': player_count, 'players_updated': 1})
-    for player in games.get_players(game_id):
-        if player != user_name:
-            update_available[game_id][player].set()
+    # GET - the dealer's page is rendered again
+    metrics.UPDATE_FANOUT.observe(bus.publish(game_id, exclude=user_name))
+    bot_runner.schedule(game_id)
 
     return redirect('game-page', game_id, user_name)
 
 
+# parse the player's hand, the discard pile (lists of Card objects) and the game board items posted when
+#   the player's turn is complete (see turncompletepost)
+def parse_turn(post):
+    updated_players_hand = [models.get_card(card['suit'], card['faceval'])
+                            for card in json.loads(post.get('updated_players_hand'))]
+    discards = [models.get_card(card['suit'], card['faceval'])
+                for card in json.loads(post.get('discards'))]
+    game_board_items = []
+    for item in json.loads(post.get('game_board')):
+        item_type = item['type']
+        meld_cards = []
+        for meld_card in item['meld_cards']:
+            meld_cards.append({"player":meld_card['player'],
+                               "suit":meld_card['suit'],
+                               "faceval":meld_card['faceval']})
+        game_board_items.append({"type": item_type, "meld_cards": meld_cards})
+    return updated_players_hand, discards, game_board_items
+
+
 # '/game-page/<game_id>/<user>/turn_complete_post' the player has completed their turn
 #   and sent back updates to the game board for all players
+@metrics.timed
+@rejects_stale
 def turncompletepost(request, game_id, user_name):
 
     # POST - only expecting this from the player when the turn is complete to update saved game info
     if request.method == 'POST':
 
-        # update the game deck for the specified game
-        deck_json = json.loads(request.POST.get('updated_deck'))
-        games.clear_deck(game_id)
-        for card in deck_json:
-            games.append_card(game_id, card['suit'], card['faceval'])
-
-        # update the players hand in the for the specified game
-        updated_players_hand = json.loads(request.POST.get('updated_players_hand'))
-        games.del_player_cards(game_id, user_name)
-        for card in updated_players_hand:
-            games.add_player_cards(game_id, user_name, models.Card(card['suit'], card['faceval']))
-
-        # update the saved discard pile for the specified game
-        discards = json.loads(request.POST.get('discards'))
-        games.del_discards(game_id)
-        for card in discards:
-            games.add_discards(game_id, models.Card(card['suit'], card['faceval']))
-
-        # update the saved game board contents for the specified game
-        game_board = json.loads(request.POST.get('game_board'))
-        games.del_game_board_items(game_id)
-        for item in game_board:
-            item_type = item['type']
-            meld_cards = []
-            for meld_card in item['meld_cards']:
-                print("item-"+item_type+", meld_card="+str(meld_card))
-                meld_cards.append({"player":meld_card['player'],
-                                   "suit":meld_card['suit'],
-                                   "faceval":meld_card['faceval']})
-            games.add_game_board_items(game_id, item_type, meld_cards)
-
-        # Update the active player to the next player for the specified game
-        active_player_found = False
-        new_active_player = games.get_players(game_id)[0] # set new active player to first in list
-        for player in games.get_players(game_id):
-            if active_player_found:
-                new_active_player = player
-                break
-            if player == user_name:
-                active_player_found = True
-        games.set_active_player(game_id, new_active_player)
-
-        # Update the player information on all user screens for the specified game
-        player_count = len(games.get_players(game_id))
-        update_type_list[game_id].append(
-            {'type': 'update_game', 'player_count': player_count, 'players_updated': 1})
-        for player in games.get_players(game_id):
-            if player != user_name:
-                print("TurnComplete-update going to "+player)
-                update_available[game_id][player].set()
+        # the players hand, the discard pile and the game board contents after the player's turn - posted
+        #   in JSON or in a compact wire format (see wire.py)
+        try:
+            wire_format = wire.turn_format(request)
+            if wire_format == 'json':
+                updated_players_hand, discards, game_board_items = parse_turn(request.POST)
+            else:
+                updated_players_hand, discards, game_board_items = wire.decode_turn(request, wire_format)
+        except (ValueError, KeyError, TypeError, IndexError):
+            return HttpResponse(
+                json.dumps({"error": "The turn posted could not be read"}),
+                content_type="application/json", status=400
+            )
+
+        # apply the turn to the specified game as a single change - check the melds played on the game board,
+        #   update the player's hand, the discard pile and the game board, update the active player to the
+        #   next player, score the hand when the turn ended it, and update the player information on all
+        #   user screens
+        with games.game_lock(game_id):
+            # the turn follows the rules of a turn of moves and the cards are conserved (see moves.check_turn) -
+            #   the player discarded when a card was added to the discard pile
+            game = games.get_game(game_id)
+            rejected = not_players_turn(game, user_name)
+            if rejected is not None:
+                return rejected
+            try:
+                melds.check_board(game.game_board_items, game_board_items, game.wild_card, user_name)
+                discarded = moves.check_turn(game, user_name, updated_players_hand, discards, game_board_items)
+            except (melds.InvalidMeld, moves.InvalidMove) as error:
+                return HttpResponse(
+                    json.dumps({"error": str(error)}),
+                    content_type="application/json", status=400
+                )
+            games.apply_turn(game_id, user_name, updated_players_hand, discards, game_board_items)
+            scoring.complete_turn(games.get_game(game_id), user_name, discarded)
+            updates.publish_update(games, game_id)
+            games.save_game(game_id)
+        if metrics.sampled(logger, logging.DEBUG):
+            logger.debug("turn complete in %s by %s, game board: %s", game_id, user_name, game_board_items)
+        metrics.UPDATE_FANOUT.observe(bus.publish(game_id, exclude=user_name))
+        bot_runner.schedule(game_id)
 
         # the following message is sent in response to ajax call for a success; helpful during testing
         return HttpResponse(
@@ -396,6 +596,176 @@ def turncompletepost(request, game_id, user_name):
         )
 
 
+# '/game-page/<game_id>/<user>/turn_moves' apply the player's turn posted as the ordered list of the moves made
+#   (see moves.py) - the moves are the JSON request body (Content-Type application/json) or the form field moves
+@metrics.timed
+@rejects_stale
+def turnmovespost(request, game_id, user_name):
+
+    # POST - only expecting this from the player when the turn is complete
+    if request.method == 'POST':
+        try:
+            if request.content_type == 'application/json':
+                turn_moves = moves.parse_moves(request.body)
+            else:
+                turn_moves = moves.parse_moves(request.POST['moves'])
+        except (moves.InvalidMove, KeyError) as error:
+            return HttpResponse(
+                json.dumps({"error": str(error) if isinstance(error, moves.InvalidMove)
+                            else "The turn posted could not be read"}),
+                content_type="application/json", status=400
+            )
+
+        # check and apply the moves to the game as a single change, score the hand when the turn ended it,
+        #   and update the player information on all user screens
+        with games.game_lock(game_id):
+            game = games.get_game(game_id)
+            rejected = not_players_turn(game, user_name)
+            if rejected is not None:
+                return rejected
+            try:
+                discarded, drawn = moves.apply_moves(game, user_name, turn_moves)
+            except (moves.InvalidMove, melds.InvalidMeld) as error:
+                return HttpResponse(
+                    json.dumps({"error": str(error)}),
+                    content_type="application/json", status=400
+                )
+            scoring.complete_turn(game, user_name, discarded)
+            updates.publish_update(games, game_id)
+            games.save_game(game_id)
+            deck_size = len(game.deck)
+        if metrics.sampled(logger, logging.DEBUG):
+            logger.debug("turn moves in %s by %s: %s", game_id, user_name, turn_moves)
+        metrics.UPDATE_FANOUT.observe(bus.publish(game_id, exclude=user_name))
+        bot_runner.schedule(game_id)
+
+        # the cards drawn by the moves (the deck is never sent to the players)
+        return HttpResponse(
+            json.dumps({"drawn": wire.card_list(drawn), "deck_size": deck_size}),
+            content_type="application/json"
+        )
+
+    # this shouldn't happen; helpful during testing
+    else:
+        return HttpResponse(
+            json.dumps({"nothing to see": "this isn't happening"}),
+            content_type="application/json"
+        )
+
+
+# '/game-page/<game_id>/<user>/add_bot' seat a bot player (computer opponent) in the game - the bot plays its
+#   turns on the server (see bots.py)
+@rejects_stale
+def add_bot(request, game_id, user_name):
+
+    # POST - only expecting this from a player in the game
+    if request.method == 'POST':
+        with games.game_lock(game_id):
+            game = games.get_game(game_id)
+            if game is None or user_name not in game.get_players():
+                return HttpResponseNotFound(
+                    json.dumps({"error": "Player not found!"}),
+                    content_type="application/json"
+                )
+            bot = bots.bot_name(game)
+            games.add_bot(game_id, bot)
+            updates.publish_update(games, game_id)
+            games.save_game(game_id)
+        metrics.UPDATE_FANOUT.observe(bus.publish(game_id))
+        bot_runner.schedule(game_id)
+        return HttpResponse(
+            json.dumps({"bot": bot}),
+            content_type="application/json"
+        )
+
+    # this shouldn't happen; helpful during testing
+    else:
+        return HttpResponse(
+            json.dumps({"nothing to see": "this isn't happening"}),
+            content_type="application/json"
+        )
+
+
+# '/game-page/<game_id>/<user>/hints' the legal plays for the player's hand and game board being viewed (sent
+#   during the player's turn), or for the player's hand and game board on the server
+def hints_view(request, game_id, user_name):
+    with games.game_lock(game_id):
+        hand = games.get_player_cards(game_id, user_name)
+        if hand is None:
+            return HttpResponseNotFound(
+                json.dumps({"error": "Player not found!"}),
+                content_type="application/json"
+            )
+        hand = list(hand)
+        game_board_items = list(games.get_game_board_items(game_id))
+        wild_card = games.get_wild_card(game_id)
+    try:
+        if request.POST.get('hand'):
+            hand = [models.CARDS[card_id] for card_id in melds.card_ids(json.loads(request.POST.get('hand')))]
+        if request.POST.get('game_board'):
+            game_board_items = json.loads(request.POST.get('game_board'))
+        plays = hints.find_plays(hand, wild_card, game_board_items)
+    except (ValueError, KeyError, TypeError):
+        return HttpResponse(
+            json.dumps({"error": "Invalid hand or game board!"}),
+            content_type="application/json", status=400
+        )
+    return HttpResponse(
+        json.dumps({"plays": hints.play_dicts(plays)}),
+        content_type="application/json"
+    )
+
+
+# '/game-page/<game_id>/<user>/draw_card' the player draws the top card from the draw pile - the card
+#   is added to the player's hand on the server and only the drawn card is returned to the player, the
+#   other players are updated
+@rejects_stale
+def draw(request, game_id, user_name):
+
+    # POST - only expecting this from the player when drawing from the draw pile
+    if request.method == 'POST':
+        with games.game_lock(game_id):
+            game = games.get_game(game_id)
+            rejected = not_players_turn(game, user_name)
+            if rejected is not None:
+                return rejected
+            if game.drawn:
+                return HttpResponse(
+                    json.dumps({"error": "You already drew this turn!"}),
+                    content_type="application/json", status=409
+                )
+            if not game.deck:
+                return HttpResponse(
+                    json.dumps({"error": "Draw pile is empty!"}),
+                    content_type="application/json", status=400
+                )
+            card = games.pop_top_card(game_id)
+            games.add_player_cards(game_id, user_name, card)
+            game.drawn = True
+            updates.publish_update(games, game_id)
+            games.save_game(game_id)
+            deck_size = len(game.deck)
+        metrics.UPDATE_FANOUT.observe(bus.publish(game_id, exclude=user_name))
+        return HttpResponse(
+            json.dumps({"card": {"suit": card.suit, "faceval": card.faceval}, "deck_size": deck_size}),
+            content_type="application/json"
+        )
+
+    # this shouldn't happen; helpful during testing
+    else:
+        return HttpResponse(
+            json.dumps({"nothing to see": "this isn't happening"}),
+            content_type="application/json"
+        )
+
+
+# '/metrics/' the server's metrics in the Prometheus text exposition format (see metrics.py)
+def metrics_view(request):
+    if not metrics.enabled:
+        return HttpResponseNotFound("Metrics are disabled")
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 # '/show-cards/<game_id>/ shows some of the game contents for the specified game, helpful during testing
 def show_cards(request, game_id):
 
@@ -419,8 +789,15 @@ def show_cards(request, game_id):
 
 
 # '/exit/<game_id>/<user>/' removes the player from the game for the specified game
+@rejects_stale
 def exit(request, game_id, user_name):
     if games:
-        games.remove_player(game_id, user_name)
+        with games.game_lock(game_id):
+            games.remove_player(game_id, user_name)
+            games.save_game(game_id)
+            updates.remove_subscriber(game_id, user_name)
+            if not games.get_game(game_id):
+                updates.discard_game(game_id)
+        bus.unsubscribe(game_id, user_name)
     return redirect('homepage')
 
@@ -0,0 +1,264 @@
+"""
+NAME
+    wire.py
+
+DESCRIPTION
+    The compact wire formats of the game updates sent on the players' streams and of the turns posted to
+    turncompletepost.  JSON (each card a {"suit": ..., "faceval": ...} object) remains the default, a
+    client asks for a compact format:
+        json                       -- the default (see updates.py and views.parse_turn)
+        compact                    -- JSON with every list of cards sent as the base64 of its card ids (one
+                                      byte each, see models.CARDS), ie. "player_cards": "DBoo"
+        msgpack                    -- MessagePack with every list of cards sent as the bytes of its card
+                                      ids (only when the msgpack package is installed).  An SSE event is
+                                      text, so the update is sent as the base64 of the MessagePack (the
+                                      data of a msgpack event never starts with '{' as a JSON event does)
+    The stream's format is asked for with /stream/<game_id>/<user>?format=compact (a browser's EventSource
+    can not send headers), and a format that is not available is answered with JSON.  A turn is posted in
+    the compact format with the form field format=compact, or in the msgpack format as a binary request
+    body (Content-Type application/msgpack, the CSRF token in the X-CSRFToken header).
+
+    The lists of cards are replaced wherever they appear in an update or a turn:
+        player_cards, updated_players_hand
+                                   -- the player's cards
+        discards                   -- the discard pile ([keep_head, keep_tail, cards] in a delta)
+        gameboard, melds_added, game_board
+                                   -- each game board item is [type, cards, owners] - owners are the meld
+                                      cards' players as [player, count, ...] (the count of consecutive
+                                      meld cards played by the player)
+        melds_extended             -- [index, position, cards, owners]
+    The rest of an update is unchanged.  The shared part of an update is encoded once per format for all
+    the players (cached with the update, see updates.py), only the player's cards are encoded for each
+    player.
+
+FUNCTIONS
+    available                      -- get the wire formats available (msgpack only when installed)
+    negotiate                      -- get the format to send for the format asked for
+    card_bytes                     -- get the card ids (bytes) of a list of Card objects or card dictionaries
+    card_list                      -- convert a list of Card objects to a list of card dictionaries
+    decode_cards                   -- get the Card objects of the card ids (base64 or bytes)
+    pack_cards                     -- the base64 of the card ids of a list of cards (or the card ids)
+    pack_owners                    -- the [player, count, ...] owners of a list of meld cards
+    unpack_meld_cards              -- the meld cards of a list of cards and their owners
+    compact_data                   -- replace the lists of cards of an update (or turn) with their card ids
+    expand_data                    -- replace the card ids of an update (or turn) with lists of cards
+    map_header                     -- pack a MessagePack map header
+    encode_shared                  -- encode the shared part of an update in a compact format (cached)
+    event_data                     -- the SSE data of an update for a player in a compact format
+    decode_event                   -- decode the SSE data of an update in any format
+    turn_format                    -- get the format of the turn posted
+    encode_turn                    -- encode a turn (the hand, discard pile and game board) in a format
+    decode_turn                    -- decode the turn posted in a compact format
+
+DATA
+    FORMATS                        -- the wire formats
+    MSGPACK_TYPES                  -- the Content-Type values of a turn posted in the msgpack format
+    msgpack                        -- the msgpack module (None when not installed)
+"""
+
+import base64
+import binascii
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import models
+
+FORMATS = ('json', 'compact', 'msgpack')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+CARD_KEYS = ('player_cards', 'updated_players_hand')     # the keys holding a list of cards
+BOARD_KEYS = ('gameboard', 'melds_added', 'game_board')  # the keys holding a list of game board items
+
+
+# get the wire formats available - msgpack only when the msgpack package is installed
+def available():
+    return FORMATS if msgpack is not None else FORMATS[:2]
+
+
+# get the format to send for the format asked for - JSON when the format is not available
+def negotiate(requested):
+    return requested if requested in available() else 'json'
+
+
+# get the card ids (one byte each) of a list of Card objects or card dictionaries (suit and face value)
+def card_bytes(cards):
+    return bytes([card.card_id if isinstance(card, models.Card) else models.CARD_IDS[(card['suit'], card['faceval'])]
+                  for card in cards])
+
+
+# convert a list of Card objects to a list of dictionaries (suit and face value) as sent in the JSON format
+def card_list(cards):
+    return [{"suit": card.suit, "faceval": card.faceval} for card in cards]
+
+
+# get the Card objects of card ids - the base64 of the card ids (compact) or the card ids (msgpack).  Raises
+#   ValueError when the card ids are not valid
+def decode_cards(data):
+    if isinstance(data, str):
+        try:
+            data = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            raise ValueError("invalid card ids")
+    if not isinstance(data, (bytes, bytearray)) or any([card_id >= len(models.CARDS) for card_id in data]):
+        raise ValueError("invalid card ids")
+    return [models.CARDS[card_id] for card_id in data]
+
+
+# pack a list of cards - the base64 of the card ids (ASCII) or the card ids themselves (binary)
+def pack_cards(cards, binary):
+    ids = card_bytes(cards)
+    return ids if binary else base64.b64encode(ids).decode('ascii')
+
+
+# the owners of a list of meld cards - the [player, count, ...] of the consecutive meld cards of each player
+def pack_owners(meld_cards):
+    owners = []
+    for meld_card in meld_cards:
+        if owners and owners[-2] == meld_card['player']:
+            owners[-1] += 1
+        else:
+            owners.extend([meld_card['player'], 1])
+    return owners
+
+
+# the meld cards of a list of cards and their owners (see pack_owners)
+def unpack_meld_cards(cards, owners):
+    players = []
+    for ndx in range(0, len(owners), 2):
+        players.extend([owners[ndx]] * owners[ndx + 1])
+    if len(players) != len(cards):
+        raise ValueError("invalid meld owners")
+    return [{"player": player, "suit": card.suit, "faceval": card.faceval} for player, card in zip(players, cards)]
+
+
+# replace the lists of cards of an update or a turn (a dictionary in the JSON format) with their card ids -
+#   the base64 of the card ids, or the card ids when binary (msgpack)
+def compact_data(data, binary=False):
+    compact = dict(data)
+    for key in CARD_KEYS:
+        if key in data:
+            compact[key] = pack_cards(data[key], binary)
+    if 'discards' in data:
+        discards = data['discards']
+        if discards and isinstance(discards[0], int):
+            compact['discards'] = [discards[0], discards[1], pack_cards(discards[2], binary)]
+        else:
+            compact['discards'] = pack_cards(discards, binary)
+    for key in BOARD_KEYS:
+        if key in data:
+            compact[key] = [[item['type'], pack_cards(item['meld_cards'], binary), pack_owners(item['meld_cards'])]
+                            for item in data[key]]
+    if 'melds_extended' in data:
+        compact['melds_extended'] = [[index, position, pack_cards(cards, binary), pack_owners(cards)]
+                                     for index, position, cards in data['melds_extended']]
+    return compact
+
+
+# replace the card ids of an update or a turn in a compact format with the lists of cards of the JSON format
+#   (card dictionaries) - an update in the JSON format is returned as it is.  Raises ValueError when the
+#   card ids are not valid
+def expand_data(data):
+    expanded = dict(data)
+    for key in CARD_KEYS:
+        if isinstance(data.get(key), (str, bytes)):
+            expanded[key] = card_list(decode_cards(data[key]))
+    discards = data.get('discards')
+    if isinstance(discards, (str, bytes)):
+        expanded['discards'] = card_list(decode_cards(discards))
+    elif isinstance(discards, list) and len(discards) == 3 and isinstance(discards[2], (str, bytes)):
+        expanded['discards'] = [discards[0], discards[1], card_list(decode_cards(discards[2]))]
+    for key in BOARD_KEYS:
+        items = data.get(key)
+        if items and isinstance(items[0], list):
+            expanded[key] = [{"type": meld_type, "meld_cards": unpack_meld_cards(decode_cards(cards), owners)}
+                             for meld_type, cards, owners in items]
+    if data.get('melds_extended') and len(data['melds_extended'][0]) == 4:
+        expanded['melds_extended'] = [[index, position, unpack_meld_cards(decode_cards(cards), owners)]
+                                      for index, position, cards, owners in data['melds_extended']]
+    return expanded
+
+
+# pack a MessagePack map header for count keys
+def map_header(count):
+    if count < 16:
+        return bytes([0x80 | count])
+    return b'\xde' + count.to_bytes(2, 'big')
+
+
+# encode the shared part of an update (a dictionary in the JSON format) in a compact format - the JSON of the
+#   compact update (compact), or the number of keys and the MessagePack of the keys and values without the
+#   map header (msgpack), so the player's cards are added without encoding the shared part again
+def encode_shared(data, wire_format):
+    if wire_format == 'msgpack':
+        compact = compact_data(data, binary=True)
+        return len(compact), b''.join([msgpack.packb(key) + msgpack.packb(value) for key, value in compact.items()])
+    return json.dumps(compact_data(data))
+
+
+# the SSE data of an update ('update_game' or 'update_delta') for a player in a compact format - the
+#   update's type, the player's cards (Card objects, None when not sent) and the encoded shared part of the
+#   update (see encode_shared)
+def event_data(update_type, cards, shared, wire_format):
+    if wire_format == 'msgpack':
+        count, body = shared
+        head = msgpack.packb('type') + msgpack.packb(update_type)
+        if cards is not None:
+            head += msgpack.packb('player_cards') + msgpack.packb(card_bytes(cards))
+        return base64.b64encode(map_header(count + (2 if cards is not None else 1)) + head + body).decode('ascii')
+    head = '{"type": "' + update_type + '", '
+    if cards is not None:
+        head += '"player_cards": "' + pack_cards(cards, False) + '", '
+    return head + shared[1:]
+
+
+# decode the SSE data of an update in any format to the update in the JSON format (card dictionaries)
+def decode_event(data):
+    if data.startswith('{'):
+        return expand_data(json.loads(data))
+    return expand_data(msgpack.unpackb(base64.b64decode(data)))
+
+
+# get the format of the turn posted to turncompletepost (request) - msgpack for a binary MessagePack body,
+#   compact for the form field format=compact, otherwise json
+def turn_format(request):
+    content_type = request.content_type or ''
+    if content_type in MSGPACK_TYPES and msgpack is not None:
+        return 'msgpack'
+    if request.POST.get('format') == 'compact':
+        return 'compact'
+    return 'json'
+
+
+# encode a turn - the player's hand and the discard pile (Card objects) and the game board items - as the
+#   form fields (json and compact) or the request body (msgpack) posted to turncompletepost
+def encode_turn(hand, discards, game_board_items, wire_format):
+    turn = {'updated_players_hand': hand, 'discards': discards, 'game_board': game_board_items}
+    if wire_format == 'msgpack':
+        return msgpack.packb(compact_data(turn, binary=True))
+    if wire_format == 'compact':
+        compact = compact_data(turn)
+        return {'format': 'compact', 'updated_players_hand': compact['updated_players_hand'],
+                'discards': compact['discards'], 'game_board': json.dumps(compact['game_board'])}
+    return {'updated_players_hand': json.dumps(card_list(hand)),
+            'discards': json.dumps(card_list(discards)), 'game_board': json.dumps(game_board_items)}
+
+
+# decode the turn posted to turncompletepost (request) in a compact format - returns the player's hand and the
+#   discard pile (lists of Card objects) and the game board items.  Raises ValueError when the turn is not
+#   valid
+def decode_turn(request, wire_format):
+    if wire_format == 'msgpack':
+        try:
+            turn = msgpack.unpackb(request.body)
+        except Exception:
+            raise ValueError("invalid msgpack turn")
+        game_board = turn['game_board']
+    else:
+        turn = request.POST
+        game_board = json.loads(turn['game_board'])
+    game_board_items = [{"type": meld_type, "meld_cards": unpack_meld_cards(decode_cards(cards), owners)}
+                        for meld_type, cards, owners in game_board]
+    return decode_cards(turn['updated_players_hand']), decode_cards(turn['discards']), game_board_items
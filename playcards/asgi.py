@@ -3,6 +3,10 @@ ASGI config for playcards project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project through this callable (ie. ``uvicorn playcards.asgi:application``) lets the
+game's /stream/<game_id>/<user_name> server sent event connections wait for updates in the event
+loop, so a single process can hold many idle players without a worker thread per connection.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
@@ -70,6 +70,68 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'playcards.wsgi.application'
 
+ASGI_APPLICATION = 'playcards.asgi.application'
+
+# Game state store (see main/stores.py): 'memory' (single process), 'sqlite' (the default database),
+# or 'keyvalue' (a Redis compatible client created by PLAYCARDS_KEY_VALUE_CLIENT)
+PLAYCARDS_GAME_STORE = 'memory'
+PLAYCARDS_KEY_VALUE_CLIENT = 'main.stores.LocalKeyValueClient'
+
+# Write-ahead journal making the 'memory' game store survive a restart (see main/journal.py): the journal's
+# directory ('' - no journal), whether saving a game waits for its record to be durable, and the size of a
+# journal segment before a snapshot of every game is written
+PLAYCARDS_JOURNAL_DIR = ''
+PLAYCARDS_JOURNAL_SYNC = True
+PLAYCARDS_JOURNAL_SNAPSHOT_BYTES = 64 * 1024 * 1024
+
+# Hand archive (see main/gamerecord.py): the file the game record of each hand is appended to when the next
+# hand is dealt - replayed with 'python manage.py replay' (empty to keep no archive)
+PLAYCARDS_HAND_ARCHIVE = ''
+
+# Notification bus waking the players' streams (see main/notifier.py): 'local' (single process) or 'unix'
+# (the updates are sent to every worker process through Unix domain sockets in PLAYCARDS_BUS_SOCKET_DIR)
+PLAYCARDS_NOTIFICATION_BUS = 'local'
+PLAYCARDS_BUS_SOCKET_DIR = '/tmp/playcards-bus'
+
+# Bot players (see main/bots.py): the processes making the bots' decisions (0 to decide in the bot's thread)
+# and the time budget of each decision in seconds
+PLAYCARDS_BOT_WORKERS = 2
+PLAYCARDS_BOT_MOVE_SECONDS = 0.5
+
+# Metrics served at /metrics/ (see main/metrics.py), and the fraction of the turns whose details are logged
+# at debug level
+PLAYCARDS_METRICS = True
+PLAYCARDS_LOG_SAMPLE_RATE = 0.01
+
+# Reaper keeping the memory flat (see main/reaper.py): the seconds between sweeps (0 disables the reaper), the
+# seconds without a change before a game without open streams is evicted (idle) and before a game is removed
+# even with streams open (abandoned), the most games resident in each process (an idle game or a game over the
+# cap is kept in the store and read again, see main/stores.py), and the seconds without an update before a
+# stream sends a keepalive comment.  The reaper is started when the app is ready (see main/apps.py) unless
+# PLAYCARDS_REAPER_AUTOSTART is off
+PLAYCARDS_REAPER_AUTOSTART = True
+PLAYCARDS_REAPER_INTERVAL = 60
+PLAYCARDS_GAME_IDLE_SECONDS = 3600
+PLAYCARDS_GAME_ABANDONED_SECONDS = 86400
+PLAYCARDS_MAX_RESIDENT_GAMES = 10000
+PLAYCARDS_STREAM_KEEPALIVE_SECONDS = 30
+
+# Wire format of the game page (see main/wire.py): the format the page asks for on its stream and posts its
+# turns in - 'json' or 'compact' (card ids instead of card objects).  Other clients ask for a format on
+# their own, JSON is sent unless a format is asked for
+PLAYCARDS_WIRE_FORMAT = 'json'
+
+# Game page cache: the seconds the browser keeps the game page (the shell of the game board, the game is
+# loaded from the state view and the player's stream - see main/views.py), 0 to not cache the page
+PLAYCARDS_PAGE_CACHE_SECONDS = 3600
+
+# Stream compression (see main/compression.py): the zlib compression level of the players' streams (0 to
+# send the streams uncompressed) - each stream keeps its own compressor, flushed after each event.  The
+# window bits and memory level set the memory held by each stream's compressor
+PLAYCARDS_STREAM_COMPRESSION = 0
+PLAYCARDS_STREAM_COMPRESSION_WINDOW_BITS = 12
+PLAYCARDS_STREAM_COMPRESSION_MEM_LEVEL = 5
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases